@@ -14,9 +14,24 @@ DESKTOP_SHORTCUT_PATH= os.path.dirname(autolamella.__path__[0])
 os.makedirs(LOG_PATH, exist_ok=True)
 
 EXPERIMENT_NAME = "AutoLamella"
+EXPERIMENT_FILENAME = "experiment.yaml"
+EXPERIMENT_JOURNAL_COMPACTION_INTERVAL = 50 # number of journal records before writing a new snapshot
 
 LIFTOUT_JOIN_METHODS = ["None", "Weld"]
 LIFTOUT_LANDING_JOIN_METHODS = ["Weld"]
 
 
-####### FEATURE FLAGS
\ No newline at end of file
+####### FEATURE FLAGS
+EXPERIMENT_SNAPSHOT_FORMAT = "yaml" # "yaml" (experiment.yaml) or "sqlite" (experiment.db, lazy loading)
+EXPERIMENT_SAVE_IN_BACKGROUND = True # write experiment saves on a background thread (see ExperimentSaver)
+TELEMETRY_ENABLED = True # write workflow events to telemetry.jsonl, alongside the text log
+ANALYTICS_OUTPUT_FORMAT = "csv" # "csv" (<table>.csv per experiment) or "parquet" (typed tables in analytics/, requires pyarrow)
+EXPERIMENT_CREATE_THUMBNAILS = True # create reference image thumbnails (see tools.thumbnails) when the reference images are written (see ImageWriter)
+WORKFLOW_SCHEDULER = "insertion" # order lamellae for each stage: "insertion" (experiment order) or "stage_travel" (minimise stage travel)
+# batched milling saves each lamella once all its milling is finished, the progress within a lamella is not saved:
+# an interrupted batch re-mills the unfinished lamellae from their first milling stage
+MILLING_BATCH_BY_CURRENT = False # unsupervised rough/polishing milling: mill all lamellae grouped by milling current (see mill_lamellae_batched)
+IMAGE_SAVE_IN_BACKGROUND = True # write acquired images on a background thread (see ImageWriter), flushed at the end of each stage
+IMAGE_WRITER_MAX_BYTES = 256 * 1024**2 # maximum image data waiting to be written, acquisitions wait when it is full
+IMAGE_WRITER_EXIT_TIMEOUT = 60 # seconds, maximum time to wait for the queued images to be written on exit
+EXPERIMENT_SAVER_EXIT_TIMEOUT = 60 # seconds, maximum time to wait for the queued experiment saves to be written on exit
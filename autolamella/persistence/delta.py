@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# patch keys
+PATCH_SET = "set"           # {key: value}, keys replaced (or added)
+PATCH_DELETE = "delete"     # [key], keys removed
+PATCH_NESTED = "patch"      # {key: patch}, dict values patched
+PATCH_ITEMS = "items"       # [[index, patch]], list items patched (same length lists)
+
+
+def diff(base: dict, value: dict) -> dict:
+    """Compute the patch to transform base into value. An empty patch means the dicts are equal.
+    Args:
+        base: the base dictionary
+        value: the target dictionary
+    Returns:
+        dict: the patch (see apply_patch)
+    """
+    patch: Dict[str, Any] = {}
+    for k, v in value.items():
+        if k not in base:
+            patch.setdefault(PATCH_SET, {})[k] = v
+            continue
+        b = base[k]
+        if b is v or b == v:
+            continue
+        if isinstance(b, dict) and isinstance(v, dict):
+            patch.setdefault(PATCH_NESTED, {})[k] = diff(b, v)
+        elif _is_patchable_list(b, v):
+            patch.setdefault(PATCH_NESTED, {})[k] = {PATCH_ITEMS: _diff_items(b, v)}
+        else:
+            patch.setdefault(PATCH_SET, {})[k] = v
+
+    deleted = [k for k in base if k not in value]
+    if deleted:
+        patch[PATCH_DELETE] = deleted
+    return patch
+
+
+def _is_patchable_list(b: Any, v: Any) -> bool:
+    return (isinstance(b, list) and isinstance(v, list) and len(b) == len(v)
+            and all(isinstance(bi, dict) and isinstance(vi, dict) for bi, vi in zip(b, v)))
+
+
+def _diff_items(base: List[dict], value: List[dict]) -> List[list]:
+    return [[i, diff(b, v)] for i, (b, v) in enumerate(zip(base, value)) if not (b is v or b == v)]
+
+
+def apply_patch(base: dict, patch: dict) -> dict:
+    """Apply a patch (see diff) to the base dictionary. The base is not modified,
+    unchanged values are shared with the base (not copied).
+    Args:
+        base: the base dictionary
+        patch: the patch
+    Returns:
+        dict: the patched dictionary
+    """
+    if not patch:
+        return dict(base)
+
+    value = dict(base)
+    for k in patch.get(PATCH_DELETE, []):
+        value.pop(k, None)
+    for k, p in patch.get(PATCH_NESTED, {}).items():
+        if PATCH_ITEMS in p:
+            items = list(value[k])
+            for i, item_patch in p[PATCH_ITEMS]:
+                items[i] = apply_patch(items[i], item_patch)
+            value[k] = items
+        else:
+            value[k] = apply_patch(value[k], p)
+    value.update(patch.get(PATCH_SET, {}))
+    return value
+
+
+####### PROTOCOL SHARING
+
+FACTOR_MAX_CANDIDATES = 16 # distinct values per protocol key considered for the base protocol
+
+def strip_imaging_paths(protocol: dict, path: str) -> dict:
+    """Remove the imaging paths that are set to the lamella path (they are restored when the
+    lamella is loaded), so that the protocol can be shared between lamellae.
+    Args:
+        protocol: the lamella protocol (Dict[str, List[Dict]])
+        path: the lamella path
+    Returns:
+        dict: the protocol, without the lamella imaging paths
+    """
+    path = str(path)
+    stripped = {}
+    for k, v in protocol.items():
+        if isinstance(v, list) and any(_has_imaging_path(stage, path) for stage in v):
+            v = [{**stage, "imaging": {**stage["imaging"], "path": None}}
+                 if _has_imaging_path(stage, path) else stage for stage in v]
+        stripped[k] = v
+    return stripped
+
+
+def _has_imaging_path(stage: Any, path: str) -> bool:
+    return (isinstance(stage, dict) and isinstance(stage.get("imaging", None), dict)
+            and stage["imaging"].get("path", None) is not None and str(stage["imaging"]["path"]) == path)
+
+
+def factor_protocols(protocols: List[dict]) -> Tuple[dict, List[dict]]:
+    """Factor the lamella protocols into a shared base protocol, and per-lamella overrides.
+    The base uses the most common value for each protocol key.
+    Args:
+        protocols: the lamella protocols
+    Returns:
+        Tuple[dict, List[dict]]: the base protocol, and the overrides (patches) for each lamella
+    """
+    # the distinct values of each key, and their counts. the values are compared directly (most
+    # lamellae share the same values), only the first FACTOR_MAX_CANDIDATES values are candidates
+    candidates: Dict[str, List[list]] = {}
+    for protocol in protocols:
+        for k, v in protocol.items():
+            kcandidates = candidates.setdefault(k, [])
+            for candidate in kcandidates:
+                if candidate[0] is v or candidate[0] == v:
+                    candidate[1] += 1
+                    break
+            else:
+                if len(kcandidates) < FACTOR_MAX_CANDIDATES:
+                    kcandidates.append([v, 1])
+
+    base = {k: max(kcandidates, key=lambda c: c[1])[0] for k, kcandidates in candidates.items()}
+    return base, [diff(base, protocol) for protocol in protocols]
+
+
+def expand_protocol(base: Optional[dict], overrides: Optional[dict]) -> dict:
+    """Expand the lamella protocol from the shared base protocol and the lamella overrides."""
+    return apply_patch(base or {}, overrides or {})
+
+
+####### HISTORY DELTAS
+
+HISTORY_DELTA_KEY = "__delta__"     # history entry, stored as a patch of the previous entry
+HISTORY_REF_KEY = "__history__"     # state, stored as a reference (index) to a history entry
+
+
+def encode_history(history: List[dict]) -> List[dict]:
+    """Encode the lamella history (LamellaState.to_dict) as deltas. The first entry is stored
+    in full, the following entries are stored as patches of the previous entry."""
+    encoded = []
+    for i, entry in enumerate(history):
+        if i == 0:
+            encoded.append(entry)
+        else:
+            encoded.append({HISTORY_DELTA_KEY: diff(history[i - 1], entry)})
+    return encoded
+
+
+def decode_history(history: List[dict]) -> List[dict]:
+    """Decode the lamella history, supports both the delta and full (legacy) formats."""
+    decoded = []
+    for entry in history:
+        if HISTORY_DELTA_KEY in entry:
+            if not decoded:
+                raise ValueError("History delta has no previous entry to patch.")
+            entry = apply_patch(decoded[-1], entry[HISTORY_DELTA_KEY])
+        decoded.append(entry)
+    return decoded
+
+
+def decode_states(states: Dict[str, dict], history: List[dict]) -> Dict[str, dict]:
+    """Expand the state references (see HISTORY_REF_KEY) to the (decoded) history entries."""
+    return {k: history[v[HISTORY_REF_KEY]] if HISTORY_REF_KEY in v else v for k, v in states.items()}
@@ -0,0 +1,125 @@
+import atexit
+import fnmatch
+import logging
+import os
+import threading
+from collections import deque
+from copy import deepcopy
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+
+from fibsem.structures import FibsemImage
+
+from autolamella import config as cfg
+
+
+class ImageWriter:
+    """Write-behind writer for acquired images. Images are queued and written (tiff encoding,
+    metadata and thumbnails) on a background thread, so the microscope can move on to the next
+    move or mill while the images are saved.
+
+    The queued images are limited to max_bytes of image data: submitting blocks until there is
+    space, so a slow disk can't use unbounded memory. Flush at the end of each stage, so all
+    the images are on disk before they are used (e.g. loading an alignment reference). Failed
+    writes are raised by the next flush.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or cfg.IMAGE_WRITER_MAX_BYTES
+        self._images: Deque[Tuple[FibsemImage, str]] = deque()
+        self._pending_bytes: int = 0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread = None
+        self._busy: bool = False
+        self._errors: List[Tuple[str, Exception]] = [] # (path, exception) of the failed writes
+
+    def submit(self, image: FibsemImage, filename: Path) -> str:
+        """Queue the image to be written.
+        Args:
+            image: the image (the metadata is copied, the data must not be modified)
+            filename: the filename (without extension, as FibsemImage.save)
+        Returns:
+            str: the filename the image will be written to
+        """
+        path = str(Path(filename).with_suffix(".tif"))
+        if not cfg.IMAGE_SAVE_IN_BACKGROUND:
+            _write_image(image, path)
+            return path
+
+        image = FibsemImage(data=image.data, metadata=deepcopy(image.metadata))
+        nbytes = image.data.nbytes
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending_bytes == 0
+                                or self._pending_bytes + nbytes <= self.max_bytes)
+            self._images.append((image, path))
+            self._pending_bytes += nbytes
+            self._start()
+            self._cond.notify_all()
+        return path
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all the queued images are written. Returns False on timeout.
+        Raises RuntimeError if any image failed to write (since the last flush)."""
+        with self._cond:
+            done = self._cond.wait_for(lambda: not self._images and not self._busy, timeout=timeout)
+            errors, self._errors = self._errors, []
+        if errors:
+            paths = [path for path, _ in errors]
+            raise RuntimeError(f"Failed to write {len(errors)} images: {paths}") from errors[0][1]
+        return done
+
+    def _start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="ImageWriter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._images)
+                image, path = self._images.popleft()
+                self._busy = True
+            try:
+                _write_image(image, path)
+            except Exception as e:
+                logging.error(f"Failed to write image {path}: {e}")
+                with self._cond:
+                    self._errors.append((path, e))
+            finally:
+                with self._cond:
+                    self._pending_bytes -= image.data.nbytes
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+def _write_image(image: FibsemImage, path: str) -> None:
+    image.save(path=path)
+
+    if cfg.EXPERIMENT_CREATE_THUMBNAILS:
+        from autolamella.tools.thumbnails import THUMBNAIL_PATTERN, create_thumbnails
+        if fnmatch.fnmatch(os.path.basename(path), THUMBNAIL_PATTERN):
+            create_thumbnails(path, image=image)
+
+
+_WRITER: ImageWriter = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_image_writer() -> ImageWriter:
+    """Get the shared image writer. Pending images are written on exit
+    (waiting at most cfg.IMAGE_WRITER_EXIT_TIMEOUT)."""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = ImageWriter()
+            atexit.register(_flush_on_exit, _WRITER)
+        return _WRITER
+
+
+def _flush_on_exit(writer: ImageWriter) -> None:
+    try:
+        if not writer.flush(timeout=cfg.IMAGE_WRITER_EXIT_TIMEOUT):
+            logging.warning(f"Images are still being written after {cfg.IMAGE_WRITER_EXIT_TIMEOUT}s, exiting")
+    except RuntimeError as e:
+        logging.error(e)
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+JOURNAL_FILENAME = "experiment.journal"
+JOURNAL_RECORD_LAMELLA = "lamella"
+
+# journals are shared between copies of an experiment (e.g. ui and workflow thread), 
+# so the locks are shared per path, rather than per instance
+_JOURNAL_LOCKS: Dict[str, threading.Lock] = {}
+_JOURNAL_LOCKS_GUARD = threading.Lock()
+
+def _get_journal_lock(path: str) -> threading.Lock:
+    with _JOURNAL_LOCKS_GUARD:
+        return _JOURNAL_LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class ExperimentJournal:
+    """Append-only journal of lamella updates, stored next to experiment.yaml.
+
+    Each line is a json record describing the state of a single lamella after
+    a stage transition. Appending a record costs O(1) I/O regardless of the
+    experiment size. The journal is replayed on top of the snapshot when the
+    experiment is loaded, and truncated when a new snapshot is written (compaction).
+    """
+
+    def __init__(self, path: Path):
+        self.path = os.path.join(path, JOURNAL_FILENAME)
+        self._n_records: int = None
+
+    @property
+    def _lock(self) -> threading.Lock:
+        return _get_journal_lock(self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._n_records is None:
+                self._n_records = len(self._read_lines())
+            return self._n_records
+
+    def append(self, record: dict) -> int:
+        """Append a record to the journal. Returns the number of records in the journal."""
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if self._n_records is None:
+                self._n_records = len(self._read_lines())
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+            self._n_records += 1
+            return self._n_records
+
+    def tell(self) -> int:
+        """Return the current end offset of the journal (in bytes)."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return 0
+            return os.path.getsize(self.path)
+
+    def read(self) -> List[dict]:
+        """Read all the records in the journal. Incomplete (partially written) records are skipped."""
+        records = []
+        with self._lock:
+            lines = self._read_lines()
+        for i, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                logging.warning(f"Skipping corrupt journal record {i} in {self.path}: {e}")
+        return records
+
+    def truncate(self, offset: int) -> None:
+        """Remove all records before the offset (bytes), e.g. after they have been written to a snapshot.
+        Records appended after the offset was taken are kept."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._n_records = 0
+                return
+
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                remaining = f.read()
+
+            if not remaining:
+                os.remove(self.path)
+                self._n_records = 0
+                return
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(remaining)
+            os.replace(tmp_path, self.path)
+            self._n_records = None
+
+    def _read_lines(self) -> List[str]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [line for line in f.read().splitlines() if line.strip()]
+
+
+def create_lamella_record(ldict: dict, history: List[dict], history_index: int) -> dict:
+    """Create a journal record for a lamella update.
+    Args:
+        ldict: the lamella dictionary (without history)
+        history: the history entries, starting at history_index
+        history_index: the index of the first history entry in the record
+    Returns:
+        dict: the journal record
+    """
+    return {
+        "type": JOURNAL_RECORD_LAMELLA,
+        "timestamp": datetime.timestamp(datetime.now()),
+        "lamella": ldict,
+        "history_index": history_index,
+        "history": history,
+    }
+
+
+def replay_journal(ddict: dict, records: List[dict]) -> dict:
+    """Replay the journal records on top of an experiment dictionary (snapshot).
+    Lamella are matched by petname, unknown lamella are appended to the positions."""
+
+    positions: List[dict] = ddict.setdefault("positions", [])
+    index = {p["petname"]: p for p in positions}
+
+    for record in records:
+        if record.get("type") != JOURNAL_RECORD_LAMELLA:
+            logging.debug(f"Unknown journal record type: {record.get('type')}")
+            continue
+
+        ldict = dict(record["lamella"])
+        petname = ldict["petname"]
+        history_index = record.get("history_index", 0)
+
+        if petname not in index:
+            ldict["history"] = list(record["history"])
+            positions.append(ldict)
+            index[petname] = ldict
+            continue
+
+        lamella_dict = index[petname]
+        history = lamella_dict.get("history", [])[:history_index] + list(record["history"])
+        lamella_dict.update(ldict)
+        lamella_dict["history"] = history
+
+    return ddict
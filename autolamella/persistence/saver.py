@@ -0,0 +1,105 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+from autolamella import config as cfg
+
+# task kinds
+SAVE_SNAPSHOT = "snapshot"
+SAVE_LAMELLA = "lamella"
+
+
+class ExperimentSaver:
+    """Write-behind saver for experiments. Saves are queued and written on a background
+    thread, so they don't add latency to the ui or the workflow thread.
+
+    The experiment data is serialised (snapshotted) on the calling thread, only the
+    writing happens in the background. Tasks are written in order. Queuing a snapshot
+    of an experiment replaces the pending tasks for the same experiment, as the snapshot
+    already contains them (coalescing bursts of saves into a single write). Failed writes
+    are raised by the next flush.
+    """
+
+    def __init__(self):
+        self._tasks: Deque[Tuple[str, str, Callable[[], None]]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread = None
+        self._busy: bool = False
+        self._errors: List[Tuple[str, str, Exception]] = [] # (path, kind, exception) of the failed writes
+
+    def submit(self, path: str, kind: str, fn: Callable[[], None]) -> None:
+        """Queue a write for the experiment at path.
+        Args:
+            path: the experiment path
+            kind: the kind of task (SAVE_SNAPSHOT, SAVE_LAMELLA)
+            fn: the write, called on the background thread
+        """
+        if not cfg.EXPERIMENT_SAVE_IN_BACKGROUND:
+            fn()
+            return
+
+        with self._cond:
+            if kind == SAVE_SNAPSHOT:
+                self._tasks = deque(t for t in self._tasks if t[0] != path)
+            self._tasks.append((path, kind, fn))
+            self._start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all the queued writes are finished. Returns False on timeout.
+        Raises RuntimeError if any write failed (since the last flush)."""
+        with self._cond:
+            done = self._cond.wait_for(lambda: not self._tasks and not self._busy, timeout=timeout)
+            errors, self._errors = self._errors, []
+        if errors:
+            failed = [f"{path} ({kind})" for path, kind, _ in errors]
+            raise RuntimeError(f"Failed to save {len(errors)} experiment writes: {failed}") from errors[0][2]
+        return done
+
+    def _start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="ExperimentSaver", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._tasks)
+                path, kind, fn = self._tasks.popleft()
+                self._busy = True
+            try:
+                fn()
+            except Exception as e:
+                logging.error(f"Failed to save experiment ({kind}) at {path}: {e}")
+                with self._cond:
+                    self._errors.append((path, kind, e))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+_SAVER: ExperimentSaver = None
+_SAVER_LOCK = threading.Lock()
+
+
+def get_saver() -> ExperimentSaver:
+    """Get the shared experiment saver. Pending writes are flushed on exit
+    (waiting at most cfg.EXPERIMENT_SAVER_EXIT_TIMEOUT)."""
+    global _SAVER
+    with _SAVER_LOCK:
+        if _SAVER is None:
+            _SAVER = ExperimentSaver()
+            atexit.register(_flush_on_exit, _SAVER)
+        return _SAVER
+
+
+def _flush_on_exit(saver: ExperimentSaver) -> None:
+    try:
+        if not saver.flush(timeout=cfg.EXPERIMENT_SAVER_EXIT_TIMEOUT):
+            logging.warning(f"Experiment saves are still being written after {cfg.EXPERIMENT_SAVER_EXIT_TIMEOUT}s, exiting")
+    except RuntimeError as e:
+        logging.error(e)
@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import yaml
+
+from autolamella.persistence.delta import (
+    decode_history,
+    decode_states,
+    diff,
+    expand_protocol,
+    strip_imaging_paths,
+)
+
+STORE_FILENAME = "experiment.db"
+STORE_SCHEMA_VERSION = 1
+
+# lamella fields that are stored in separate columns / tables, and loaded on demand
+LAZY_LAMELLA_KEYS = ["protocol", "protocol_overrides", "history", "states"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiment (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS lamellae (
+    idx INTEGER NOT NULL,
+    petname TEXT PRIMARY KEY,
+    number INTEGER,
+    stage TEXT,
+    is_failure INTEGER,
+    path TEXT,
+    data TEXT,
+    protocol TEXT
+);
+CREATE TABLE IF NOT EXISTS history (
+    petname TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data TEXT,
+    PRIMARY KEY (petname, idx)
+);
+CREATE TABLE IF NOT EXISTS states (
+    petname TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT,
+    PRIMARY KEY (petname, stage)
+);
+CREATE INDEX IF NOT EXISTS lamellae_idx ON lamellae (idx);
+"""
+
+
+class NoAliasSafeDumper(yaml.SafeDumper):
+    """Yaml dumper that writes shared (structurally shared) values in full, rather than as aliases."""
+    def ignore_aliases(self, data) -> bool:
+        return True
+
+
+class ExperimentStore:
+    """SQLite based experiment snapshot (experiment.db), stored next to experiment.yaml.
+
+    The lamella summary (state, failure, alignment, etc) is stored per row, and the
+    protocol, history and states are stored separately so they can be loaded on
+    demand for each lamella (see LazyLamella), rather than parsing the whole experiment.
+    Single lamella updates are written as one transaction (update_lamella), so a crash
+    can't leave a partially written experiment.
+    """
+
+    def __init__(self, path: Path):
+        self.path = os.path.join(path, STORE_FILENAME)
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection, and commit (or rollback) the transaction on exit."""
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def write(self, ddict: dict) -> None:
+        """Write the experiment dictionary (Experiment.to_dict) to the store, replacing
+        the existing snapshot. The write is a single transaction."""
+
+        edict = {k: v for k, v in ddict.items() if k != "positions"}
+        edict["schema_version"] = STORE_SCHEMA_VERSION
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("DELETE FROM experiment")
+            conn.execute("DELETE FROM lamellae")
+            conn.execute("DELETE FROM history")
+            conn.execute("DELETE FROM states")
+
+            conn.executemany("INSERT INTO experiment (key, value) VALUES (?, ?)",
+                             [(k, json.dumps(v)) for k, v in edict.items()])
+
+            base = ddict.get("protocol_base", {})
+            for idx, ldict in enumerate(ddict.get("positions", [])):
+                self._insert_lamella(conn, idx, ldict, base=base)
+
+    def update_lamella(self, idx: int, ldict: dict, history: List[dict], history_index: int) -> None:
+        """Update (or add) a single lamella in one transaction. Only the lamella row, its states
+        and the history entries from history_index are written.
+        Args:
+            idx: the position of the lamella in the experiment
+            ldict: the lamella dictionary (without history)
+            history: the history entries, starting at history_index
+            history_index: the index of the first history entry
+        """
+        petname = ldict["petname"]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM states WHERE petname = ?", (petname,))
+            conn.execute("DELETE FROM history WHERE petname = ? AND idx >= ?", (petname, history_index))
+            self._insert_lamella(conn, idx, ldict, base=self._read_protocol_base(conn), replace=True)
+            self._insert_history(conn, petname, history, start=history_index)
+
+    def remove_lamella(self, petname: str) -> None:
+        """Remove a single lamella (and its history and states) in one transaction."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT idx FROM lamellae WHERE petname = ?", (petname,)).fetchone()
+            if row is None:
+                return
+            conn.execute("DELETE FROM lamellae WHERE petname = ?", (petname,))
+            conn.execute("UPDATE lamellae SET idx = idx - 1 WHERE idx > ?", row)
+            conn.execute("DELETE FROM history WHERE petname = ?", (petname,))
+            conn.execute("DELETE FROM states WHERE petname = ?", (petname,))
+
+    def export_yaml(self, filename: str) -> None:
+        """Export the full experiment to the legacy yaml format (experiment.yaml)."""
+        ddict = self.read()
+        ddict["positions"] = [self.read_lamella(p["petname"]) for p in ddict["positions"]]
+        ddict.pop("protocol_base", None) # legacy format: full protocol per lamella
+
+        # legacy format: full history and states (no deltas or history references)
+        for ldict in ddict["positions"]:
+            ldict["history"] = decode_history(ldict["history"])
+            ldict["states"] = decode_states(ldict["states"], ldict["history"])
+
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            yaml.dump(ddict, f, Dumper=NoAliasSafeDumper, indent=4)
+        os.replace(tmp_filename, filename)
+
+    def _insert_lamella(self, conn: sqlite3.Connection, idx: int, ldict: dict, 
+                        base: dict, replace: bool = False) -> None:
+        petname = ldict["petname"]
+        data = {k: v for k, v in ldict.items() if k not in LAZY_LAMELLA_KEYS}
+        state = ldict.get("state") or {}
+
+        # the protocol is stored as overrides of the shared base protocol
+        overrides = ldict.get("protocol_overrides", None)
+        if overrides is None:
+            overrides = diff(base, strip_imaging_paths(ldict.get("protocol", {}), ldict.get("path", "")))
+
+        conn.execute(
+            f"INSERT {'OR REPLACE ' if replace else ''}INTO lamellae "
+            "(idx, petname, number, stage, is_failure, path, data, protocol) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (idx, petname, ldict.get("number", 0), state.get("stage", None),
+             int(bool(ldict.get("is_failure", False))), ldict.get("path", None),
+             json.dumps(data), json.dumps(overrides)),
+        )
+        self._insert_history(conn, petname, ldict.get("history", []))
+        conn.executemany("INSERT INTO states (petname, stage, data) VALUES (?, ?, ?)",
+                         [(petname, k, json.dumps(v)) for k, v in ldict.get("states", {}).items()])
+
+    def _read_protocol_base(self, conn: sqlite3.Connection) -> dict:
+        row = conn.execute("SELECT value FROM experiment WHERE key = 'protocol_base'").fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def _insert_history(self, conn: sqlite3.Connection, petname: str, history: List[dict], start: int = 0) -> None:
+        conn.executemany("INSERT OR REPLACE INTO history (petname, idx, data) VALUES (?, ?, ?)",
+                         [(petname, start + i, json.dumps(h)) for i, h in enumerate(history)])
+
+    def read(self) -> dict:
+        """Read the experiment dictionary. The positions only contain the lamella summaries,
+        without the protocol, history and states (use read_lamella to load them)."""
+        with self._connect() as conn:
+            edict = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM experiment")}
+            rows = conn.execute("SELECT data FROM lamellae ORDER BY idx").fetchall()
+
+        edict.pop("schema_version", None)
+        edict["positions"] = [json.loads(data) for (data,) in rows]
+        return edict
+
+    def read_lamella(self, petname: str) -> dict:
+        """Read the full lamella dictionary (Lamella.to_dict) for a single lamella."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT data, protocol FROM lamellae WHERE petname = ?", (petname,)).fetchone()
+            if row is None:
+                raise KeyError(f"Lamella {petname} not found in {self.path}")
+            base = self._read_protocol_base(conn)
+            history = conn.execute("SELECT data FROM history WHERE petname = ? ORDER BY idx", (petname,)).fetchall()
+            states = conn.execute("SELECT stage, data FROM states WHERE petname = ?", (petname,)).fetchall()
+
+        ldict = json.loads(row[0])
+        ldict["protocol"] = expand_protocol(base, json.loads(row[1]))
+        ldict["history"] = [json.loads(data) for (data,) in history]
+        ldict["states"] = {stage: json.loads(data) for stage, data in states}
+        return ldict
+
+    def read_lamellae(self, petnames: List[str]) -> Dict[str, dict]:
+        """Read the full lamella dictionaries for multiple lamella."""
+        return {petname: self.read_lamella(petname) for petname in petnames}
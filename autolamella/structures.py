@@ -6,19 +6,14 @@ from copy import deepcopy
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum, auto
+from functools import partial
 from pathlib import Path
-from typing import Dict, List
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List
 
-import pandas as pd
 import petname
 import yaml
 from fibsem.utils import format_duration
-from fibsem.milling import (
-    FibsemMillingStage,
-    get_milling_stages,
-    get_protocol_from_stages,
-    estimate_total_milling_time,
-)
 from fibsem.structures import (
     FibsemImage,
     FibsemRectangle,
@@ -30,6 +25,21 @@ from fibsem.structures import (
 from fibsem.utils import configure_logging
 
 from autolamella import config as cfg
+from autolamella.persistence.delta import (
+    HISTORY_REF_KEY,
+    decode_history,
+    encode_history,
+    expand_protocol,
+    factor_protocols,
+    strip_imaging_paths,
+)
+from autolamella.persistence.journal import (
+    ExperimentJournal,
+    create_lamella_record,
+    replay_journal,
+)
+from autolamella.persistence.saver import SAVE_LAMELLA, SAVE_SNAPSHOT, get_saver
+from autolamella.persistence.store import ExperimentStore, NoAliasSafeDumper
 from autolamella.protocol.validation import (
     LANDING_KEY,
     LIFTOUT_KEY,
@@ -39,6 +49,12 @@ from autolamella.protocol.validation import (
     TRENCH_KEY,
     UNDERCUT_KEY,
 )
+from autolamella.telemetry import configure_telemetry
+
+# pandas and the fibsem milling stack are slow to import, and loaded on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    from fibsem.milling import FibsemMillingStage
 
 
 class AutoLamellaStage(Enum):
@@ -118,6 +134,22 @@ class LamellaState:
             end_timestamp=data["end_timestamp"]
         )
 
+class MillingWorkflows(Mapping):
+    """Read-only view of the milling stages for each key in the lamella protocol."""
+    def __init__(self, lamella: 'Lamella'):
+        self._lamella = lamella
+
+    def __getitem__(self, key: str) -> List['FibsemMillingStage']:
+        if key not in self._lamella.protocol:
+            raise KeyError(key)
+        return self._lamella.get_milling_stages(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lamella.protocol)
+
+    def __len__(self) -> int:
+        return len(self._lamella.protocol)
+
 @dataclass
 class Lamella:
     path: Path
@@ -132,29 +164,31 @@ class Lamella:
     landing_selected: bool = False
     landing_state: MicroscopeState = field(default_factory=MicroscopeState) # TODO: remove
     history: List[LamellaState] = None
-    milling_workflows: Dict[str, List[FibsemMillingStage]] = None
     states: Dict[AutoLamellaStage, LamellaState] = None
     _id: str = str(uuid.uuid4())
 
     def __post_init__(self):
-        # only make the dir, if the base path is actually set, 
-        # prevents creating path on other computer..
-        if os.path.exists(os.path.dirname(self.path)):
-            os.makedirs(self.path, exist_ok=True)
+        # NOTE: the lamella directory is created in create_new_lamella / start_of_stage_update, 
+        # so loading and copying lamella doesn't touch the filesystem
+
+        # milling stages, built on demand: {key: (protocol[key], stages)}
+        self._milling_workflows_cache: Dict[str, tuple] = {}
 
         if self.protocol is None:
             self.protocol = {}
 
         # set imaging paths to be the lamella path unless already set
+        # (copy-on-write, the stage dicts may be shared with other lamellae)
         for k, v in self.protocol.items(): # Dict[str, List[Dict]]
-            for stage in v:
-                if stage.get("imaging", {}).get("path", None) is None:
-                    stage["imaging"]["path"] = self.path
+            if any(stage.get("imaging", {}).get("path", None) is None for stage in v):
+                self.protocol[k] = [
+                    {**stage, "imaging": {**stage["imaging"], "path": self.path}}
+                    if stage.get("imaging", {}).get("path", None) is None else stage
+                    for stage in v
+                ]
 
         if self.history is None:
             self.history = []
-        if self.milling_workflows is None:
-            self.milling_workflows = {k: get_milling_stages(k, self.protocol) for k in self.protocol}
         if self.states is None:
             self.states = {}
         if self._id is None:
@@ -163,6 +197,31 @@ class Lamella:
         # rather than explicit states
         # self.positions: Dict[str, MicroscopeState] = {}
 
+    def __getstate__(self) -> dict:
+        # don't copy / pickle the milling stages cache, it is rebuilt on demand
+        state = dict(self.__dict__)
+        state["_milling_workflows_cache"] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+    @property
+    def milling_workflows(self) -> 'MillingWorkflows':
+        """The milling stages for each protocol key, built on first access and cached
+        until the protocol key is replaced."""
+        return MillingWorkflows(self)
+
+    def get_milling_stages(self, key: str) -> List['FibsemMillingStage']:
+        """Get the (cached) milling stages for the protocol key."""
+        value = self.protocol[key]
+        cached = self._milling_workflows_cache.get(key, None)
+        if cached is None or cached[0] is not value:
+            from fibsem.milling import get_milling_stages
+            cached = (value, get_milling_stages(key, self.protocol))
+            self._milling_workflows_cache[key] = cached
+        return cached[1]
+
     @property
     def finished(self) -> bool:
         return self.state.stage == AutoLamellaStage.Finished
@@ -199,23 +258,34 @@ class Lamella:
     def stage_position(self) -> FibsemStagePosition:
         return self.state.microscope_state.stage_position
 
-    def to_dict(self):
-        return {
+    def to_dict(self, include_history: bool = True):
+        ddict = {
             "petname": self.petname,
             "state": self.state.to_dict() if self.state is not None else None,
             "path": str(self.path),
             "alignment_area": self.alignment_area.to_dict(),
-            "protocol": self.protocol,
             "number": self.number,
-            "history": [state.to_dict() for state in self.history],
             "is_failure": self.is_failure,
             "failure_note": self.failure_note,
             "failure_timestamp": self.failure_timestamp,
             "landing_state": self.landing_state.to_dict(),
             "landing_selected": self.landing_selected,
             "id": str(self._id),
-            "states": {k.name: v.to_dict() for k, v in self.states.items()},
         }
+        ddict.update(self._protocol_and_history_to_dict(include_history=include_history))
+        return ddict
+
+    def _protocol_and_history_to_dict(self, include_history: bool = True) -> dict:
+        # states that are history entries are stored as a reference to the history entry
+        history_index = {id(state): i for i, state in enumerate(self.history)}
+        ddict = {
+            "protocol": dict(self.protocol),
+            "states": {k.name: {HISTORY_REF_KEY: history_index[id(v)]} if id(v) in history_index else v.to_dict()
+                       for k, v in self.states.items()},
+        }
+        if include_history:
+            ddict["history"] = encode_history([state.to_dict() for state in self.history])
+        return ddict
 
     @property
     def info(self):
@@ -232,12 +302,13 @@ class Lamella:
         else:
             alignment_area = FibsemRectangle() # use default
         
-        history=[LamellaState().from_dict(state) for state in data["history"]]
+        history=[LamellaState().from_dict(state) for state in decode_history(data["history"])]
 
-        # load states:
+        # load states: (states can reference history entries)
         states = data.get("states", {})
         if states:
-            states = {AutoLamellaStage[k]: LamellaState.from_dict(v) for k, v in states.items()}
+            states = {AutoLamellaStage[k]: history[v[HISTORY_REF_KEY]] if HISTORY_REF_KEY in v 
+                      else LamellaState.from_dict(v) for k, v in states.items()}
         else:
             # load from history
             states = {state.stage: state for state in history}
@@ -307,7 +378,74 @@ class Lamella:
         """Restore the previous state of the lamella based on the current workflow stage"""
         prev = method.get_previous(stage)
         if prev in self.states:
-            self.state = self.states[prev]
+            # copy, the state is shared with the history
+            self.state = deepcopy(self.states[prev])
+
+
+LAZY_LAMELLA_FIELDS = ["protocol", "history", "states"]
+
+def _lazy_lamella_field(name: str) -> property:
+    """Lamella field that is loaded from the experiment store on first access."""
+    def fget(self: 'LazyLamella'):
+        if name not in self.__dict__:
+            self._load()
+        return self.__dict__[name]
+
+    def fset(self: 'LazyLamella', value):
+        if not self.is_loaded:
+            self._load()
+        self.__dict__[name] = value
+
+    return property(fget, fset)
+
+class LazyLamella(Lamella):
+    """A lamella loaded from the experiment store (experiment.db). The summary (state, 
+    failure, alignment area, etc.) is loaded immediately. The protocol, history, states and 
+    milling workflows are only loaded on first access."""
+
+    protocol = _lazy_lamella_field("protocol")
+    history = _lazy_lamella_field("history")
+    states = _lazy_lamella_field("states")
+
+    def __init__(self, data: dict, loader: Callable[[], dict]):
+        # load the summary, without the protocol, history and states
+        lamella = Lamella.from_dict({**data, "protocol": {}, "history": [], "states": {}})
+        self.__dict__.update({k: v for k, v in vars(lamella).items() if k not in LAZY_LAMELLA_FIELDS})
+        self._loader = loader
+        self._data: dict = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loader is None
+
+    def _read(self) -> dict:
+        if self._data is None:
+            self._data = self._loader()
+        return self._data
+
+    def _load(self) -> None:
+        """Load the protocol, history, states and milling workflows from the store."""
+        if self.is_loaded:
+            return
+        lamella = Lamella.from_dict(self._read())
+        for k in LAZY_LAMELLA_FIELDS:
+            self.__dict__.setdefault(k, getattr(lamella, k))
+        self._loader = None
+        self._data = None
+
+    def _protocol_and_history_to_dict(self, include_history: bool = True) -> dict:
+        if self.is_loaded:
+            return super()._protocol_and_history_to_dict(include_history=include_history)
+
+        # serialise the stored data directly, rather than loading the lamella
+        data = self._read()
+        ddict = {
+            "protocol": data["protocol"],
+            "states": data["states"],
+        }
+        if include_history:
+            ddict["history"] = data["history"]
+        return ddict
 
 
 def create_new_lamella(experiment_path: str, number: int, state: LamellaState, protocol: Dict) -> Lamella:
@@ -342,6 +480,7 @@ def create_new_experiment(path: Path, name: str, method: str = "autolamella-on-g
     # configure experiment logging
     os.makedirs(experiment.path, exist_ok=True)
     configure_logging(path=experiment.path, log_filename="logfile")
+    configure_telemetry(path=experiment.path, create=True)
 
     # save the experiment
     experiment.save()
@@ -365,18 +504,43 @@ class Experiment:
 
         self.method: AutoLamellaMethod = get_autolamella_method(method)
 
+        self.snapshot_format: str = cfg.EXPERIMENT_SNAPSHOT_FORMAT
+        self._journal: ExperimentJournal = None
+
+    @property
+    def journal(self) -> ExperimentJournal:
+        """The append-only journal of lamella updates for this experiment."""
+        if self._journal is None or os.path.dirname(self._journal.path) != str(self.path):
+            self._journal = ExperimentJournal(self.path)
+        return self._journal
+
+    @property
+    def store(self) -> ExperimentStore:
+        """The sqlite snapshot for this experiment (experiment.db)."""
+        return ExperimentStore(self.path)
+
     def to_dict(self) -> dict:
 
         state_dict = {
             "name": self.name,
             "_id": self._id,
             "path": self.path,
-            "positions": [deepcopy(lamella.to_dict()) for lamella in self.positions],
+            "positions": [lamella.to_dict() for lamella in self.positions],
             "landing_positions": [pos.to_dict() for pos in self.landing_positions],
             "created_at": self.created_at,
             "method": self.method.name,
         }
 
+        # share the protocol between lamellae: store a base protocol, and per-lamella overrides
+        protocols = [strip_imaging_paths(p.pop("protocol"), p["path"]) for p in state_dict["positions"]]
+        base, overrides = factor_protocols(protocols)
+
+        # the base and overrides reference the (mutable) lamella protocols, copy them once, so the 
+        # snapshot can be written on the background saver thread while the protocols are edited
+        state_dict["protocol_base"], overrides = deepcopy((base, overrides))
+        for ldict, override in zip(state_dict["positions"], overrides):
+            ldict["protocol_overrides"] = override
+
         return state_dict
     
     @classmethod
@@ -391,6 +555,10 @@ class Experiment:
 
         # load lamella from dict
         for lamella_dict in ddict["positions"]:
+            if "protocol" not in lamella_dict:
+                # unchanged protocol values are shared with the base protocol (and other lamellae)
+                lamella_dict = {**lamella_dict, "protocol": expand_protocol(
+                    ddict.get("protocol_base"), lamella_dict.get("protocol_overrides"))}
             lamella = Lamella.from_dict(data=lamella_dict)
             experiment.positions.append(lamella)
 
@@ -401,11 +569,107 @@ class Experiment:
 
         return experiment
 
-    def save(self) -> None:
-        """Save the sample data to yaml file"""
+    def save(self, background: bool = False) -> None:
+        """Save the sample data to yaml file, and compact the journal.
+        Args:
+            background: snapshot the experiment, and write it on the background saver thread
+        """
+
+        # records journaled after this point are not in the snapshot, and are kept
+        offset = self.journal.tell()
+        ddict = self.to_dict()
 
-        with open(os.path.join(self.path, "experiment.yaml"), "w") as f:
-            yaml.safe_dump(self.to_dict(), f, indent=4)
+        fn = partial(self._write_snapshot, ddict=ddict, offset=offset, 
+                     snapshot_format=self.snapshot_format)
+        if background:
+            get_saver().submit(self.path, SAVE_SNAPSHOT, fn)
+        else:
+            fn()
+
+    def _write_snapshot(self, ddict: dict, offset: int, snapshot_format: str) -> None:
+        if snapshot_format == "sqlite":
+            ExperimentStore(ddict["path"]).write(ddict)
+        else:
+            # write to a temporary file first, so a crash can't corrupt the existing snapshot
+            filename = os.path.join(ddict["path"], cfg.EXPERIMENT_FILENAME)
+            tmp_filename = filename + ".tmp"
+            with open(tmp_filename, "w") as f:
+                yaml.dump(ddict, f, Dumper=NoAliasSafeDumper, indent=4)
+            os.replace(tmp_filename, filename)
+
+        self.journal.truncate(offset)
+
+    def save_lamella(self, lamella: Lamella, background: bool = False) -> None:
+        """Save the update of a single lamella, rather than re-writing the whole experiment.
+        For the sqlite snapshot, the lamella is updated in a single transaction. Otherwise, the
+        update is recorded in the experiment journal, which is compacted into a new snapshot 
+        every cfg.EXPERIMENT_JOURNAL_COMPACTION_INTERVAL records.
+        Args:
+            lamella: the updated lamella
+            background: write the update on the background saver thread
+        """
+
+        if self.snapshot_format == "sqlite" and not self.store.exists:
+            self.save(background=background)
+            return
+
+        # only the latest history entry is written, history is only appended at the end of a stage
+        history_index = max(len(lamella.history) - 1, 0)
+        ldict = lamella.to_dict(include_history=False)
+        history = [state.to_dict() for state in lamella.history[history_index:]]
+
+        if self.snapshot_format == "sqlite":
+            # identity, not equality: comparing lamellae would load every lazy lamella before it
+            idx = next(i for i, p in enumerate(self.positions) if p is lamella)
+            if background: # the protocol is diffed against the stored base on the saver thread
+                ldict["protocol"] = deepcopy(ldict["protocol"])
+            fn = partial(self.store.update_lamella, idx=idx,
+                         ldict=ldict, history=history, history_index=history_index)
+            if background:
+                get_saver().submit(self.path, SAVE_LAMELLA, fn)
+            else:
+                fn()
+            return
+
+        # journal appends are cheap, and always written immediately
+        record = create_lamella_record(ldict=ldict, history=history, history_index=history_index)
+        n_records = self.journal.append(record)
+
+        if n_records >= cfg.EXPERIMENT_JOURNAL_COMPACTION_INTERVAL:
+            logging.debug(f"Compacting experiment journal ({n_records} records)")
+            self.save(background=background)
+
+    def remove_lamella(self, idx: int, background: bool = False) -> Lamella:
+        """Remove a lamella from the experiment, and save the experiment.
+        Args:
+            idx: the position of the lamella in the experiment
+            background: write the update on the background saver thread
+        Returns:
+            Lamella: the removed lamella
+        """
+        lamella = self.positions.pop(idx)
+        if self.snapshot_format == "sqlite" and self.store.exists:
+            fn = partial(self.store.remove_lamella, lamella.petname)
+            if background:
+                get_saver().submit(self.path, SAVE_LAMELLA, fn)
+            else:
+                fn()
+        else:
+            self.save(background=background)
+        return lamella
+
+    def export_yaml(self) -> None:
+        """Export the experiment to the legacy yaml format (experiment.yaml)."""
+        self.flush()
+        if self.snapshot_format == "sqlite" and self.store.exists:
+            self.store.export_yaml(os.path.join(self.path, cfg.EXPERIMENT_FILENAME))
+        else:
+            self.save()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait for the pending background saves to be written. Returns False on timeout.
+        Raises RuntimeError if a background save failed."""
+        return get_saver().flush(timeout=timeout)
 
     def __repr__(self) -> str:
 
@@ -414,7 +678,7 @@ class Experiment:
         Positions: {len(self.positions)}
         """
 
-    def __to_dataframe__(self) -> pd.DataFrame:
+    def __to_dataframe__(self) -> 'pd.DataFrame':
 
         exp_data = []
         lamella: Lamella
@@ -456,11 +720,12 @@ class Experiment:
 
             exp_data.append(ldict)
 
+        import pandas as pd
         df = pd.DataFrame(exp_data)
 
         return df
 
-    def to_dataframe_v2(self) -> pd.DataFrame:
+    def to_dataframe_v2(self) -> 'pd.DataFrame':
 
 
         edict = {
@@ -472,11 +737,12 @@ class Experiment:
             "num_lamella": len(self.positions),
         }
 
+        import pandas as pd
         df = pd.DataFrame([edict])
 
         return df
 
-    def history_dataframe(self) -> pd.DataFrame:
+    def history_dataframe(self) -> 'pd.DataFrame':
         """Create a dataframe with the history of all lamellas."""
         history = []
         lam: Lamella
@@ -497,33 +763,90 @@ class Experiment:
                 }
                 history.append(deepcopy(hist_d))
 
+        import pandas as pd
         df_stage_history = pd.DataFrame.from_dict(history)
         df_stage_history["duration"] = df_stage_history["end"] - df_stage_history["start"]
 
         return df_stage_history
 
     @staticmethod
-    def load(fname: Path) -> 'Experiment':
-        """Load an experiment from disk."""
+    def load(fname: Path, setup_logging: bool = True) -> 'Experiment':
+        """Load an experiment from disk.
+        Args:
+            fname: the experiment file (experiment.yaml)
+            setup_logging: configure the experiment logging and telemetry (the log files are written
+                to the experiment directory). Disable to read the experiment without modifying it.
+        Returns:
+            Experiment: the experiment
+        """
+
+        # wait for pending background saves (failures are reported, the experiment on disk is loaded)
+        try:
+            get_saver().flush()
+        except RuntimeError as e:
+            logging.error(e)
 
-        # read and open existing yaml file
         path = Path(fname).with_suffix(".yaml")
-        if os.path.exists(path):
+        store = ExperimentStore(os.path.dirname(path))
+
+        # lamella updates journaled since the snapshot
+        records = ExperimentJournal(os.path.dirname(path)).read()
+
+        # use the sqlite snapshot, if it is the latest snapshot
+        use_store = store.exists and (
+            not os.path.exists(path) or os.path.getmtime(store.path) >= os.path.getmtime(path)
+        )
+
+        if use_store:
+            experiment = Experiment._from_store(store, records)
+        elif os.path.exists(path):
+            # read and open existing yaml file
             with open(path, "r") as f:
                 ddict = yaml.safe_load(f)
+
+            # create experiment from dict
+            experiment = Experiment.from_dict(replay_journal(ddict, records))
+            experiment.snapshot_format = "yaml"
         else:
             raise FileNotFoundError(f"No file with name {path} found.")
 
-        # create experiment from dict
-        experiment = Experiment.from_dict(ddict)
         experiment.path = os.path.dirname(fname) # TODO: make sure the paths are correctly re-assigned when loaded on a different machine
 
         # configure experiment logging
-        configure_logging(path=experiment.path, log_filename="logfile")
+        if setup_logging:
+            configure_logging(path=experiment.path, log_filename="logfile")
+            configure_telemetry(path=experiment.path)
+
+        if records:
+            logging.debug(f"Replayed {len(records)} journal records for {path}")
 
         return experiment
     
-    def to_protocol_dataframe(self) -> pd.DataFrame:
+    @staticmethod
+    def _from_store(store: ExperimentStore, records: List[dict]) -> 'Experiment':
+        """Load an experiment from the sqlite snapshot. Lamella are loaded lazily (LazyLamella)."""
+        ddict = store.read()
+
+        # lamella with journaled updates are loaded in full, so the updates can be replayed
+        updated = {r["lamella"]["petname"] for r in records if "lamella" in r}
+        positions = ddict.pop("positions")
+        ddict["positions"] = [store.read_lamella(p["petname"]) if p["petname"] in updated else p 
+                              for p in positions]
+        ddict = replay_journal(ddict, records)
+
+        experiment = Experiment.from_dict({**ddict, "positions": []})
+        experiment.snapshot_format = "sqlite"
+        for lamella_dict in ddict["positions"]:
+            if "history" in lamella_dict:
+                lamella = Lamella.from_dict(data=lamella_dict)
+            else:
+                lamella = LazyLamella(data=lamella_dict, 
+                                      loader=partial(store.read_lamella, lamella_dict["petname"]))
+            experiment.positions.append(lamella)
+
+        return experiment
+
+    def to_protocol_dataframe(self) -> 'pd.DataFrame':
         """Create a dataframe with the protocol of all lamellas."""
 
         plist: List[Dict] = []
@@ -543,6 +866,7 @@ class Experiment:
                             ddict[f"{k2}"] = v2
                     plist.append(deepcopy(ddict))
 
+        import pandas as pd
         df = pd.DataFrame(plist)
         # drop tescan columns  
         TESCAN_COLUMNS = [
@@ -556,7 +880,7 @@ class Experiment:
 
         return df
 
-    def _convert_dataframe_to_protocol(self, df: pd.DataFrame) -> None:
+    def _convert_dataframe_to_protocol(self, df: 'pd.DataFrame') -> None:
         """Convert a dataframe to a protocol."""
 
         PROTOCOL_KEYS = ["trench", "MillUndercut", "fiducial", "notch", "MillRough", "MillRegularCut", "MillPolishing", "microexpansion"]
@@ -586,7 +910,7 @@ class Experiment:
 
                 ddict = deepcopy(df_filt.to_dict(orient="records"))
 
-                lamella.protocol[k]["stages"] = deepcopy(ddict)
+                lamella.protocol[k] = {**lamella.protocol[k], "stages": deepcopy(ddict)}
 
                 from pprint import pprint
                 print("KEY: ", k)
@@ -601,7 +925,7 @@ class Experiment:
         """Return a list of lamellas that have failed"""
         return [lamella for lamella in self.positions if lamella.is_failure]
 
-    def to_summary_dataframe(self) -> pd.DataFrame:
+    def to_summary_dataframe(self) -> 'pd.DataFrame':
         """Convert the experiment to a summary dataframe"""
         dat = []
         for p in self.positions:
@@ -635,6 +959,7 @@ class Experiment:
 
             dat.append(deepcopy(d))
 
+        import pandas as pd
         df = pd.DataFrame(dat)
 
         return df
@@ -779,23 +1104,10 @@ class AutoLamellaMethod(Enum):
             return None
 
 def is_ready_for(lamella: Lamella, method: AutoLamellaMethod, workflow: AutoLamellaStage) -> bool:
-    """Is the lamella ready for the workflow step based on the 
-    previous step being completed and not failed"""
-    if lamella.is_failure:
-        return False
-    
-    if workflow not in method.workflow:
-        logging.debug(f"Workflow {workflow} not in method {method.name}")
-        return False
-
-    # get previous
-    previous = method.get_previous(workflow)
-    # check if previous is completed (at any point)
-    if previous is not None:
-        if previous in lamella.states:
-            return True
-
-    return False
+    """Is the lamella ready for the workflow step: the last completed step is one of its 
+    requirements in the method (see WorkflowGraph), and the lamella has not failed"""
+    from autolamella.workflows.scheduler import WorkflowGraph # circular import
+    return WorkflowGraph(method).is_ready(lamella, workflow)
 
 DEFAULT_AUTOLAMELLA_METHOD = AutoLamellaMethod.ON_GRID.name
 
@@ -871,6 +1183,7 @@ def get_remaining_stages(pos: Lamella, method: AutoLamellaMethod) -> List[AutoLa
 
 def estimate_remaining_time(p:Lamella, method: AutoLamellaMethod) -> None:
     """Estimate the remaiing time in the workflows for a given method"""
+    from fibsem.milling import estimate_total_milling_time
     ESTIMATED_SETUP_TIME = 5*60
     OVERHEAD_TIME = 2*60
 
@@ -927,10 +1240,11 @@ class AutoLamellaProtocol(FibsemProtocol):
     supervision: Dict[AutoLamellaStage, bool]
     configuration: MicroscopeSettings               # microscope configuration
     options: AutoLamellaProtocolOptions             # options for the protocol
-    milling: Dict[str, List[FibsemMillingStage]]    # milling workflows
+    milling: Dict[str, List['FibsemMillingStage']]    # milling workflows
     tmp: dict # TODO: remove tmp use something real
 
     def to_dict(self):
+        from fibsem.milling import get_protocol_from_stages
         return {
             "name": self.name,
             "method": self.method.name,
@@ -955,6 +1269,7 @@ class AutoLamellaProtocol(FibsemProtocol):
 
         # get the method
         method = get_autolamella_method(ddict["method"])
+        from fibsem.milling import get_milling_stages
 
 
         # load the supervision tasks
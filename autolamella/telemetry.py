@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterator, Optional, TextIO, Tuple
+
+from autolamella import config as cfg
+
+TELEMETRY_FILENAME = "telemetry.jsonl"
+
+# logged function names (substrings) that are recorded as telemetry events (see tools.data.LogParser.RULES)
+TELEMETRY_FUNCTIONS = [
+    "get_microscope_state",
+    "get_stage_position",
+    "log_status_message",
+    "beam_shift",
+    "confirm_button",
+    "save_ml",
+    "_single_click",
+    "_double_click",
+    "mill_stages",
+]
+
+
+class TelemetryHandler(logging.Handler):
+    """Logging handler that writes structured events to a JSONL file (telemetry.jsonl).
+
+    Events are the dictionaries logged by the workflow (e.g. log_status_message, beam shift,
+    detection, clicks and milling). They are written as json, rather than as python reprs
+    in the text log, so the analytics can load them without parsing the log.
+    Each line is: {"timestamp": float, "func": str, "msg": dict}
+    The events can also be written to a stream (e.g. stdout, for headless progress).
+    """
+
+    def __init__(self, filename: Optional[Path] = None, stream: Optional[TextIO] = None):
+        super().__init__(level=logging.DEBUG)
+        self.filename = filename
+        self._owns_stream = stream is None
+        self._stream = open(filename, "a", encoding="utf-8", buffering=1) if stream is None else stream
+        self._functions = {}
+
+    def _is_telemetry(self, func: str) -> bool:
+        is_telemetry = self._functions.get(func, None)
+        if is_telemetry is None:
+            is_telemetry = self._functions[func] = any(f in func for f in TELEMETRY_FUNCTIONS)
+        return is_telemetry
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not isinstance(record.msg, dict) or not self._is_telemetry(record.funcName):
+            return
+        try:
+            event = {"timestamp": record.created, "func": record.funcName, "msg": record.msg}
+            line = json.dumps(event, default=str) + "\n"
+            with self.lock:
+                self._stream.write(line)
+                if not self._owns_stream:
+                    self._stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._owns_stream and not self._stream.closed:
+                self._stream.close()
+        super().close()
+
+
+def configure_telemetry(path: Path, create: bool = False) -> TelemetryHandler:
+    """Write telemetry events for the experiment at path. Replaces any existing telemetry handler.
+    Telemetry is only written from the start of an experiment, existing experiments that were 
+    logged without it are analysed from the text log.
+    Args:
+        path: the experiment path
+        create: the experiment is new, create the telemetry file
+    Returns:
+        TelemetryHandler: the handler, or None if telemetry is not enabled
+    """
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        if isinstance(handler, TelemetryHandler):
+            logger.removeHandler(handler)
+            handler.close()
+
+    filename = os.path.join(path, TELEMETRY_FILENAME)
+    if not cfg.TELEMETRY_ENABLED or not (create or os.path.exists(filename)):
+        return None
+
+    handler = TelemetryHandler(filename)
+    logger.addHandler(handler)
+    return handler
+
+
+def read_telemetry(filename: Path, offset: int = 0) -> Iterator[Tuple[int, dict]]:
+    """Read the telemetry events from the file.
+    Args:
+        filename: the telemetry file
+        offset: the byte offset to start reading from
+    Returns:
+        Iterator[Tuple[int, dict]]: the byte offset of the end of each event, and the event.
+            Partially written events at the end of the file are not returned.
+    """
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Skipping corrupt telemetry event in {filename}: {e}")
+                continue
+            yield offset, event
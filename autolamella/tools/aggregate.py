@@ -0,0 +1,206 @@
+import argparse
+import glob
+import logging
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import autolamella.config as cfg
+from autolamella.persistence.store import STORE_FILENAME
+from autolamella.tools.data import (
+    get_partition_id,
+    get_statistics_signature,
+    load_statistics_tables,
+)
+from autolamella.tools.tables import ANALYTICS_TABLES, apply_schema, write_tables
+
+AGGREGATE_CACHE_FILENAME = "analytics.cache"
+AGGREGATE_CACHE_MANIFEST = "cache.json"
+AGGREGATE_CACHE_VERSION = 2
+
+
+def find_experiments(log_path: Path) -> List[str]:
+    """Find the experiments in the log path (directories with an experiment snapshot, yaml or sqlite,
+    and logfile.log).
+    Args:
+        log_path: the log path (e.g. cfg.LOG_PATH)
+    Returns:
+        List[str]: the experiment paths
+    """
+    paths = []
+    for path in sorted(glob.glob(os.path.join(log_path, "*", ""))):
+        path = os.path.dirname(path)
+        has_snapshot = any(os.path.exists(os.path.join(path, fname)) for fname in [cfg.EXPERIMENT_FILENAME, STORE_FILENAME])
+        if has_snapshot and os.path.exists(os.path.join(path, "logfile.log")):
+            paths.append(path)
+    return paths
+
+
+def load_experiment_tables(path: Path, encoding: str = "cp1252", use_cache: bool = True) -> Dict[str, pd.DataFrame]:
+    """Load the typed analytics tables (see tables.apply_schema) for the experiment, from the
+    per-experiment cache (analytics.cache/, parquet) if none of the experiment files have changed since it was written.
+    Args:
+        path: the experiment path
+        encoding: the log file encoding
+        use_cache: use (and update) the cache
+    Returns:
+        Dict[str, pd.DataFrame]: the tables {name: dataframe}
+    """
+    cache_path = os.path.join(path, AGGREGATE_CACHE_FILENAME)
+    # json has no tuples, compare the signature as lists
+    signature = [list(sig) for sig in get_statistics_signature(path)]
+
+    if use_cache:
+        tables = _load_cached_tables(cache_path, encoding, signature)
+        if tables is not None:
+            return tables
+
+    tables = load_statistics_tables(path, encoding=encoding)
+    tables = {name: apply_schema(name, tables[name]) for name in ANALYTICS_TABLES}
+
+    if use_cache:
+        _save_cached_tables(cache_path, tables, encoding, signature)
+
+    return tables
+
+
+def _load_cached_tables(cache_path: str, encoding: str, signature: list) -> Optional[Dict[str, pd.DataFrame]]:
+    manifest_fname = os.path.join(cache_path, AGGREGATE_CACHE_MANIFEST)
+    if not os.path.exists(manifest_fname):
+        return None
+    try:
+        with open(manifest_fname, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest["version"] != AGGREGATE_CACHE_VERSION or manifest["encoding"] != encoding
+            or manifest["signature"] != signature):
+            return None
+        return {name: pd.read_parquet(os.path.join(cache_path, f"{name}.parquet"))
+                for name in ANALYTICS_TABLES}
+    except Exception as e:
+        logging.warning(f"Failed to load analytics cache {cache_path}, recalculating: {e}")
+        return None
+
+
+def _save_cached_tables(cache_path: str, tables: Dict[str, pd.DataFrame], encoding: str, signature: list) -> None:
+    # the tables are written to a temporary directory, and swapped in when complete
+    tmp_path = cache_path + ".tmp"
+    try:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, df in tables.items():
+            df.to_parquet(os.path.join(tmp_path, f"{name}.parquet"), index=False)
+        manifest = {"version": AGGREGATE_CACHE_VERSION, "encoding": encoding, "signature": signature}
+        with open(os.path.join(tmp_path, AGGREGATE_CACHE_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        # parquet requires pyarrow (or fastparquet), without it the tables are recalculated each time
+        logging.debug(f"Failed to write analytics cache {cache_path}: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def aggregate_experiments(paths: List[Path], encoding: str = "cp1252", max_workers: Optional[int] = None,
+                          use_cache: bool = True) -> Dict[str, pd.DataFrame]:
+    """Load the analytics tables for many experiments in parallel (one experiment per process),
+    and combine them into a single dataset. Experiments that fail to load are skipped.
+    Args:
+        paths: the experiment paths (see find_experiments)
+        encoding: the log file encoding
+        max_workers: the number of processes (default: number of cpus), 1 loads in this process
+        use_cache: use the per-experiment cache (see load_experiment_tables)
+    Returns:
+        Dict[str, pd.DataFrame]: the combined tables {name: dataframe}, identified by exp_id and exp_name
+    """
+    results: Dict[str, Dict[str, pd.DataFrame]] = {}
+
+    if max_workers == 1:
+        for path in paths:
+            try:
+                results[path] = load_experiment_tables(path, encoding=encoding, use_cache=use_cache)
+            except Exception as e:
+                logging.warning(f"Failed to load analytics for {path}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(load_experiment_tables, path, encoding, use_cache): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    logging.warning(f"Failed to load analytics for {path}: {e}")
+
+    # combine in path order, so the dataset is independent of completion order
+    dfs = {}
+    for name in ANALYTICS_TABLES:
+        frames = [results[path][name] for path in paths if path in results]
+        frames = [df for df in frames if not df.empty]
+        dfs[name] = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return dfs
+
+
+def write_aggregate(output_path: Path, dfs: Dict[str, pd.DataFrame], output_format: str = "csv") -> None:
+    """Write the combined dataset.
+    Args:
+        output_path: the output directory
+        dfs: the combined tables (see aggregate_experiments)
+        output_format: "csv" (<table>.csv) or "parquet" (typed tables, partitioned by experiment)
+    """
+    os.makedirs(output_path, exist_ok=True)
+
+    if output_format == "parquet":
+        for df_experiment in _group_by_experiment(dfs).values():
+            write_tables(output_path, df_experiment, exp_id=get_partition_id(df_experiment))
+        return
+
+    if output_format != "csv":
+        raise ValueError(f"Unsupported analytics output format: {output_format}, expected 'csv' or 'parquet'")
+
+    for name, df in dfs.items():
+        df.to_csv(os.path.join(output_path, f"{name}.csv"), mode='w', header=True, index=False)
+
+
+def _group_by_experiment(dfs: Dict[str, pd.DataFrame]) -> Dict[str, Dict[str, pd.DataFrame]]:
+    groups: Dict[str, Dict[str, pd.DataFrame]] = {}
+    for name, df in dfs.items():
+        if df.empty:
+            continue
+        # experiment names are not unique (e.g. the default names), the ids are.
+        # experiments without an id are grouped by name (see get_partition_id)
+        keys = df["exp_id"].where(df["exp_id"] != "NO_ID", df["exp_name"])
+        for key, df_exp in df.groupby(keys, sort=False):
+            groups.setdefault(key, {})[name] = df_exp.reset_index(drop=True)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate the analytics for all AutoLamella experiments in a directory")
+    parser.add_argument("--log_path", type=str, default=cfg.LOG_PATH, dest="log_path",
+                        help="Path to the directory containing the experiments")
+    parser.add_argument("--output_path", type=str, default=None, dest="output_path",
+                        help="Path to write the combined dataset (default: <log_path>/analytics)")
+    parser.add_argument("--format", type=str, default=cfg.ANALYTICS_OUTPUT_FORMAT, choices=["csv", "parquet"],
+                        dest="output_format", help="Output format for the combined dataset")
+    parser.add_argument("--encoding", type=str, default="cp1252",
+                        help="Encoding of the log files (e.g. cp1252 for windows, utf-8 for linux)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: number of cpus)")
+    parser.add_argument("--no-cache", action="store_false", dest="use_cache", help="Recalculate all experiments")
+    args = parser.parse_args()
+
+    paths = find_experiments(args.log_path)
+    print(f"Aggregating {len(paths)} experiments in {args.log_path}")
+    dfs = aggregate_experiments(paths, encoding=args.encoding, max_workers=args.workers, use_cache=args.use_cache)
+
+    output_path = args.output_path or os.path.join(args.log_path, "analytics")
+    write_aggregate(output_path, dfs, output_format=args.output_format)
+    n_experiments = dfs["experiment"]["exp_name"].nunique() if "exp_name" in dfs["experiment"] else 0
+    print(f"Wrote analytics for {n_experiments} experiments to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
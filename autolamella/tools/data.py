@@ -1,13 +1,26 @@
 import datetime
 import json
+import logging
 import os
-from copy import deepcopy
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 import pandas as pd
 
+from autolamella import config as cfg
+from autolamella.persistence.journal import JOURNAL_FILENAME
+from autolamella.persistence.store import STORE_FILENAME
 from autolamella.structures import Experiment, Lamella, LamellaState
+from autolamella.telemetry import TELEMETRY_FILENAME, read_telemetry
+from autolamella.tools.tables import ANALYTICS_DIRNAME, ANALYTICS_TABLES, write_tables
+
+LOG_READ_BUFFER_SIZE = 1024 * 1024 # bytes
+LOG_INDEX_FILENAME = "logfile.index.json"
+LOG_INDEX_VERSION = 3
+LOG_INDEX_HEAD_SIZE = 1024 # bytes
+
+# files the analytics tables are calculated from
+STATISTICS_SOURCE_FILENAMES = [cfg.EXPERIMENT_FILENAME, STORE_FILENAME, JOURNAL_FILENAME, "logfile.log", TELEMETRY_FILENAME]
 
 
 class PythonLiteralJSONDecoder(json.JSONDecoder):
@@ -50,6 +63,20 @@ def parse_msg(msg: str):
     # return json.loads(msg, cls=PythonLiteralJSONDecoder)
     return json.loads(msg.replace("'", '"').replace("None", '"None"').replace("True", '"True"').replace("False", '"False"').replace("(", "[").replace(")", "]"))
 
+def _as_dict(msg: Union[str, dict]) -> dict:
+    """the message as a dictionary, parse log messages (telemetry events are already parsed)"""
+    return msg if isinstance(msg, dict) else parse_msg(msg)
+
+def _normalise_literals(value):
+    """convert None / True / False to strings, consistent with parse_msg"""
+    if isinstance(value, dict):
+        return {k: _normalise_literals(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalise_literals(v) for v in value]
+    if value is None or isinstance(value, bool):
+        return str(value)
+    return value
+
 def get_timestamp(line: str) -> float:
     """get timestamp from line"""
     ts = line.split("—")[0].split(",")[0].strip()
@@ -77,228 +104,450 @@ def parse_line(line: str) -> Tuple[str, str, str]:
     return tsd, func, msg
 
 
-def calculate_statistics_dataframe(path: Path, encoding: str = "cp1252"):
+class _ColumnTable:
+    """Column-wise table builder, rows are appended without copying into per-column lists."""
+
+    def __init__(self):
+        self.columns: Dict[str, list] = {}
+        self.n_rows: int = 0
+        # fast path for consecutive rows with the same keys (in the same order)
+        self._keys: tuple = None
+        self._key_columns: List[list] = None
+
+    def append(self, row: dict) -> None:
+        keys = tuple(row)
+        if keys == self._keys:
+            for column, v in zip(self._key_columns, row.values()):
+                column.append(v)
+            self.n_rows += 1
+            return
+
+        for k, v in row.items():
+            column = self.columns.get(k, None)
+            if column is None:
+                column = self.columns[k] = [None] * self.n_rows
+            column.append(v)
+        self.n_rows += 1
+
+        # fill missing values
+        if len(row) != len(self.columns):
+            for column in self.columns.values():
+                if len(column) < self.n_rows:
+                    column.append(None)
+            self._keys = None
+        else:
+            self._keys, self._key_columns = keys, [self.columns[k] for k in keys]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def to_dict(self) -> dict:
+        return {"columns": self.columns, "n_rows": self.n_rows}
+
+    @classmethod
+    def from_dict(cls, ddict: dict) -> '_ColumnTable':
+        table = cls()
+        table.columns = ddict["columns"]
+        table.n_rows = ddict["n_rows"]
+        return table
+
+
+class LogParser:
+    """Streaming, single pass parser for the autolamella log file (logfile.log).
+
+    Lines are dispatched to handlers using a lookup table on the logged function name,
+    and the handlers append rows to column-wise tables (steps, stage, det, beam_shift, 
+    click, milling, state). Lines from other functions are skipped without parsing.
+    """
+
+    TABLES = ["state", "stage", "steps", "beam_shift", "det", "click", "milling"]
+
+    def __init__(self):
+        self.current_lamella: str = "NULL"
+        self.current_stage: str = "SystemSetup"
+        self.current_step: str = "SystemSetup"
+        self.step_n: int = 0
+        self.tables: Dict[str, _ColumnTable] = {name: _ColumnTable() for name in self.TABLES}
+
+        self._dispatch: Dict[str, List[Callable[[float, str], None]]] = {}
+        self._timestamp_cache: Tuple[str, float] = (None, None)
+
+    # (substring, handler), matched against the logged function name
+    RULES: List[Tuple[str, str]] = [
+        ("get_microscope_state", "_parse_state"),     # TELEMETRY -> depcrecated in favour of manufacturer telemetry
+        ("get_stage_position", "_parse_stage"),
+        ("log_status_message", "_parse_status"),
+        ("beam_shift", "_parse_beam_shift"),
+        ("confirm_button", "_parse_detection"),      # DETECTION INTERACTION
+        ("save_ml", "_parse_detection"),
+        ("_single_click", "_parse_single_click"),    # MILLING INTERACTION
+        ("_double_click", "_parse_double_click"),    # MOVEMENT INTERACTION
+        ("mill_stages", "_parse_milling"),
+    ]
+
+    def to_dict(self) -> dict:
+        """The parser state (current context and tables), to resume parsing (see parse_log_incremental)."""
+        return {
+            "current_lamella": self.current_lamella,
+            "current_stage": self.current_stage,
+            "current_step": self.current_step,
+            "step_n": self.step_n,
+            "tables": {name: table.to_dict() for name, table in self.tables.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, ddict: dict) -> 'LogParser':
+        parser = cls()
+        parser.current_lamella = ddict["current_lamella"]
+        parser.current_stage = ddict["current_stage"]
+        parser.current_step = ddict["current_step"]
+        parser.step_n = ddict["step_n"]
+        parser.tables.update({name: _ColumnTable.from_dict(tdict) for name, tdict in ddict["tables"].items()})
+        return parser
+
+    def _get_handlers(self, func: str) -> List[Callable[[float, str], None]]:
+        handlers = self._dispatch.get(func, None)
+        if handlers is None:
+            handlers = self._dispatch[func] = [getattr(self, fn) for key, fn in self.RULES if key in func]
+        return handlers
+
+    def _get_timestamp(self, ts: str) -> float:
+        # consecutive lines are usually logged in the same second
+        if ts != self._timestamp_cache[0]:
+            tsd = datetime.datetime.timestamp(datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S"))
+            self._timestamp_cache = (ts, tsd)
+        return self._timestamp_cache[1]
+
+    def parse_line(self, line: str) -> None:
+        """Parse a single line from the log file."""
+        parts = line.split("—")
+        if len(parts) < 3:
+            return
+        handlers = self._get_handlers(parts[-2].strip())
+        if not handlers:
+            return
+        try:
+            tsd = self._get_timestamp(parts[0].split(",")[0].strip())
+            msg = parts[-1].strip()
+            for handler in handlers:
+                handler(tsd, msg)
+        except Exception as e:
+            # print(e, " | ", line)
+            pass
+
+    def parse_event(self, event: dict) -> None:
+        """Parse a single telemetry event (see autolamella.telemetry)."""
+        handlers = self._get_handlers(event["func"])
+        if not handlers:
+            return
+        try:
+            for handler in handlers:
+                handler(event["timestamp"], _normalise_literals(event["msg"]))
+        except Exception as e:
+            pass
+
+    def parse_telemetry_file(self, fname: Path, offset: int = 0) -> int:
+        """Parse the telemetry file (telemetry.jsonl), rather than the text log.
+        Args:
+            fname: the telemetry file
+            offset: the byte offset to start parsing from
+        Returns:
+            int: the byte offset of the end of the last complete event parsed
+        """
+        for offset_, event in read_telemetry(fname, offset=offset):
+            self.parse_event(event)
+            offset = offset_
+        return offset
+
+    def parse_lines(self, lines: Iterable[str]) -> None:
+        """Parse lines from the log file."""
+        for line in lines:
+            self.parse_line(line)
+
+    def parse_file(self, fname: Path, encoding: str = "cp1252", offset: int = 0) -> int:
+        """Parse the log file, the file is streamed (read in buffered chunks), rather than read into memory.
+        Args:
+            fname: the log file
+            encoding: the log file encoding
+            offset: the byte offset to start parsing from
+        Returns:
+            int: the byte offset of the end of the last complete line parsed
+        """
+        # Note: need to check the encoding as this is required for em dash (long dash) # TODO: change this delimiter so this isnt required.
+        with open(fname, "rb", buffering=LOG_READ_BUFFER_SIZE) as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # partially written line, parse it next time
+                offset += len(line)
+                self.parse_line(line.decode(encoding))
+        return offset
+
+    def to_dataframes(self) -> Dict[str, pd.DataFrame]:
+        """Convert the parsed tables to dataframes."""
+        return {name: table.to_dataframe() for name, table in self.tables.items()}
+
+    def _context(self, row: dict, tsd: float) -> dict:
+        row["timestamp"] = tsd
+        row["lamella"] = self.current_lamella
+        row["stage"] = self.current_stage
+        row["step"] = self.current_step
+        return row
+
+    def _parse_state(self, tsd: float, msg: str) -> None:
+        self.tables["state"].append(_as_dict(msg)["state"])
+
+    def _parse_stage(self, tsd: float, msg: str) -> None:
+        self.tables["stage"].append(self._context(_as_dict(msg)["stage"], tsd))
+
+    def _parse_status(self, tsd: float, msg: str) -> None:
+        if isinstance(msg, str) and "STATUS" in msg:
+            return  # skip old status messages
+
+        # global data
+        msgd = _as_dict(msg)
+        self.current_lamella = msgd["petname"]
+        self.current_stage = msgd["stage"]
+        self.current_step = msgd["step"]
+
+        # step data
+        msgd["lamella"] = self.current_lamella
+        msgd["timestamp"] = tsd
+        msgd["step_n"] = self.step_n
+        self.step_n += 1
+        self.tables["steps"].append(msgd)
+
+    def _parse_beam_shift(self, tsd: float, msg: str) -> None:
+        self.tables["beam_shift"].append(self._context(_as_dict(msg), tsd))
+
+    def _parse_detection(self, tsd: float, msg: str) -> None:
+        # TODO: confirm this parses the correct data
+        detd = _as_dict(msg)
+        px, dpx, dm = detd.pop("px"), detd.pop("dpx"), detd.pop("dm")
+        detd["px_x"] = px["x"]
+        detd["px_y"] = px["y"]
+        detd["dpx_x"] = dpx["x"]
+        detd["dpx_y"] = dpx["y"]
+        detd["dm_x"] = dm["x"]
+        detd["dm_y"] = dm["y"]
+        self.tables["det"].append(self._context(detd, tsd))
+
+        # log detection interaction
+        if detd["is_correct"] == "False":
+            self.tables["click"].append({
+                "lamella": detd["lamella"],
+                "stage": detd["stage"],
+                "step": detd["step"],
+                "type": "DET",
+                "subtype": detd["feature"],
+                "dm_x": detd["dm_x"],
+                "dm_y": detd["dm_y"],
+                "beam_type": detd["beam_type"],
+                "timestamp": detd["timestamp"],
+            })
+
+    def _parse_click(self, tsd: float, msgd: dict, click_type: str, subtype: str) -> None:
+        clickd = self._context({}, tsd)
+        clickd["dm_x"] = msgd["dm"]["x"]
+        clickd["dm_y"] = msgd["dm"]["y"]
+        clickd["type"] = click_type
+        clickd["subtype"] = subtype
+        clickd["beam_type"] = msgd["beam_type"]
+        self.tables["click"].append(clickd)
+
+    def _parse_single_click(self, tsd: float, msg: str) -> None:
+        msgd = _as_dict(msg)
+        self._parse_click(tsd, msgd, "MILL", msgd["pattern"])
+
+    def _parse_double_click(self, tsd: float, msg: str) -> None:
+        msgd = _as_dict(msg)
+        self._parse_click(tsd, msgd, "MOVE", msgd["movement_mode"])
+
+    def _parse_milling(self, tsd: float, msg: str) -> None:
+        msgd = _as_dict(msg)
+        milld = self._context({}, tsd)
+        milld["name"] = msgd["stage"]["name"]
+        milld["start_time"] = msgd["start_time"]
+        milld["end_time"] = msgd["end_time"]
+        milld["duration"] = msgd["end_time"] - msgd["start_time"]
+        milld["milling_current"] = msgd["stage"]["milling"]["milling_current"]
+        milld["depth"] = msgd["stage"]["pattern"].get("depth", 0)
+        # TODO: what other attrs are useful?
+        self.tables["milling"].append(milld)
+
+
+def parse_log_incremental(path: Path, encoding: str = "cp1252") -> LogParser:
+    """Parse the experiment telemetry (telemetry.jsonl) or log file, resuming from the persisted 
+    parse index (logfile.index.json). Only lines appended since the last call are parsed. The index 
+    is rebuilt if the file was replaced or truncated, or parsed with a different encoding.
+    Args:
+        path: the experiment path
+        encoding: the log file encoding (not used for telemetry)
+    Returns:
+        LogParser: the parser, with the accumulated tables
+    """
+    # use the structured telemetry if available, otherwise parse the text log
+    fname = os.path.join(path, TELEMETRY_FILENAME)
+    use_telemetry = os.path.exists(fname)
+    if use_telemetry:
+        encoding = "utf-8"
+    else:
+        fname = os.path.join(path, "logfile.log")
+    index_fname = os.path.join(path, LOG_INDEX_FILENAME)
+
+    # the start of the log identifies the file
+    with open(fname, "rb") as f:
+        head = f.read(LOG_INDEX_HEAD_SIZE)
+
+    parser, offset = LogParser(), 0
+    if os.path.exists(index_fname):
+        try:
+            with open(index_fname, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if (index["version"] == LOG_INDEX_VERSION and index["encoding"] == encoding
+                and index["source"] == os.path.basename(fname)
+                and bytes.fromhex(index["head"]) == head[:len(index["head"]) // 2]
+                and index["offset"] <= os.path.getsize(fname)):
+                parser, offset = LogParser.from_dict(index["parser"]), index["offset"]
+        except Exception as e:
+            logging.warning(f"Failed to load log index {index_fname}, re-parsing log: {e}")
+
+    if use_telemetry:
+        offset = parser.parse_telemetry_file(fname, offset=offset)
+    else:
+        offset = parser.parse_file(fname, encoding=encoding, offset=offset)
+
+    index = {"version": LOG_INDEX_VERSION, "source": os.path.basename(fname), "encoding": encoding, 
+             "head": head.hex(), "offset": offset, "parser": parser.to_dict()}
+    tmp_fname = index_fname + ".tmp"
+    try:
+        with open(tmp_fname, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_fname, index_fname)
+    except (TypeError, ValueError) as e: # values that can't be written as json, re-parsed next time
+        logging.warning(f"Failed to write log index {index_fname}: {e}")
+        os.remove(tmp_fname)
+
+    return parser
+
+
+def write_statistics_tables(path: Path, tables: Dict[str, pd.DataFrame], exp_id: str, 
+                            output_format: str = None) -> None:
+    """Write the analytics tables for the experiment.
+    Args:
+        path: the experiment path
+        tables: the tables {name: dataframe}
+        exp_id: the experiment id (parquet partition)
+        output_format: "csv" (<table>.csv in the experiment directory) or "parquet" (typed tables, 
+            partitioned by experiment id, in the analytics directory). Default: cfg.ANALYTICS_OUTPUT_FORMAT
+    """
+    if output_format is None:
+        output_format = cfg.ANALYTICS_OUTPUT_FORMAT
+
+    if output_format == "parquet":
+        write_tables(os.path.join(path, ANALYTICS_DIRNAME), tables, exp_id=exp_id)
+        return
+
+    if output_format != "csv":
+        raise ValueError(f"Unsupported analytics output format: {output_format}, expected 'csv' or 'parquet'")
 
+    # write dataframes to csv, overwrite
+    for name, df in tables.items():
+        filename = os.path.join(path, f"{name}.csv")
+        df.to_csv(filename, mode='w', header=True, index=False)
+
+
+def get_statistics_signature(path: Path) -> Tuple[Tuple[str, int, int], ...]:
+    """Get the signature of the files the analytics tables are calculated from. The signature
+    changes when any of the files are modified.
+    Args:
+        path: the experiment path
+    Returns:
+        Tuple[Tuple[str, int, int], ...]: the (filename, mtime_ns, size) of each existing file
+    """
+    signature = []
+    for filename in STATISTICS_SOURCE_FILENAMES:
+        try:
+            st = os.stat(os.path.join(path, filename))
+        except FileNotFoundError:
+            continue
+        signature.append((filename, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def load_statistics_tables(path: Path, encoding: str = "cp1252", incremental: bool = True) -> Dict[str, pd.DataFrame]:
+    """Load the analytics tables for the experiment, from the experiment and its log.
+    Args:
+        path: the experiment path
+        encoding: the log file encoding
+        incremental: resume parsing from the persisted parse index (see parse_log_incremental)
+    Returns:
+        Dict[str, pd.DataFrame]: the tables {name: dataframe}, with exp_name and exp_id columns
+    """
     fname = os.path.join(path, "logfile.log")
-    df_beam_shift = []
-    current_lamella = "NULL" 
-    current_stage = "SystemSetup"
-    current_step = "SystemSetup"
-    step_n = 0 
-    steps_data = []
-    
-    state_data = []
-    stage_data = []
-    det_data = []
-    click_data = []
-    milling_data = []
 
-    print("-" * 80)
-    print(f"Parsing {fname}")
     # encoding = "cp1252" if "nt" in os.name else "cp1252" # TODO: this depends on the OS it was logged on, usually windows, need to make this more robust.
-    with open(fname, encoding=encoding) as f:
-        # Note: need to check the encoding as this is required for em dash (long dash) # TODO: change this delimiter so this isnt required.
-        lines = f.read().splitlines()
-        for i, line in enumerate(lines):
-
-            if line == "":
-                continue
-            try:
-                
-                # get timestamp, function, and message from log line
-                tsd, func, msg = parse_line(line)
-                # msgd = parse_msg(msg) # TODO: enable, and remove indiviudal calls
-
-                # TELEMETRY -> depcrecated in favour of manufacturer telemetry
-                if "get_microscope_state" in func:
-                    msgd = parse_msg(msg)
-
-                    state_data.append(deepcopy(msgd["state"]))
-                    
-                if "get_stage_position" in func:
-                    msgd = parse_msg(msg)
-                    staged = msgd["stage"]
-                    staged["timestamp"] = tsd
-                    staged["lamella"] = current_lamella
-                    staged["stage"] = current_stage
-                    staged["step"] = current_step
-                
-                    stage_data.append(deepcopy(staged))
-
-                if "log_status_message" in func:
-                    if "STATUS" in msg:
-                        continue        # skip old status messages 
-                    
-                    # global data
-                    tsd = get_timestamp(line)
-                    msgd = parse_msg(msg)
-                    current_lamella = msgd["petname"]
-                    current_stage = msgd["stage"]
-                    current_step = msgd["step"]
-
-                    # step data                    
-                    step_d = deepcopy(msgd)
-                    step_d["lamella"] = current_lamella
-                    step_d["timestamp"] = tsd
-                    step_d["step_n"] = step_n
-                    step_n += 1
-                    steps_data.append(deepcopy(step_d))
-
-                
-                if "beam_shift" in func:
-                    msgd = parse_msg(msg)
-                    msgd["timestamp"] = tsd
-                    msgd["lamella"] = current_lamella
-                    msgd["stage"] = current_stage
-                    msgd["step"] = current_step
-                    df_beam_shift.append(deepcopy(msgd))
-
-
-                # TODO: confirm this parses the correct data
-                if "confirm_button" in func or "save_ml" in func: # DETECTION INTERACTION
-                    # log detection data
-                    msgd = parse_msg(msg)
-                    detd = deepcopy(msgd)
-
-                    detd["px_x"] = msgd["px"]["x"]
-                    detd["px_y"] = msgd["px"]["y"]
-                    detd["dpx_x"] = msgd["dpx"]["x"]
-                    detd["dpx_y"] = msgd["dpx"]["y"]
-                    detd["dm_x"] = msgd["dm"]["x"]
-                    detd["dm_y"] = msgd["dm"]["y"]
-                    
-                    del detd["dpx"]
-                    del detd["dm"]
-                    del detd["px"]
-
-                    detd["timestamp"] = tsd
-                    detd["lamella"] = current_lamella
-                    detd["stage"] = current_stage
-                    detd["step"] = current_step
-                    det_data.append(deepcopy(detd))
-
-                    # log detection interaction
-                    if detd["is_correct"] == "False":
-                        click_d = {
-                            "lamella": detd["lamella"],
-                            "stage": detd["stage"],
-                            "step": detd["step"],
-                            "type": "DET",
-                            "subtype": detd["feature"],
-                            "dm_x": detd["dm_x"],
-                            "dm_y": detd["dm_y"],
-                            "beam_type": detd["beam_type"],
-                            "timestamp": detd["timestamp"],
-                        }
-                        click_data.append(deepcopy(click_d))    
-
-                if "_single_click" in func: # MILLING INTERACTION
-                    # log milling interaction
-                    msgd = parse_msg(msg)
-                    
-                    clickd = {}
-                    clickd["timestamp"] = tsd
-                    clickd["lamella"] = current_lamella
-                    clickd["stage"] = current_stage
-                    clickd["step"] = current_step
-                    
-                    clickd["dm_x"] = msgd["dm"]["x"]
-                    clickd["dm_y"] = msgd["dm"]["y"]
-                    clickd["type"] = "MILL"
-                    clickd["subtype"] = msgd["pattern"]
-                    clickd["beam_type"] = msgd["beam_type"]
-
-                    click_data.append(deepcopy(clickd))
-
-                if "_double_click" in func: # MOVEMENT INTERACTION
-                    
-                    # log movement interaction
-                    msgd = parse_msg(msg)
-                    clickd = {}
-                    clickd["timestamp"] = tsd
-                    clickd["lamella"] = current_lamella
-                    clickd["stage"] = current_stage
-                    clickd["step"] = current_step
-
-                    clickd["dm_x"] = msgd["dm"]["x"]
-                    clickd["dm_y"] = msgd["dm"]["y"]
-                    clickd["type"] = "MOVE"
-                    clickd["subtype"] = msgd["movement_mode"]
-                    clickd["beam_type"] = msgd["beam_type"]
-
-                    click_data.append(deepcopy(clickd))
-
-                if "mill_stages" in func:
-                    msgd = parse_msg(msg)
-
-                    milld = {}
-                    milld["timestamp"] = tsd
-                    milld["lamella"] = current_lamella
-                    milld["stage"] = current_stage
-                    milld["step"] = current_step
-                    milld["name"] = msgd["stage"]["name"]
-                    milld["start_time"] = msgd["start_time"]
-                    milld["end_time"] = msgd["end_time"]
-                    milld["duration"] = msgd["end_time"] - msgd["start_time"]
-                    milld["milling_current"] = msgd["stage"]["milling"]["milling_current"]
-                    milld["depth"] = msgd["stage"]["pattern"].get("depth", 0)
-                    # TODO: what other attrs are useful?
-                    milling_data.append(deepcopy(milld))
-
-            except Exception as e:
-                # print(e, " | ", line)
-                pass
+    if incremental:
+        parser = parse_log_incremental(path, encoding=encoding)
+    elif os.path.exists(os.path.join(path, TELEMETRY_FILENAME)):
+        parser = LogParser()
+        parser.parse_telemetry_file(os.path.join(path, TELEMETRY_FILENAME))
+    else:
+        parser = LogParser()
+        parser.parse_file(fname, encoding=encoding)
+    dfs = parser.to_dataframes()
  
-    # experiment
-    experiment = Experiment.load(os.path.join(path, "experiment.yaml"))
-    df_experiment = experiment.__to_dataframe__()
-    df_history = experiment.history_dataframe()
-    df_steps = pd.DataFrame(steps_data)
-    df_stage = pd.DataFrame(stage_data)
-    df_det = pd.DataFrame(det_data)
-    df_beam_shift = pd.DataFrame.from_dict(df_beam_shift) # TODO: remove this, not used
-    df_click = pd.DataFrame(click_data)
-    df_milling = pd.DataFrame(milling_data)
-    
-    df_steps["duration"] = df_steps["timestamp"].diff() # TODO: fix this duration
-    df_steps["duration"] = df_steps["duration"].shift(-1)
-
-
-    # add date and name to all dataframes
-    df_experiment["exp_name"] = experiment.name
-    df_history["exp_name"] = experiment.name
-    df_beam_shift["exp_name"] = experiment.name
-    df_steps["exp_name"] = experiment.name
-    df_stage["exp_name"] = experiment.name
-    df_det["exp_name"] = experiment.name
-    df_click["exp_name"] = experiment.name
-    df_milling["exp_name"] = experiment.name
-
-    # add experiment id to all df
-    df_history["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_beam_shift["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_steps["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_stage["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_det["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_click["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
-    df_milling["exp_id"] = experiment._id if experiment._id is not None else "NO_ID"
+    # experiment (without configuring logging, which would write to the experiment log)
+    experiment = Experiment.load(os.path.join(path, cfg.EXPERIMENT_FILENAME), setup_logging=False)
+    df_steps = dfs["steps"]
+    if "timestamp" in df_steps:
+        df_steps["duration"] = df_steps["timestamp"].diff() # TODO: fix this duration
+        df_steps["duration"] = df_steps["duration"].shift(-1)
+
+    tables = {
+        "experiment": experiment.__to_dataframe__(),
+        "history": experiment.history_dataframe(),
+        "beam_shift": dfs["beam_shift"], # TODO: remove this, not used
+        "steps": df_steps,
+        "stage": dfs["stage"],
+        "det": dfs["det"],
+        "click": dfs["click"],
+        "milling": dfs["milling"],
+    }
+
+    # add experiment name and id to all dataframes
+    exp_id = experiment._id if experiment._id is not None else "NO_ID"
+    for df in tables.values():
+        df["exp_name"] = experiment.name
+        df["exp_id"] = exp_id
+
+    return tables
+
+
+def get_partition_id(tables: Dict[str, pd.DataFrame]) -> str:
+    """Get the partition id for the experiment tables. Experiments without an id (NO_ID)
+    are partitioned by name.
+    Args:
+        tables: the tables {name: dataframe}, from load_statistics_tables
+    Returns:
+        str: the experiment id, or name
+    """
+    for df in tables.values():
+        if len(df) == 0:
+            continue
+        exp_id, exp_name = df["exp_id"].iloc[0], df["exp_name"].iloc[0]
+        return exp_name if exp_id == "NO_ID" else exp_id
+    return "NO_ID"
 
-    # write dataframes to csv, overwrite
-    filename = os.path.join(path, 'history.csv')
-    df_history.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'beam_shift.csv')
-    df_beam_shift.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'experiment.csv')
-    df_experiment.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'steps.csv')
-    df_steps.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'stage.csv')
-    df_stage.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'det.csv')
-    df_det.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'click.csv')
-    df_click.to_csv(filename, mode='w', header=True, index=False)
-    filename = os.path.join(path, 'milling.csv')
-    df_milling.to_csv(filename, mode='w', header=True, index=False)
-
-    return df_experiment, df_history, df_beam_shift, df_steps, df_stage, df_det, df_click, df_milling
+
+def calculate_statistics_dataframe(path: Path, encoding: str = "cp1252", incremental: bool = True, 
+                                   output_format: str = None):
+
+    fname = os.path.join(path, "logfile.log")
+
+    print("-" * 80)
+    print(f"Parsing {fname}")
+    tables = load_statistics_tables(path, encoding=encoding, incremental=incremental)
+    write_statistics_tables(path, tables, exp_id=get_partition_id(tables), output_format=output_format)
+
+    return tuple(tables[name] for name in ANALYTICS_TABLES)
@@ -1,35 +1,22 @@
+from __future__ import annotations
+
 import glob
+import hashlib
+import html
+import importlib.util
 import io
+import json
 import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
 from datetime import datetime
 from pprint import pprint
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from fibsem.imaging.tiled import plot_stage_positions_on_image
-from fibsem.milling import get_milling_stages
-from fibsem.milling.patterning.plotting import draw_milling_patterns
 from fibsem.structures import FibsemImage
-from plotly.subplots import make_subplots
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import (
-    Image,
-    PageBreak,
-    Paragraph,
-    SimpleDocTemplate,
-    Spacer,
-    Table,
-    TableStyle,
-)
 
 from autolamella.protocol.validation import (
     FIDUCIAL_KEY,
@@ -46,11 +33,34 @@ from autolamella.structures import (
     Lamella,
     get_completed_stages,
 )
-from autolamella.tools.data import calculate_statistics_dataframe
+from autolamella.tools.thumbnails import load_thumbnail
+
+# the plotting and pdf libraries (and pandas) are slow to import, and are loaded on first use
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import plotly.graph_objects as go
+
+REPORT_CACHE_FILENAME = "report.cache"
+REPORT_CACHE_MANIFEST = "cache.json"
+REPORT_CACHE_VERSION = 2
+REPORT_FIGURES = ["summary", "milling"]
+REPORTING_DEPENDENCIES = ["matplotlib", "pandas", "plotly", "reportlab"]
+INCH = 72.0 # points, as reportlab.lib.units.inch
+
+
+def is_reporting_available() -> bool:
+    """Check the reporting dependencies are installed (without importing them)."""
+    return all(importlib.util.find_spec(name) is not None for name in REPORTING_DEPENDENCIES)
 
 
 class PDFReportGenerator:
     def __init__(self, output_filename: str):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.platypus import SimpleDocTemplate
+
         self.output_filename = output_filename
         self.doc = SimpleDocTemplate(
             output_filename,
@@ -83,6 +93,7 @@ class PDFReportGenerator:
 
     def add_title(self, title, subtitle=None):
         """Add a title and optional subtitle to the document"""
+        from reportlab.platypus import Paragraph, Spacer
         self.story.append(Paragraph(title, self.styles['CustomTitle']))
         if subtitle:
             self.story.append(Paragraph(subtitle, self.styles['Subtitle']))
@@ -90,27 +101,33 @@ class PDFReportGenerator:
 
     def add_heading(self, text, level=2):
         """Add a heading with specified level"""
+        from reportlab.platypus import Paragraph, Spacer
         style = self.styles[f'Heading{level}']
         self.story.append(Paragraph(text, style))
         self.story.append(Spacer(1, 12))
 
     def add_paragraph(self, text):
         """Add a paragraph of text"""
+        from reportlab.platypus import Paragraph, Spacer
         self.story.append(Paragraph(text, self.styles['Normal']))
         self.story.append(Spacer(1, 12))
 
     def add_page_break(self):
         """Add a page break"""
+        from reportlab.platypus import PageBreak
         self.story.append(PageBreak())
 
-    def add_image(self, path: str, width=6*inch, height=4*inch):
+    def add_image(self, path: str, width=6*INCH, height=4*INCH):
         """Add an image to the PDF"""
+        from reportlab.platypus import Image, Spacer
         img = Image(path, width=width, height=height)
         self.story.append(img)
         self.story.append(Spacer(1, 20))
 
     def add_dataframe(self, df, title=None, includes_totals=False):
         """Add a pandas DataFrame as a table"""
+        from reportlab.lib import colors
+        from reportlab.platypus import Spacer, Table, TableStyle
         if title:
             self.add_heading(title, 3)
         
@@ -146,6 +163,8 @@ class PDFReportGenerator:
         """Add a matplotlib plot
         plot_function should be a function that creates and returns a matplotlib figure
         """
+        import matplotlib.pyplot as plt
+        from reportlab.platypus import Image, Spacer
         if title:
             self.add_heading(title, 3)
         
@@ -156,17 +175,22 @@ class PDFReportGenerator:
         img_buffer.seek(0)
         
         # Add plot to story
-        img = Image(img_buffer, width=6*inch, height=4*inch)
+        img = Image(img_buffer, width=6*INCH, height=4*INCH)
         self.story.append(img)
         self.story.append(Spacer(1, 20))
         plt.close(fig)
 
     def add_mpl_figure(self, fig):
-        fig.savefig('temp.png', format='png', bbox_inches='tight', dpi=300)
-        self.story.append(Image('temp.png'))
+        self.add_png(figure_to_png(fig))
+
+    def add_png(self, png: bytes, width=6*INCH, height=4*INCH):
+        """Add a rendered png image (in memory) to the PDF"""
+        from reportlab.platypus import Image
+        self.story.append(Image(io.BytesIO(png), width=width, height=height))
 
-    def add_plotly_figure(self, fig, title=None, width=6.5*inch, height=4*inch):
+    def add_plotly_figure(self, fig, title=None, width=6.5*INCH, height=4*INCH):
         """Add a Plotly figure to the PDF"""
+        from reportlab.platypus import Image, Spacer
         if title:
             self.add_heading(title, 3)
         
@@ -185,8 +209,114 @@ class PDFReportGenerator:
         """Generate the PDF document"""
         self.doc.build(self.story)
 
+HTML_REPORT_STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em auto; max-width: 1200px; color: #222; }
+h1, .subtitle { text-align: center; } .subtitle { color: grey; }
+table.dataframe { border-collapse: collapse; margin-bottom: 1em; }
+table.dataframe th { background: #2F4F4F; color: whitesmoke; }
+table.dataframe th, table.dataframe td { border: 1px solid black; padding: 4px 8px; text-align: center; }
+.image-grid { display: flex; flex-wrap: wrap; gap: 8px; }
+.image-grid figure { margin: 0; width: 280px; } .image-grid img { width: 100%; }
+figcaption { font-size: 0.8em; color: grey; word-break: break-all; }
+"""
+
+class HTMLReportGenerator:
+    """Interactive HTML report, with the same interface as PDFReportGenerator.
+    Plotly figures are embedded as json (plotly.js is included once), and images are 
+    written next to the report ({name}_files/) as thumbnails that are loaded lazily."""
+    def __init__(self, output_filename: str, include_plotlyjs: str = "inline"):
+        self.output_filename = output_filename
+        self.include_plotlyjs = include_plotlyjs # inline (offline) or cdn
+        self.assets_dirname = f"{os.path.splitext(os.path.basename(output_filename))[0]}_files"
+        self.assets_path = os.path.join(os.path.dirname(os.path.abspath(output_filename)), self.assets_dirname)
+        self.body = []
+        self._n_assets = 0
+
+    def add_title(self, title, subtitle=None):
+        """Add a title and optional subtitle to the document"""
+        self.body.append(f"<h1>{html.escape(title)}</h1>")
+        if subtitle:
+            self.body.append(f'<p class="subtitle">{html.escape(subtitle)}</p>')
+
+    def add_heading(self, text, level=2):
+        """Add a heading with specified level"""
+        self.body.append(f"<h{level}>{html.escape(text)}</h{level}>")
+
+    def add_paragraph(self, text):
+        """Add a paragraph of text"""
+        self.body.append(f"<p>{html.escape(text)}</p>")
+
+    def add_page_break(self):
+        """Add a page break"""
+        self.body.append("<hr>")
+
+    def add_dataframe(self, df, title=None, includes_totals=False):
+        """Add a pandas DataFrame as a table"""
+        if title:
+            self.add_heading(title, 3)
+        self.body.append(df.to_html(index=False, na_rep=""))
+
+    def add_plotly_figure(self, fig, title=None, width=None, height=None):
+        """Add a Plotly figure (interactive) to the report"""
+        if fig is None:
+            return
+        if title:
+            self.add_heading(title, 3)
+        div_id = f"figure-{self._next_asset_id()}"
+        self.body.append(f'<div id="{div_id}"></div>')
+        fig_json = fig.to_json().replace("</", "<\\/") # don't close the script tag
+        self.body.append(f'<script>(function() {{ var fig = {fig_json}; '
+                         f'Plotly.newPlot("{div_id}", fig.data, fig.layout, {{"responsive": true}}); }})();</script>')
+
+    def add_png(self, png: bytes, caption: str = None):
+        """Add a rendered png image to the report"""
+        src = self._write_asset(png, "png")
+        self.body.append(self._figure(src, caption))
+
+    def add_images(self, filenames, width: int = 512):
+        """Add a grid of (thumbnail) images to the report, loaded lazily"""
+        from PIL import Image as PILImage
+        figures = []
+        for fname in filenames:
+            thumbnail = load_thumbnail(fname, width=width)
+            img_buffer = io.BytesIO()
+            PILImage.fromarray(thumbnail.data).save(img_buffer, format="png")
+            src = self._write_asset(img_buffer.getvalue(), "png")
+            figures.append(self._figure(src, os.path.basename(fname)))
+        self.body.append(f'<div class="image-grid">{"".join(figures)}</div>')
+
+    def generate(self):
+        """Generate the HTML document"""
+        if self.include_plotlyjs == "cdn":
+            from plotly.offline import get_plotlyjs_version
+            plotlyjs = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+        else:
+            from plotly.offline import get_plotlyjs
+            plotlyjs = f"<script>{get_plotlyjs()}</script>"
+        body = "\n".join(self.body)
+        with open(self.output_filename, "w", encoding="utf-8") as f:
+            f.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                    f'<style>{HTML_REPORT_STYLE}</style>\n{plotlyjs}\n</head>\n'
+                    f'<body>\n{body}\n</body>\n</html>\n')
+
+    def _next_asset_id(self) -> int:
+        self._n_assets += 1
+        return self._n_assets
+
+    def _write_asset(self, data: bytes, ext: str) -> str:
+        os.makedirs(self.assets_path, exist_ok=True)
+        basename = f"asset-{self._next_asset_id()}.{ext}"
+        with open(os.path.join(self.assets_path, basename), "wb") as f:
+            f.write(data)
+        return f"{self.assets_dirname}/{basename}"
+
+    def _figure(self, src: str, caption: str = None) -> str:
+        figcaption = f"<figcaption>{html.escape(caption)}</figcaption>" if caption else ""
+        return f'<figure><img src="{src}" loading="lazy">{figcaption}</figure>'
+
 def plot_lamella_milling_workflow(p: Lamella) -> plt.Figure:
-    
+    from fibsem.milling import get_milling_stages
+    from fibsem.milling.patterning.plotting import draw_milling_patterns
     # DRAW MILLING PATTERNS
     milling_workflows = [MILL_ROUGH_KEY, MILL_POLISHING_KEY, MICROEXPANSION_KEY, FIDUCIAL_KEY]
     milling_stages = []
@@ -208,12 +338,24 @@ def plot_lamella_milling_workflow(p: Lamella) -> plt.Figure:
 
     return fig
 
+def get_stage_image_filenames(p: Lamella, stage_name: str) -> List[str]:
+    """Get the final reference images for the lamella workflow stage."""
+    filenames = sorted(glob.glob(os.path.join(p.path, f"ref_{stage_name}*_final_*_res*.tif*")))
+
+    # for backwards compatibility
+    if stage_name == "SetupLamella":
+        tmp_filenames = sorted(glob.glob(os.path.join(p.path, "ref_ReadyLamella*_final_*_res*.tif*")))
+        if len(tmp_filenames) > len(filenames):
+            filenames = tmp_filenames
+    return filenames
+
 def plot_lamella_summary(p: Lamella, 
                          method: AutoLamellaMethod = AutoLamellaMethod.ON_GRID, 
                          show_title: bool = False, 
                          figsize: Tuple[int, int] = (30, 5), 
                          show: bool = False) -> plt.Figure:
     """Plot the final images for each stage of the lamella workflow."""
+    import matplotlib.pyplot as plt
 
     # get completed stages
     completed_stages = get_completed_stages(p, method=method)
@@ -233,13 +375,7 @@ def plot_lamella_summary(p: Lamella,
             ax = axes[i]
 
         stage_name = s.name
-        filenames = sorted(glob.glob(os.path.join(p.path, f"ref_{stage_name}*_final_*_res*.tif*")))
-
-        # for backwards compatibility
-        if stage_name == "SetupLamella":
-            tmp_filenames = sorted(glob.glob(os.path.join(p.path, "ref_ReadyLamella*_final_*_res*.tif*")))
-            if len(tmp_filenames) > len(filenames):
-                filenames = tmp_filenames
+        filenames = get_stage_image_filenames(p, stage_name)
 
         if len(filenames) == 0:
             logging.info(f"No images found for {p.name} - {s.name}")
@@ -250,22 +386,16 @@ def plot_lamella_summary(p: Lamella,
             continue
         try:
             for j, fname in enumerate(filenames):
-                img = FibsemImage.load(fname)
-
-                # resize image, maintain aspect ratio
-                from PIL import Image as PILImage
-                shape = img.data.shape
-                target_size = 256
-                resize_shape = (int(shape[0] * (target_size / shape[1])), target_size)
-                arr = np.asarray(PILImage.fromarray(img.data).resize(resize_shape[::-1]))
+                # downsampled image, from the thumbnail cache
+                thumbnail = load_thumbnail(fname, width=256)
 
-                ax[j].imshow(arr, cmap="gray")
+                ax[j].imshow(thumbnail.data, cmap="gray")
                 ax[j].axis("off")
 
                 # add scalebar
                 from matplotlib_scalebar.scalebar import ScaleBar
                 scalebar = ScaleBar(
-                    dx=img.metadata.pixel_size.x * (shape[1] / target_size),
+                    dx=thumbnail.pixel_size,
                     color="black",
                     box_color="white",
                     box_alpha=0.5,
@@ -296,7 +426,168 @@ def plot_lamella_summary(p: Lamella,
 
     return fig
 
+def figure_to_png(fig: plt.Figure, dpi: int = 300) -> bytes:
+    """Render the figure to a png image (in memory), and close it."""
+    import matplotlib.pyplot as plt
+    img_buffer = io.BytesIO()
+    fig.savefig(img_buffer, format='png', bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    return img_buffer.getvalue()
+
+def render_lamella_figures(p: Lamella, method: AutoLamellaMethod) -> Dict[str, bytes]:
+    """Render the report figures for the lamella as png images.
+    Args:
+        p: the lamella
+        method: the experiment method
+    Returns:
+        Dict[str, bytes]: the rendered figures {"summary": png, "milling": png}, None if not available
+    """
+    figures = dict.fromkeys(REPORT_FIGURES)
+
+    # final images for each workflow stage
+    fig = plot_lamella_summary(p, method=method)
+    if fig is None:
+        return figures
+    figures["summary"] = figure_to_png(fig)
+
+    # milling patterns
+    fig = plot_lamella_milling_workflow(p)
+    if fig is not None:
+        figures["milling"] = figure_to_png(fig)
+
+    return figures
+
+def get_lamella_report_key(p: Lamella, method: AutoLamellaMethod) -> str:
+    """Get the cache key for the lamella report figures. The key changes when the lamella 
+    (state, history, protocol) or its reference images change.
+    Args:
+        p: the lamella
+        method: the experiment method
+    Returns:
+        str: the cache key
+    """
+    images = []
+    for fname in sorted(glob.glob(os.path.join(p.path, "ref_*_final_*_res*.tif*"))):
+        st = os.stat(fname)
+        images.append((os.path.basename(fname), st.st_mtime_ns, st.st_size))
+    data = {"version": REPORT_CACHE_VERSION, "method": method.name, 
+            "lamella": p.to_dict(), "images": images}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def load_cached_lamella_figures(p: Lamella, key: str) -> Optional[Dict[str, bytes]]:
+    """Load the lamella report figures from the report cache (report.cache/), if the key matches."""
+    cache_path = os.path.join(p.path, REPORT_CACHE_FILENAME)
+    manifest_fname = os.path.join(cache_path, REPORT_CACHE_MANIFEST)
+    if not os.path.exists(manifest_fname):
+        return None
+    try:
+        with open(manifest_fname, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["key"] != key:
+            return None
+        figures = {}
+        for name, exists in manifest["figures"].items():
+            figures[name] = None
+            if exists:
+                with open(os.path.join(cache_path, _cached_figure_filename(name)), "rb") as f:
+                    figures[name] = f.read()
+        return figures
+    except Exception as e:
+        logging.warning(f"Failed to load report cache {cache_path}: {e}")
+    return None
+
+def save_cached_lamella_figures(p: Lamella, key: str, figures: Dict[str, bytes]) -> None:
+    """Save the lamella report figures to the report cache (in the lamella directory), 
+    as png files and a json manifest with the key."""
+    if not os.path.isdir(p.path):
+        return
+    cache_path = os.path.join(p.path, REPORT_CACHE_FILENAME)
+    manifest_fname = os.path.join(cache_path, REPORT_CACHE_MANIFEST)
+    os.makedirs(cache_path, exist_ok=True)
+
+    # remove the manifest first, so the figures are never loaded with a stale key
+    if os.path.exists(manifest_fname):
+        os.remove(manifest_fname)
+    for name, png in figures.items():
+        if png is not None:
+            with open(os.path.join(cache_path, _cached_figure_filename(name)), "wb") as f:
+                f.write(png)
+
+    manifest = {"key": key, "figures": {name: png is not None for name, png in figures.items()}}
+    tmp_fname = manifest_fname + ".tmp"
+    with open(tmp_fname, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_fname, manifest_fname)
+
+def _cached_figure_filename(name: str) -> str:
+    # only the report figures are read, the manifest can't point at other files
+    if name not in REPORT_FIGURES:
+        raise ValueError(f"Unknown report figure: {name}")
+    return f"{name}.png"
+
+def _init_report_worker() -> None:
+    import matplotlib
+    matplotlib.use("Agg") # render without a display
+
+def render_report_figures(positions: List[Lamella], method: AutoLamellaMethod, 
+                          max_workers: Optional[int] = None, 
+                          use_cache: bool = True) -> Dict[str, Dict[str, bytes]]:
+    """Render the report figures for each lamella in parallel (one lamella per process).
+    Lamellae that haven't changed since the last report reuse the cached figures.
+    Args:
+        positions: the lamellae
+        method: the experiment method
+        max_workers: the number of processes (default: number of cpus), 1 renders in this process
+        use_cache: use (and update) the per-lamella report cache
+    Returns:
+        Dict[str, Dict[str, bytes]]: the rendered figures per lamella {name: figures}, 
+            lamellae that fail to render are not included
+    """
+    figures, keys = {}, {}
+    if use_cache:
+        for p in positions:
+            keys[p.name] = get_lamella_report_key(p, method)
+            cached = load_cached_lamella_figures(p, keys[p.name])
+            if cached is not None:
+                figures[p.name] = cached
+        positions = [p for p in positions if p.name not in figures]
+        logging.info(f"Report cache: {len(figures)} cached, {len(positions)} to render")
+
+    rendered = _render_report_figures(positions, method, max_workers=max_workers)
+
+    if use_cache:
+        for p in positions:
+            if p.name in rendered:
+                save_cached_lamella_figures(p, keys[p.name], rendered[p.name])
+
+    figures.update(rendered)
+    return figures
+
+def _render_report_figures(positions: List[Lamella], method: AutoLamellaMethod, 
+                           max_workers: Optional[int] = None) -> Dict[str, Dict[str, bytes]]:
+    figures = {}
+    if max_workers == 1 or len(positions) <= 1:
+        for p in positions:
+            try:
+                figures[p.name] = render_lamella_figures(p, method)
+            except Exception as e:
+                logging.error(f"Error rendering figures for {p.name}: {e}")
+        return figures
+
+    # spawn, the report is generated from a ui thread
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=_init_report_worker) as executor:
+        futures = {executor.submit(render_lamella_figures, p, method): p.name for p in positions}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                figures[name] = future.result()
+            except Exception as e:
+                logging.error(f"Error rendering figures for {name}: {e}")
+    return figures
+
 def get_lamella_figures(p: Lamella, exp_path: str) -> dict:
+    import matplotlib.pyplot as plt
 
     p.path = os.path.join(exp_path, p.name)
 
@@ -326,6 +617,7 @@ def plot_multi_gantt(df: pd.DataFrame, color_by='piece_id', barmode='group') ->
     - color_by: Column to use for color coding ('piece_id' or 'step')
     - barmode: 'group' or 'overlay' for how bars should be displayed
     """
+    import plotly.express as px
     fig = px.timeline(
         df, 
         x_start='start_time',
@@ -355,6 +647,7 @@ def plot_multi_gantt(df: pd.DataFrame, color_by='piece_id', barmode='group') ->
     return fig
 
 def generate_workflow_steps_timeline(df: pd.DataFrame) -> Dict[str, go.Figure]:
+    import pandas as pd
 
     timezone = datetime.now().astimezone().tzinfo
 
@@ -378,6 +671,7 @@ def generate_workflow_steps_timeline(df: pd.DataFrame) -> Dict[str, go.Figure]:
 
 
 def generate_workflow_timeline(df: pd.DataFrame) -> go.Figure:
+    import pandas as pd
 
     # drop rows with duration over 1 day
     df = df[df["duration"] < 86400]
@@ -396,6 +690,8 @@ def generate_workflow_timeline(df: pd.DataFrame) -> go.Figure:
     return fig
 
 def generate_report_timeline(df: pd.DataFrame):
+    import pandas as pd
+    import plotly.express as px
     # plot time series with x= step_n and y = timestamp with step  as hover text
     df.dropna(inplace=True)
     df.duration = df.duration.astype(int)
@@ -417,6 +713,8 @@ def generate_report_timeline(df: pd.DataFrame):
     return fig_timeline
 
 def generate_interaction_timeline(df: pd.DataFrame) -> go.Figure:
+    import pandas as pd
+    import plotly.express as px
 
     if len(df) == 0:
         return None
@@ -440,6 +738,8 @@ def generate_interaction_timeline(df: pd.DataFrame) -> go.Figure:
     return fig_timeline
 
 def generate_duration_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, go.Figure]:
+    import pandas as pd
+    import plotly.express as px
     df = df.copy()
     df.rename(columns={"petname": "Name", "stage": "Workflow"}, inplace=True)
 
@@ -456,8 +756,10 @@ def generate_duration_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, go.Figure]:
     df = df[~df["Workflow"].isin(columns_to_drop)]
 
 
-    fig_duration = px.bar(df, x="Name", y="duration", 
-                        color="Workflow", barmode="group")
+    # plotly can't serialise timedeltas, plot in minutes
+    df_plot = df.assign(duration=df["duration"].dt.total_seconds() / 60)
+    fig_duration = px.bar(df_plot, x="Name", y="duration", 
+                        color="Workflow", barmode="group", labels={"duration": "Duration (min)"})
     
     return df[["Name", "Workflow", "Duration"]], fig_duration
 
@@ -476,6 +778,7 @@ def generate_experiment_summary(df: pd.DataFrame) -> go.Figure:
 
 
 def generate_report_data(experiment: Experiment, encoding: str = "cp1252") -> dict:
+    from autolamella.tools.data import calculate_statistics_dataframe
 
     REPORT_DATA = {}
 
@@ -507,10 +810,31 @@ def generate_report_data(experiment: Experiment, encoding: str = "cp1252") -> di
 
     return REPORT_DATA
 
+def _add_report_summary(report, report_data: dict) -> None:
+    """Add the experiment summary, timelines and durations to the report (PDF or HTML)."""
+    report.add_title(f"AutoLamella Report: {report_data['experiment_name']}",
+                  f'Generated on {datetime.now().strftime("%B %d, %Y")}')
+    report.add_paragraph('This report summarises the results of the AutoLamella experiment.')
+    report.add_dataframe(report_data["experiment_summary_dataframe"], 'Experiment Summary')
+
+    # timeline
+    report.add_page_break()
+    report.add_plotly_figure(report_data["workflow_timeline_plot"], "Workflow Timeline")
+    for stage_name, fig in report_data["step_timeline_plots"].items():
+        report.add_plotly_figure(fig, f"{stage_name} Timeline")
+
+    # report.add_plotly_figure(report_data["interactions_timeline_plot"], "Interaction Timeline")
+
+    # duration
+    # report.add_dataframe(report_data["duration_dataframe"], 'Workflow Duration')
+    report.add_plotly_figure(report_data["duration_plot"], "Workflow Duration by Lamella")
+
 # report generation
 def generate_report(experiment: Experiment, 
                     output_filename: str = "autolamella.pdf", 
-                    encoding="cp1252"):
+                    encoding="cp1252",
+                    max_workers: Optional[int] = None,
+                    use_cache: bool = True):
 
     report_data = generate_report_data(experiment, encoding=encoding)
 
@@ -518,22 +842,7 @@ def generate_report(experiment: Experiment,
     pdf = PDFReportGenerator(output_filename=output_filename)
     
     # Add content
-    pdf.add_title(f"AutoLamella Report: {report_data['experiment_name']}",
-                  f'Generated on {datetime.now().strftime("%B %d, %Y")}')
-    pdf.add_paragraph('This report summarises the results of the AutoLamella experiment.')
-    pdf.add_dataframe(report_data["experiment_summary_dataframe"], 'Experiment Summary')
-
-    # timeline
-    pdf.add_page_break()
-    pdf.add_plotly_figure(report_data["workflow_timeline_plot"], "Workflow Timeline")
-    for stage_name, fig in report_data["step_timeline_plots"].items():
-        pdf.add_plotly_figure(fig, f"{stage_name} Timeline")
-
-    # pdf.add_plotly_figure(report_data["interactions_timeline_plot"], "Interaction Timeline")
-
-    # duration
-    # pdf.add_dataframe(report_data["duration_dataframe"], 'Workflow Duration')
-    pdf.add_plotly_figure(report_data["duration_plot"], "Workflow Duration by Lamella")
+    _add_report_summary(pdf, report_data)
 
     # TODO: 
     # show overall summary
@@ -547,12 +856,16 @@ def generate_report(experiment: Experiment,
     # if "Waffle" in experiment.name:
         # method = AutoLamellaMethod.WAFFLE
 
-    os.makedirs("tmp", exist_ok=True)
     df_history = experiment.history_dataframe()
 
+    # render the lamella figures in parallel, and assemble in lamella order
     for p in experiment.positions:
-        print(f"exporting: {p.name}")
         p.path = os.path.join(experiment.path, p.name)
+    lamella_figures = render_report_figures(experiment.positions, method=experiment.method, 
+                                            max_workers=max_workers, use_cache=use_cache)
+
+    for p in experiment.positions:
+        print(f"exporting: {p.name}")
         pdf.add_page_break()
         pdf.add_heading(f"Lamella: {p.name}")
 
@@ -561,30 +874,58 @@ def generate_report(experiment: Experiment,
 
         pdf.add_dataframe(df, 'Workflow Duration')
 
-        # display final images for each workflow stage
-        fig = plot_lamella_summary(p, method=experiment.method)
-        if fig is None:
-            continue
-        # save figure to temp file
-        fname = f'tmp/tmp-{p.name}.png'
-        fig.savefig(fname, format='png', bbox_inches='tight', dpi=300)
-        plt.close()
-        pdf.story.append(Image(fname, width=6*inch, height=4*inch))
-
-        # add milling patterns
-        fig = plot_lamella_milling_workflow(p)
-        if fig is None:
-            continue
-        # save figure to temp file
-        fname = f'tmp/tmp-milling-{p.name}.png'
-        fig.savefig(fname, format='png', bbox_inches='tight', dpi=300)
-        plt.close()
-        pdf.story.append(Image(fname, width=6*inch, height=4*inch))
+        # display final images for each workflow stage, and milling patterns
+        figures = lamella_figures.get(p.name, {})
+        for key in ["summary", "milling"]:
+            if figures.get(key) is None:
+                break
+            pdf.add_png(figures[key])
 
 
     # Generate PDF
     pdf.generate()
 
+def generate_html_report(experiment: Experiment, 
+                         output_filename: str = "autolamella.html", 
+                         encoding="cp1252",
+                         include_plotlyjs: str = "inline"):
+    """Generate an interactive HTML report for the experiment. The plotly figures are not
+    rasterised, and the lamella images are shown as thumbnails, so this is much faster to 
+    generate (and open) than the PDF report for large experiments.
+    Args:
+        experiment: the experiment
+        output_filename: the report filename, the images are written to {name}_files/
+        encoding: the log file encoding
+        include_plotlyjs: include plotly.js in the report ("inline", works offline) or from the "cdn"
+    """
+    report_data = generate_report_data(experiment, encoding=encoding)
+
+    report = HTMLReportGenerator(output_filename=output_filename, include_plotlyjs=include_plotlyjs)
+    _add_report_summary(report, report_data)
+
+    df_history = experiment.history_dataframe()
+    for p in experiment.positions:
+        p.path = os.path.join(experiment.path, p.name)
+        report.add_page_break()
+        report.add_heading(f"Lamella: {p.name}")
+
+        df = df_history[df_history["petname"] == p.name]
+        df, _ = generate_duration_data(df)
+        report.add_dataframe(df, 'Workflow Duration')
+
+        # final images for each workflow stage
+        for s in get_completed_stages(p, method=experiment.method):
+            filenames = get_stage_image_filenames(p, s.name)
+            if not filenames:
+                continue
+            report.add_heading(s.name, 4)
+            try:
+                report.add_images(filenames)
+            except Exception as e:
+                logging.error(f"Error adding images for {p.name} - {s.name}: {e}")
+
+    report.generate()
+
 def generate_final_overview_image(exp: Experiment, 
                                   image: FibsemImage, 
                                   state: AutoLamellaStage = AutoLamellaStage.PositionReady) -> plt.Figure:
@@ -595,6 +936,7 @@ def generate_final_overview_image(exp: Experiment,
         state (AutoLamellaStage): The state to plot.
     Returns:
         plt.Figure: The figure with the overview image and the positions."""
+    from fibsem.imaging.tiled import plot_stage_positions_on_image
 
     sem_positions = []
     for p in exp.positions:
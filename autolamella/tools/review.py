@@ -8,6 +8,7 @@ from fibsem.structures import FibsemImage
 
 import autolamella.config as cfg
 from autolamella.structures import Experiment
+from autolamella.tools.thumbnails import load_thumbnail
 
 
 def parse_args():
@@ -76,6 +77,10 @@ milling_images = [
     "ref_MillPolishing_final_high_res_ib.tif",
 ]
 
+@st.cache_data
+def cached_load_image(image_path):
+    return FibsemImage.load(image_path)
+
 for pos in exp.positions:
 
     st.subheader(f"Position: {pos.name}")
@@ -92,12 +97,10 @@ for pos in exp.positions:
         name = basename
         for key in remove_keys:
             name = name.replace(key, "")
-            @st.cache_data
-            def cached_load_image(image_path):
-                return FibsemImage.load(image_path)
-        
-        image = cached_load_image(image_path)
-        cols[i].image(image.data, clamp=True, caption=name)
+
+        # downsampled image, from the thumbnail cache
+        thumbnail = load_thumbnail(image_path, width=512)
+        cols[i].image(thumbnail.data, clamp=True, caption=name)
 
 
     if not display_milling_patterns:
@@ -116,7 +119,7 @@ for pos in exp.positions:
     
     image_path = os.path.join(exp.path, pos.name, milling_images[selected_image])
 
-    image = cached_load_image(image_path)
+    image = cached_load_image(image_path)  # full resolution, the patterns are drawn in image coordinates
     fig, ax = draw_milling_patterns(image, milling_stages, title=f"{pos.name} - {milling_images[selected_image]}")
     st.pyplot(fig, use_container_width=True)
 
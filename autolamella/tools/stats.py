@@ -6,10 +6,11 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 import autolamella
-from autolamella.tools.data import calculate_statistics_dataframe
+from autolamella.tools.data import calculate_statistics_dataframe, get_statistics_signature
 from fibsem.structures import FibsemImage
 from autolamella.structures import Experiment
 from fibsem.imaging import tiled
+from autolamella.tools.thumbnails import Thumbnail, load_thumbnail
 
 import autolamella.config as cfg
 
@@ -18,6 +19,32 @@ import plotly.io as pio
 
 pio.templates.default = "plotly_white"
 
+#################### DATA ####################
+# streamlit re-runs this script on every interaction. The data is cached, keyed on the experiment
+# path and the signature (mtime, size) of its files, so interactions only re-render, and the data
+# is reloaded when the files change.
+
+def _file_signature(fname: str) -> tuple:
+    st_ = os.stat(fname)
+    return (st_.st_mtime_ns, st_.st_size)
+
+@st.cache_data(show_spinner="Parsing experiment logs...", max_entries=8)
+def load_statistics(path: str, encoding: str, signature: tuple) -> tuple:
+    return calculate_statistics_dataframe(path, encoding=encoding)
+
+@st.cache_resource(max_entries=8)
+def load_experiment(path: str, signature: tuple) -> Experiment:
+    return Experiment.load(os.path.join(path, cfg.EXPERIMENT_FILENAME), setup_logging=False)
+
+@st.cache_data(max_entries=256)
+def load_image_thumbnail(fname: str, width: int, signature: tuple) -> Thumbnail:
+    return load_thumbnail(fname, width=width)
+
+@st.cache_data(max_entries=8)
+def load_protocol(fname: str, signature: tuple) -> dict:
+    from fibsem import utils
+    return utils.load_protocol(fname)
+
 st.set_page_config(page_title="AutoLamella Analytics", page_icon=':snowflake:', layout="wide")
 page_title = st.header("AutoLamella Analytics")
 
@@ -38,10 +65,12 @@ encoding = None if encoding == "None" else encoding
 
 page_title.header(f"Experiment: {EXPERIMENT_NAME} Analytics")
 
+signature = get_statistics_signature(EXPERIMENT_PATH)
 (df_experiment, df_history, 
 _, 
     df_steps, df_stage, 
-    df_det, df_click, df_milling) = calculate_statistics_dataframe(EXPERIMENT_PATH, encoding=encoding)
+    df_det, df_click, df_milling) = load_statistics(EXPERIMENT_PATH, encoding, signature)
+exp = load_experiment(EXPERIMENT_PATH, signature)
 
 # experiment metrics
 cols = st.columns(4)
@@ -386,16 +415,17 @@ with tab_automation:
             path = os.path.join(EXPERIMENT_PATH, petname, f"{fname}*.tif")
             path = glob.glob(path)[0]
 
-            image = FibsemImage.load(path)
+            thumbnail = load_image_thumbnail(path, 1024, _file_signature(path))
             caption = f"Petname: {petname}, Feature: {feature}, Stage: {stage}, Correct: {is_correct}"
 
             # plot the feature detections on the image
             import matplotlib.pyplot as plt
             fig = plt.figure(figsize=(10, 10))
             ax = fig.add_subplot(111)
-            ax.imshow(image.data, cmap="gray")
-            ax.scatter(px_x+dpx_x, px_y+dpx_y, marker="+", color="red", s=100, label=f"{feature} (initial)")
-            ax.scatter(px_x, px_y, marker="+", color="blue", s=100, label=f"{feature} (final)")
+            # detections are in full resolution pixel coordinates
+            ax.imshow(thumbnail.data, cmap="gray")
+            ax.scatter((px_x+dpx_x) / thumbnail.scale, (px_y+dpx_y) / thumbnail.scale, marker="+", color="red", s=100, label=f"{feature} (initial)")
+            ax.scatter(px_x / thumbnail.scale, px_y / thumbnail.scale, marker="+", color="blue", s=100, label=f"{feature} (final)")
             ax.legend()
             ax.set_title(caption)
             cols[1].pyplot(fig, use_container_width=True)
@@ -448,13 +478,11 @@ with tab_workflow:
         cols = st.columns(2)
 
         for i, (petname, fname_eb, fname_ib) in enumerate(zip(petnames, EB_IMAGE_PATHS, IB_IMAGE_PATHS)):
-            eb_image = FibsemImage.load(fname_eb)
-            ib_image = FibsemImage.load(fname_ib)
-            cols[0].image(eb_image.data, caption=f"{petname} - {os.path.basename(fname_eb)}")
-            cols[1].image(ib_image.data, caption=f"{petname} - {os.path.basename(fname_ib)}")
+            eb_thumbnail = load_image_thumbnail(fname_eb, 1024, _file_signature(fname_eb))
+            ib_thumbnail = load_image_thumbnail(fname_ib, 1024, _file_signature(fname_ib))
+            cols[0].image(eb_thumbnail.data, caption=f"{petname} - {os.path.basename(fname_eb)}")
+            cols[1].image(ib_thumbnail.data, caption=f"{petname} - {os.path.basename(fname_ib)}")
 
-        
-    exp = Experiment.load(os.path.join(EXPERIMENT_PATH, "experiment.yaml"))
 
     # overview image
     st.markdown("---")
@@ -482,7 +510,7 @@ with tab_workflow:
                     if state.stage.name in positions.keys():
                         _names = [pos.name for pos in positions[state.stage.name]]
                         if lamella.petname not in _names:
-                            positions[state.stage.name].append(state.microscope_state.stage_position)
+                            positions[state.stage.name].append(deepcopy(state.microscope_state.stage_position))
                             positions[state.stage.name][-1].name = f"{lamella.petname}"
 
                         # go to next lamella if added 
@@ -506,8 +534,8 @@ with tab_lamella:
     IMAGE_FILENAMES = [os.path.basename(path) for path in IMAGE_PATHS]
     IMAGE_FILENAME = cols[0].selectbox(label="Image", options=IMAGE_FILENAMES)
 
-    image = FibsemImage.load(glob.glob(os.path.join(EXPERIMENT_PATH, f"{lamella}/**{IMAGE_FILENAME}"), recursive=True)[0])
-    cols[1].image(image.data, caption=os.path.basename(IMAGE_FILENAME), use_column_width=True)
+    image_path = glob.glob(os.path.join(EXPERIMENT_PATH, f"{lamella}/**{IMAGE_FILENAME}"), recursive=True)[0]
+    cols[1].image(load_image_thumbnail(image_path, 1024, _file_signature(image_path)).data, caption=os.path.basename(IMAGE_FILENAME), use_column_width=True)
 
     st.subheader("Lamella History")
     cols = st.columns(2)
@@ -554,8 +582,7 @@ with tab_lamella:
 with tab_protocol:
     # full protocol
     st.subheader("Full Protocol")
-    from fibsem import utils
-
-    protocol = utils.load_protocol(os.path.join(EXPERIMENT_PATH, "protocol.yaml"))
+    protocol_path = os.path.join(EXPERIMENT_PATH, "protocol.yaml")
+    protocol = load_protocol(protocol_path, _file_signature(protocol_path))
 
     st.write(protocol)
\ No newline at end of file
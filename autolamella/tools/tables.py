@@ -0,0 +1,200 @@
+import glob
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+ANALYTICS_DIRNAME = "analytics"
+
+# analytics tables, in the order returned by calculate_statistics_dataframe
+ANALYTICS_TABLES = ["experiment", "history", "beam_shift", "steps", "stage", "det", "click", "milling"]
+
+_CONTEXT_SCHEMA = {
+    "timestamp": "float64",
+    "lamella": "string",
+    "stage": "string",
+    "step": "string",
+}
+_EXPERIMENT_SCHEMA = {
+    "exp_name": "string",
+    "exp_id": "string",
+}
+
+# stable (typed) schema per table, other columns are stored after the schema columns
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "experiment": {
+        "experiment_name": "string",
+        "experiment_path": "string",
+        "experiment_created_at": "float64",
+        "experiment_id": "string",
+        "method": "string",
+        "number": "Int64",
+        "petname": "string",
+        "path": "string",
+        "lamella.x": "float64",
+        "lamella.y": "float64",
+        "lamella.z": "float64",
+        "lamella.r": "float64",
+        "lamella.t": "float64",
+        "last_timestamp": "float64",
+        "current_stage": "string",
+        "failure": "boolean",
+        "failure_note": "string",
+        "failure_timestamp": "float64",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "history": {
+        "petname": "string",
+        "stage": "string",
+        "start": "float64",
+        "end": "float64",
+        "duration": "float64",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "beam_shift": {
+        **_CONTEXT_SCHEMA,
+        "dx": "float64",
+        "dy": "float64",
+        "beam_type": "string",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "steps": {
+        **_CONTEXT_SCHEMA,
+        "petname": "string",
+        "step_n": "Int64",
+        "duration": "float64",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "stage": {
+        **_CONTEXT_SCHEMA,
+        "name": "string",
+        "x": "float64",
+        "y": "float64",
+        "z": "float64",
+        "r": "float64",
+        "t": "float64",
+        "coordinate_system": "string",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "det": {
+        **_CONTEXT_SCHEMA,
+        "feature": "string",
+        "is_correct": "boolean",
+        "beam_type": "string",
+        "fname": "string",
+        "px_x": "float64",
+        "px_y": "float64",
+        "dpx_x": "float64",
+        "dpx_y": "float64",
+        "dm_x": "float64",
+        "dm_y": "float64",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "click": {
+        **_CONTEXT_SCHEMA,
+        "type": "string",
+        "subtype": "string",
+        "dm_x": "float64",
+        "dm_y": "float64",
+        "beam_type": "string",
+        **_EXPERIMENT_SCHEMA,
+    },
+    "milling": {
+        **_CONTEXT_SCHEMA,
+        "name": "string",
+        "start_time": "float64",
+        "end_time": "float64",
+        "duration": "float64",
+        "milling_current": "float64",
+        "depth": "float64",
+        **_EXPERIMENT_SCHEMA,
+    },
+}
+
+# log messages store python literals as strings (see parse_msg)
+_LITERALS = {"None": None, "True": True, "False": False, "nan": None}
+
+
+def _to_scalar(value):
+    if isinstance(value, str):
+        return _LITERALS.get(value, value)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def apply_schema(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the table to its stable, typed schema. Missing schema columns are added (as null),
+    other columns are stored as strings after the schema columns.
+    Args:
+        name: the table name (ANALYTICS_TABLES)
+        df: the table
+    Returns:
+        pd.DataFrame: the typed table
+    """
+    schema = TABLE_SCHEMAS[name]
+    typed = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            typed[column] = pd.Series([None] * len(df), dtype=dtype, index=df.index)
+            continue
+        values = df[column].map(_to_scalar)
+        if dtype in ("float64", "Int64"):
+            values = pd.to_numeric(values, errors="coerce")
+        typed[column] = values.astype(dtype)
+
+    extras = sorted(c for c in df.columns if c not in schema)
+    for column in extras:
+        typed[column] = df[column].map(_to_scalar).astype("string")
+
+    return pd.DataFrame(typed, index=df.index).reset_index(drop=True)
+
+
+def _partition_path(root: Path, name: str, exp_id: str) -> str:
+    return os.path.join(root, name, f"exp_id={exp_id}", "part-0.parquet")
+
+
+def write_tables(root: Path, dfs: Dict[str, pd.DataFrame], exp_id: str) -> None:
+    """Write the analytics tables as parquet, partitioned by experiment id:
+        root/<table>/exp_id=<exp_id>/part-0.parquet
+    Writing an experiment only replaces its own partition, so many experiments can be
+    written to the same root. Requires pyarrow.
+    Args:
+        root: the dataset directory
+        dfs: the tables {name: dataframe}
+        exp_id: the experiment id
+    """
+    for name, df in dfs.items():
+        if "exp_id" not in df.columns:
+            df = df.assign(exp_id=exp_id)
+        filename = _partition_path(root, name, exp_id)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = filename + ".tmp"
+        apply_schema(name, df).to_parquet(tmp_filename, index=False)
+        os.replace(tmp_filename, filename)
+
+
+def read_tables(root: Path, names: Optional[List[str]] = None,
+                exp_ids: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """Read the analytics tables written with write_tables.
+    Args:
+        root: the dataset directory
+        names: the tables to read (default: all)
+        exp_ids: the experiments to read (default: all)
+    Returns:
+        Dict[str, pd.DataFrame]: the typed tables {name: dataframe}
+    """
+    dfs = {}
+    for name in names or ANALYTICS_TABLES:
+        if exp_ids is None:
+            filenames = sorted(glob.glob(_partition_path(root, name, "*")))
+        else:
+            filenames = [f for f in (_partition_path(root, name, e) for e in exp_ids) if os.path.exists(f)]
+        frames = [pd.read_parquet(f) for f in filenames]
+        if frames:
+            dfs[name] = pd.concat(frames, ignore_index=True)
+        else:
+            dfs[name] = apply_schema(name, pd.DataFrame())
+    return dfs
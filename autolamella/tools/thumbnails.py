@@ -0,0 +1,129 @@
+import glob
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from fibsem.structures import FibsemImage
+
+THUMBNAIL_DIRNAME = ".thumbnails"
+THUMBNAIL_VERSION = 1
+THUMBNAIL_LEVELS = [1024, 512, 256, 128] # image width (pixels), largest first
+
+# reference images shown in galleries and reports
+THUMBNAIL_PATTERN = "ref_*_final_*_res*.tif*"
+
+
+@dataclass
+class Thumbnail:
+    """A downsampled image, with the metadata required to draw a scalebar."""
+    data: np.ndarray
+    pixel_size: float     # pixel size of the thumbnail (metres), nan if unknown
+    source_shape: Tuple[int, int]
+    filename: str
+
+    @property
+    def scale(self) -> float:
+        """The downsampling factor from the source image."""
+        return self.source_shape[1] / self.data.shape[1]
+
+
+def get_thumbnail_path(fname: Path) -> str:
+    """Get the thumbnail cache file for the image (.thumbnails/<filename>.npz, in the image directory)."""
+    return os.path.join(os.path.dirname(fname), THUMBNAIL_DIRNAME, os.path.basename(fname) + ".npz")
+
+
+def _signature(fname: Path) -> np.ndarray:
+    st = os.stat(fname)
+    return np.array([THUMBNAIL_VERSION, st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+
+def _resize(data: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    from PIL import Image as PILImage
+    return np.asarray(PILImage.fromarray(data).resize(shape[::-1]))
+
+
+def create_thumbnails(fname: Path, image: Optional[FibsemImage] = None) -> str:
+    """Create the thumbnail pyramid for the image. The full resolution image is decoded once,
+    and each level is downsampled from the previous one.
+    Args:
+        fname: the image filename
+        image: the image, if already in memory (the file is not decoded)
+    Returns:
+        str: the thumbnail cache filename
+    """
+    signature = _signature(fname)
+    if image is None:
+        image = FibsemImage.load(fname)
+
+    pixel_size = np.nan
+    if image.metadata is not None and image.metadata.pixel_size is not None:
+        pixel_size = image.metadata.pixel_size.x
+
+    # the aspect ratio of each level is from the source image
+    levels, data = {}, image.data
+    height, width = image.data.shape[:2]
+    for level in THUMBNAIL_LEVELS:
+        if level < data.shape[1]:
+            data = _resize(data, (max(1, int(round(height * level / width))), level))
+        levels[f"level_{level}"] = data
+
+    thumbnail_fname = get_thumbnail_path(fname)
+    os.makedirs(os.path.dirname(thumbnail_fname), exist_ok=True)
+    tmp_fname = thumbnail_fname + ".tmp.npz"
+    np.savez(tmp_fname, signature=signature, pixel_size=pixel_size,
+             source_shape=np.array(image.data.shape[:2]), **levels)
+    os.replace(tmp_fname, thumbnail_fname)
+    return thumbnail_fname
+
+
+def load_thumbnail(fname: Path, width: int = 256) -> Thumbnail:
+    """Load a downsampled version of the image, from the thumbnail cache. The thumbnails are
+    created if they don't exist, or the image was modified after they were created.
+    Args:
+        fname: the image filename
+        width: the minimum width of the thumbnail (the smallest level at least this wide is returned)
+    Returns:
+        Thumbnail: the thumbnail
+    """
+    thumbnail_fname = get_thumbnail_path(fname)
+    for attempt in range(2):
+        if attempt or not os.path.exists(thumbnail_fname):
+            create_thumbnails(fname)
+        try:
+            with np.load(thumbnail_fname) as cache:
+                if not np.array_equal(cache["signature"], _signature(fname)):
+                    continue # image was modified
+                levels = [w for w in THUMBNAIL_LEVELS if w >= width] or THUMBNAIL_LEVELS[:1]
+                data = cache[f"level_{levels[-1]}"]
+                source_shape = tuple(int(s) for s in cache["source_shape"])
+                pixel_size = float(cache["pixel_size"]) * source_shape[1] / data.shape[1]
+                return Thumbnail(data=data, pixel_size=pixel_size, source_shape=source_shape, filename=str(fname))
+        except Exception as e:
+            logging.warning(f"Failed to load thumbnail {thumbnail_fname}, recreating: {e}")
+    raise RuntimeError(f"Failed to create thumbnail for {fname}")
+
+
+def create_lamella_thumbnails(path: Path, pattern: str = THUMBNAIL_PATTERN) -> List[str]:
+    """Create (or update) the thumbnails for the reference images in the lamella directory.
+    Args:
+        path: the lamella directory
+        pattern: the images to create thumbnails for
+    Returns:
+        List[str]: the thumbnail cache filenames
+    """
+    filenames = []
+    for fname in sorted(glob.glob(os.path.join(path, pattern))):
+        try:
+            thumbnail_fname = get_thumbnail_path(fname)
+            if os.path.exists(thumbnail_fname):
+                with np.load(thumbnail_fname) as cache:
+                    if np.array_equal(cache["signature"], _signature(fname)):
+                        filenames.append(thumbnail_fname)
+                        continue
+            filenames.append(create_thumbnails(fname))
+        except Exception as e:
+            logging.warning(f"Failed to create thumbnail for {fname}: {e}")
+    return filenames
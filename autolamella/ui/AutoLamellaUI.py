@@ -73,15 +73,21 @@ from autolamella.ui.AutoLamellaWorkflowDialog import (
     display_selected_lamella_info,
     open_workflow_dialog,
 )
+from autolamella.ui.sync import SharedFlag
 from autolamella.ui.tooltips import TOOLTIPS
 from autolamella.ui.utils import setup_experiment_ui_v2
 
-REPORTING_AVAILABLE: bool = False
-try:
-    from autolamella.tools.reporting import generate_report, save_final_overview_image
-    REPORTING_AVAILABLE = True
-except ImportError as e:
-    logging.debug(f"Could not import generate_report from autolamella.tools.reporting: {e}")
+from autolamella.tools.reporting import (
+    generate_html_report,
+    generate_report,
+    is_reporting_available,
+    save_final_overview_image,
+)
+
+# the reporting dependencies are imported when a report is generated
+REPORTING_AVAILABLE: bool = is_reporting_available()
+if not REPORTING_AVAILABLE:
+    logging.debug("Reporting is not available, the reporting dependencies are not installed.")
 
 AUTOLAMELLA_CHECKPOINTS = []
 try:
@@ -142,6 +148,11 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
     sync_positions_to_minimap_signal = pyqtSignal(list)
     lamella_created_signal = pyqtSignal(Lamella)
 
+    # workflow thread handshakes (the workflow waits for these to be cleared by the ui)
+    WAITING_FOR_USER_INTERACTION = SharedFlag()
+    WAITING_FOR_UI_UPDATE = SharedFlag()
+    is_milling = SharedFlag()
+
     def __init__(self, viewer: napari.Viewer) -> None:
         super().__init__()
 
@@ -866,7 +877,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
         filename = fui.open_save_file_dialog(
             msg="Save Report",
             path=os.path.join(self.experiment.path, f"{self.experiment.name}.pdf"),
-            _filter="*.pdf",
+            _filter="*.pdf;;*.html",
             parent=self,
         )
         if filename == "":
@@ -886,10 +897,14 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
 
     @thread_worker
     def report_gen_worker(self, experiment: Experiment, filename: str) -> None:
-        # generate the report
+        # generate the report (interactive html or pdf)
+        encoding = "cp1252" if os.name == "nt" else "utf-8"
+        if filename.endswith(".html"):
+            generate_html_report(experiment=experiment, output_filename=filename, encoding=encoding)
+            return
         generate_report(experiment=experiment,
                         output_filename=filename, 
-                        encoding="cp1252" if os.name == "nt" else "utf-8")
+                        encoding=encoding)
         return
 
     def action_generate_overview_plot(self) -> None:
@@ -1014,7 +1029,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
             return
 
         self.experiment.positions[idx].state.microscope_state.stage_position = position
-        self.experiment.save()
+        self.experiment.save_lamella(self.experiment.positions[idx], background=True)
         self.update_ui() # TODO: convert to signals
 
     def remove_position_from_minimap(self, position: FibsemStagePosition):
@@ -1026,8 +1041,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
             logging.warning(f"Position {position.name} not found in experiment.")
             return
 
-        self.experiment.positions.pop(idx)
-        self.experiment.save()
+        self.experiment.remove_lamella(idx, background=True)
         self.update_lamella_combobox()
         self.update_ui() # TODO: convert to signals
 
@@ -1453,7 +1467,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
         # update the trench point
         self._update_milling_protocol(idx=idx, method=self.protocol.method, stage=lamella.workflow)
 
-        self.experiment.save()
+        self.experiment.save_lamella(lamella, background=True)
 
     def load_protocol(self):
         """Load a protocol from file."""
@@ -1642,7 +1656,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
                 update_ui=False,
             )
 
-        self.experiment.save()
+        self.experiment.save_lamella(lamella, background=True)
         self.update_lamella_combobox(latest=True)
         self.update_ui()
 
@@ -1669,8 +1683,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
         # TODO: also remove data from disk
 
         # remove the lamella
-        self.experiment.positions.pop(idx)
-        self.experiment.save()
+        self.experiment.remove_lamella(idx, background=True)
 
         logging.debug("Lamella removed from experiment")
         self.milling_widget.clear_all_milling_stages()
@@ -1718,7 +1731,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
             self.experiment.positions[idx].failure_note = ""
             self.experiment.positions[idx].failure_timestamp = None
 
-        self.experiment.save()
+        self.experiment.save_lamella(self.experiment.positions[idx], background=True)
         self.update_ui()
 
     def revert_stage(self):
@@ -1844,7 +1857,7 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
         self.sync_experiment_positions_to_minimap()
         self.update_lamella_combobox()
         self.update_ui()
-        self.experiment.save()
+        self.experiment.save_lamella(self.experiment.positions[idx], background=True)
 
     def _update_milling_protocol(
         self, idx: int, method: AutoLamellaMethod, stage: AutoLamellaStage
@@ -2175,6 +2188,10 @@ class AutoLamellaUI(AutoLamellaMainUI.Ui_MainWindow, QtWidgets.QMainWindow):
                 parent_ui=self,
             )
 
+        # wait for the background saves to finish, before handing back to the ui
+        if self.experiment is not None:
+            self.experiment.flush()
+
         self.update_experiment_signal.emit(self.experiment)
 
 def main():
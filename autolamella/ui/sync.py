@@ -0,0 +1,51 @@
+import threading
+from typing import Optional
+
+
+class WorkflowFlag:
+    """A boolean flag shared between the workflow thread and the ui (qt) thread. The workflow
+    thread waits for the flag to be cleared, and wakes as soon as it is (rather than polling)."""
+
+    def __init__(self, value: bool = False):
+        self._cleared = threading.Event()
+        self.set(value)
+
+    def set(self, value: bool) -> None:
+        if value:
+            self._cleared.clear()
+        else:
+            self._cleared.set()
+
+    def __bool__(self) -> bool:
+        return not self._cleared.is_set()
+
+    def __repr__(self) -> str:
+        return f"WorkflowFlag({bool(self)})"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the flag is cleared.
+        Args:
+            timeout: the maximum time to wait (seconds), None waits forever
+        Returns:
+            bool: True if the flag was cleared, False if timed out
+        """
+        return self._cleared.wait(timeout)
+
+
+class SharedFlag:
+    """A ui attribute backed by a WorkflowFlag. It is assigned as a bool (e.g. ui.is_milling = False),
+    and read as a WorkflowFlag, so the workflow thread can wait on it (ui.is_milling.wait())."""
+
+    def __set_name__(self, owner, name: str):
+        self.attr = f"_{name}_flag"
+
+    def __get__(self, obj, objtype=None) -> WorkflowFlag:
+        if obj is None:
+            return self
+        flag = obj.__dict__.get(self.attr)
+        if flag is None:
+            flag = obj.__dict__.setdefault(self.attr, WorkflowFlag())
+        return flag
+
+    def __set__(self, obj, value: bool) -> None:
+        self.__get__(obj).set(bool(value))
@@ -0,0 +1,68 @@
+import os
+from typing import Tuple
+
+from fibsem import acquire as fibsem_acquire
+from fibsem.microscope import FibsemMicroscope
+from fibsem.structures import BeamType, FibsemImage, ImageSettings, ReferenceImages
+
+from autolamella.persistence.images import get_image_writer
+
+# image acquisition for the workflows, as fibsem.acquire, except the images are written in the
+# background (see ImageWriter) rather than blocking the workflow until they are saved.
+
+
+def _save_image(image: FibsemImage, image_settings: ImageSettings, beam_type: BeamType) -> None:
+    if image.metadata is not None:
+        image.metadata.image_settings.save = True # as acquired with saving enabled
+    suffix = "eb" if beam_type is BeamType.ELECTRON else "ib"
+    filename = os.path.join(image_settings.path, f"{image_settings.filename}_{suffix}")
+    get_image_writer().submit(image, filename)
+
+
+def new_image(microscope: FibsemMicroscope, settings: ImageSettings) -> FibsemImage:
+    """Apply the image settings and acquire a new image (see fibsem.acquire.new_image)."""
+    save = settings.save
+    settings.save = False
+    try:
+        image = fibsem_acquire.new_image(microscope, settings)
+    finally:
+        settings.save = save
+
+    if save:
+        _save_image(image, settings, settings.beam_type)
+    return image
+
+
+def take_reference_images(microscope: FibsemMicroscope, image_settings: ImageSettings) -> Tuple[FibsemImage, FibsemImage]:
+    """Acquire a pair of electron and ion images (see fibsem.acquire.take_reference_images)."""
+    save = image_settings.save
+    image_settings.save = False
+    try:
+        eb_image, ib_image = fibsem_acquire.take_reference_images(microscope, image_settings)
+    finally:
+        image_settings.save = save
+
+    if save:
+        _save_image(eb_image, image_settings, BeamType.ELECTRON)
+        _save_image(ib_image, image_settings, BeamType.ION)
+    return eb_image, ib_image
+
+
+def take_set_of_reference_images(
+    microscope: FibsemMicroscope,
+    image_settings: ImageSettings,
+    hfws: Tuple[float, float],
+    filename: str = "ref_image",
+) -> ReferenceImages:
+    """Acquire low and high resolution reference images, always saved (see fibsem.acquire.take_set_of_reference_images)."""
+    image_settings.save = True
+
+    image_settings.hfw = hfws[0]
+    image_settings.filename = f"{filename}_low_res"
+    low_eb, low_ib = take_reference_images(microscope, image_settings)
+
+    image_settings.hfw = hfws[1]
+    image_settings.filename = f"{filename}_high_res"
+    high_eb, high_ib = take_reference_images(microscope, image_settings)
+
+    return ReferenceImages(low_eb, high_eb, low_ib, high_ib)
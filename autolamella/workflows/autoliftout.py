@@ -1,12 +1,15 @@
+from __future__ import annotations
+
 import logging
 import time
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import os
 import numpy as np
-from fibsem import acquire, alignment, calibration
+from fibsem import alignment, calibration
 from fibsem import utils as fibsem_utils
 from fibsem import validation
 from fibsem.detection import detection
@@ -37,9 +40,8 @@ from fibsem.structures import (
     ImageSettings
 )
 
-from autolamella.workflows import actions
-from autolamella.structures import AutoLamellaStage, Experiment, Lamella
-from autolamella.ui import AutoLamellaUI
+from autolamella.workflows import acquire, actions
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella
 from fibsem import config as fcfg
 
 
@@ -47,10 +49,14 @@ from autolamella.workflows.core import (log_status_message, log_status_message_r
                                         start_of_stage_update, end_of_stage_update, 
                                         mill_trench, mill_undercut, mill_lamella, 
                                         setup_lamella)
+from autolamella.workflows.engine import LamellaTask, WorkflowEngine
 from autolamella.workflows.ui import (update_milling_ui, update_status_ui, 
                                       set_images_ui, ask_user, update_detection_ui, 
                                       update_experiment_ui)
 
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
+
 
 # autoliftout workflow functions
 
@@ -704,7 +710,7 @@ def land_lamella_on_post(
 
 
 def landing_entry_procedure(
-    microscope: FibsemMicroscope, settings: MicroscopeSettings, lamella: Lamella, validate: bool = True,parent_ui=AutoLamellaUI
+    microscope: FibsemMicroscope, settings: MicroscopeSettings, lamella: Lamella, validate: bool = True, parent_ui: AutoLamellaUI = None
 ):
     # entry procedure, align vertically to post
     actions.move_needle_to_landing_position(microscope)
@@ -880,50 +886,30 @@ def run_autoliftout_workflow(
     settings.image.filename = f"{fibsem_utils.current_timestamp()}"
 
     
+    def stage_task(stage: AutoLamellaStage) -> LamellaTask:
+        def task(lamella: Lamella) -> Lamella:
+            # update image settings (save in correct directory)
+            settings.image.path = lamella.path
+            return WORKFLOW_STAGES[stage](microscope=microscope, settings=settings, 
+                                          lamella=lamella, parent_ui=parent_ui)
+        return task
+
     # batch mode workflow
-    if True:
-        for terminal_stage in [
-            AutoLamellaStage.MillTrench,
-            AutoLamellaStage.MillUndercut, # TODO: maybe add this to config?
-        ]:
-            lamella: Lamella
-            for lamella in experiment.positions:
-                if lamella.is_failure:
-                    continue  # skip failures
-
-                while lamella.state.stage.value < terminal_stage.value:
-                    next_stage = AutoLamellaStage(lamella.state.stage.value + 1)
-
-                    # update image settings (save in correct directory)
-                    settings.image.path = lamella.path
-
-                    # reset to the previous state
-                    lamella = start_of_stage_update(
-                        microscope, lamella, next_stage=next_stage, parent_ui=parent_ui
-                    )
-
-                    # run the next workflow stage
-                    lamella = WORKFLOW_STAGES[next_stage](
-                        microscope=microscope,
-                        settings=settings,
-                        lamella=lamella,
-                        parent_ui=parent_ui,
-                    )
-                    # advance workflow
-                    experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui)
-
-                    # update ui
-                    update_experiment_ui(parent_ui, experiment)
+    engine = WorkflowEngine(microscope, experiment, AutoLamellaMethod.LIFTOUT, parent_ui)
+    for stage in [
+        AutoLamellaStage.MillTrench,
+        AutoLamellaStage.MillUndercut, # TODO: maybe add this to config?
+    ]:
+        experiment = engine.run_stage(stage, stage_task(stage))
 
     # standard workflow
+    stages = engine.graph.stages[:engine.graph.stages.index(AutoLamellaStage.LandLamella) + 1]
     lamella: Lamella
     for lamella in experiment.positions:
         if lamella.is_failure:
             continue  # skip failures
 
-        while lamella.state.stage.value < AutoLamellaStage.LandLamella.value:
-
-            next_stage = AutoLamellaStage(lamella.state.stage.value + 1)
+        while (next_stage := engine.graph.next_stage(lamella.workflow)) in stages:
             if True:
                 msg = (
                     f"""Continue Lamella {(lamella.petname)} from {next_stage.name}?"""
@@ -969,38 +955,18 @@ def run_thinning_workflow(
 ) -> Experiment:
 
     update_status_ui(parent_ui, "Starting MillRough Workflow...")
-    lamella: Lamella
+    engine = WorkflowEngine(microscope, experiment, AutoLamellaMethod.LIFTOUT, parent_ui)
     for next_stage in [
         AutoLamellaStage.SetupLamella,
-        # AutoLamellaStage.ReadyLamella,
         AutoLamellaStage.MillRough,
         AutoLamellaStage.MillPolishing,
     ]:
-        for lamella in experiment.positions:
-            if lamella.is_failure:
-                continue
-
-            if lamella.state.stage.value == next_stage.value - 1:
-
-                restore_state = True # next_stage != AutoLamellaStage.ReadyLamella
-                save_state = True # next_stage != AutoLamellaStage.ReadyLamella
-
-                lamella = start_of_stage_update(
-                    microscope, lamella, next_stage=next_stage, parent_ui=parent_ui, 
-                    restore_state=restore_state
-                )
-                WORKFLOW_STAGES[next_stage](microscope, settings, lamella,parent_ui)
-                experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui, 
-                                                 save_state=save_state)
-                update_experiment_ui(parent_ui, experiment)
+        experiment = engine.run_stage(next_stage, 
+            lambda lamella, stage=next_stage: WORKFLOW_STAGES[stage](microscope, settings, lamella, parent_ui))
 
     # finish the experiment
-    for lamella in experiment.positions:
-        if lamella.state.stage == AutoLamellaStage.MillPolishing:
-            lamella = start_of_stage_update(microscope, lamella, next_stage=AutoLamellaStage.Finished, parent_ui=parent_ui, restore_state=False)
-            experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui, save_state=False)
-            update_experiment_ui(parent_ui, experiment)
-
+    experiment = engine.run_stage(AutoLamellaStage.Finished, task=lambda lamella: lamella, 
+                                  restore_state=False, save_state=False)
 
     return experiment
 
@@ -1100,7 +1066,7 @@ def select_landing_positions(
                 microscope, settings, lamella, parent_ui
             )
 
-            experiment.save()
+            experiment.save(background=True)
 
     return experiment
 
@@ -1194,7 +1160,7 @@ def select_lamella_positions(
 
         # save lamella data
         experiment.positions.append(deepcopy(lamella))
-        experiment.save()
+        experiment.save(background=True)
 
         # select another?
         select_another = get_current_lamella(experiment, parent_ui)
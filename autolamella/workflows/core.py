@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 import logging
 import os
 import time
 from copy import deepcopy
 from datetime import datetime
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 import numpy as np
-from fibsem import acquire, alignment, calibration
+from fibsem import alignment, calibration, milling
 from fibsem import config as fcfg
 from fibsem.constants import DEGREE_SYMBOL
 from fibsem.transformations import is_close_to_milling_angle, move_to_milling_angle
@@ -49,8 +51,8 @@ from autolamella.structures import (
     Lamella,
     get_autolamella_method,
 )
-from autolamella.ui import AutoLamellaUI
-from autolamella.workflows import actions
+from autolamella.workflows import acquire, actions
+from autolamella.workflows.scheduler import batch_by_key
 from autolamella.workflows.ui import (
     ask_user,
     set_images_ui,
@@ -62,10 +64,15 @@ from autolamella.workflows.ui import (
 )
 
 from autolamella.structures import WORKFLOW_STAGE_TO_PROTOCOL_KEY
+from autolamella.persistence.images import get_image_writer
+
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
 
 # constants
 ATOL_STAGE_TILT = 0.017 # 1 degrees
 MAX_ALIGNMENT_ATTEMPTS = 3
+IMAGE_FLUSH_TIMEOUT = 300 # seconds
 
 # feature flags
 
@@ -451,31 +458,178 @@ def mill_lamella(
         set_images_ui(parent_ui, reference_images.high_res_eb, reference_images.high_res_ib)
 
     if acquire_high_quality_image:
-        log_status_message(lamella, "HIGH_QUALITY_REFERENCE_IMAGES")
-        update_status_ui(parent_ui, f"{lamella.info} Acquiring High Quality Reference Images...")
-
-        ddict = {"dwell_time": 2.0e-6,
-            "resolution": fcfg.REFERENCE_RES_HIGH,
-            "hfw": fcfg.REFERENCE_HFW_SUPER,
-            "frame_integration": 2,
-        }
-        hq_settings = protocol.tmp.get("high_quality_image", ddict)
-        # take high quality reference images
-        image_settings.save = True
-        image_settings.filename = f"ref_{lamella.status}_final_ultra"
-        image_settings.hfw = hq_settings["hfw"]
-        image_settings.dwell_time = hq_settings["dwell_time"]
-        image_settings.resolution = hq_settings["resolution"]
-        image_settings.frame_integration = hq_settings["frame_integration"]
-        image_settings.beam_type = BeamType.ELECTRON
-        eb_image = acquire.new_image(microscope, image_settings)
-        # set_images_ui(parent_ui, eb_image, ib_image)
-        image_settings.frame_integration = 1 # restore
-        image_settings.resolution = fcfg.REFERENCE_RES_MEDIUM
+        _acquire_high_quality_image(microscope, protocol, lamella, image_settings, parent_ui)
 
     return lamella
 
 
+def _acquire_high_quality_image(microscope: FibsemMicroscope, protocol: AutoLamellaProtocol, lamella: Lamella, 
+                                image_settings: ImageSettings, parent_ui: AutoLamellaUI = None) -> None:
+    """Acquire the final high quality electron image for the lamella (protocol.tmp["high_quality_image"])."""
+    log_status_message(lamella, "HIGH_QUALITY_REFERENCE_IMAGES")
+    update_status_ui(parent_ui, f"{lamella.info} Acquiring High Quality Reference Images...")
+
+    ddict = {"dwell_time": 2.0e-6,
+        "resolution": fcfg.REFERENCE_RES_HIGH,
+        "hfw": fcfg.REFERENCE_HFW_SUPER,
+        "frame_integration": 2,
+    }
+    hq_settings = protocol.tmp.get("high_quality_image", ddict)
+    # take high quality reference images
+    image_settings.save = True
+    image_settings.filename = f"ref_{lamella.status}_final_ultra"
+    image_settings.hfw = hq_settings["hfw"]
+    image_settings.dwell_time = hq_settings["dwell_time"]
+    image_settings.resolution = hq_settings["resolution"]
+    image_settings.frame_integration = hq_settings["frame_integration"]
+    image_settings.beam_type = BeamType.ELECTRON
+    eb_image = acquire.new_image(microscope, image_settings)
+    # set_images_ui(parent_ui, eb_image, ib_image)
+    image_settings.frame_integration = 1 # restore
+    image_settings.resolution = fcfg.REFERENCE_RES_MEDIUM
+
+
+def _restore_lamella_alignment(microscope: FibsemMicroscope, lamella: Lamella, parent_ui: AutoLamellaUI = None) -> None:
+    """Move to the lamella, and re-align the beam to the lamella alignment reference."""
+    update_status_ui(parent_ui, f"{lamella.info} Aligning Reference Images...")
+    microscope.set_microscope_state(lamella.state.microscope_state)
+    ref_image = FibsemImage.load(os.path.join(lamella.path, "ref_alignment_ib.tif"))
+    alignment.multi_step_alignment_v2(microscope=microscope, 
+                                    ref_image=ref_image, 
+                                    beam_type=BeamType.ION, 
+                                    alignment_current=None,
+                                    steps=MAX_ALIGNMENT_ATTEMPTS)
+
+def milling_current_key(stage: FibsemMillingStage) -> Tuple[float, float]:
+    """The milling current and voltage of the stage (changing these requires beam settling)."""
+    return (stage.milling.milling_current, stage.milling.milling_voltage)
+
+def mill_lamellae_batched(
+    microscope: FibsemMicroscope,
+    protocol: AutoLamellaProtocol,
+    experiment: Experiment,
+    lamellae: List[Lamella],
+    stage: AutoLamellaStage,
+    parent_ui: AutoLamellaUI = None,
+) -> Experiment:
+    """Mill the lamellae for the (unsupervised) milling stage, grouping the milling stages of all 
+    lamellae by milling current, so the current changes as few times as possible. 
+    The milling stages of each lamella run in order, and the lamella is re-aligned each time 
+    it is revisited. Each lamella is saved as completed (end_of_stage_update) as soon as its 
+    last milling stage is finished. The progress within a lamella is not saved: if the batch is 
+    interrupted, the lamellae that were not completed are milled again from the first stage.
+    Args:
+        microscope: the microscope
+        protocol: the protocol
+        experiment: the experiment
+        lamellae: the lamellae ready for the stage (in order)
+        stage: the milling stage (MillRough, MillPolishing)
+        parent_ui: the ui
+    Returns:
+        Experiment: the experiment
+    """
+    image_settings = protocol.configuration.image
+    milling_stage_name = WORKFLOW_STAGE_TO_PROTOCOL_KEY[stage]
+    use_stress_relief = bool(protocol.method in [AutoLamellaMethod.ON_GRID, AutoLamellaMethod.WAFFLE])
+
+    # prepare: align, and get the milling stages for each lamella
+    lamella_stages: List[Dict[str, List[FibsemMillingStage]]] = []
+    for lamella in lamellae:
+        lamella = start_of_stage_update(microscope, lamella, stage, parent_ui, restore_state=False)
+        log_status_message(lamella, "ALIGN_LAMELLA")
+        _restore_lamella_alignment(microscope, lamella, parent_ui)
+
+        image_settings.path = lamella.path
+        image_settings.save = True
+        image_settings.beam_type = BeamType.ION
+        image_settings.filename = f"ref_{lamella.status}_start"
+        image_settings.hfw = get_milling_stages(key=milling_stage_name, protocol=lamella.protocol)[0].milling.hfw
+        eb_image, ib_image = acquire.take_reference_images(microscope, image_settings)
+        set_images_ui(parent_ui, eb_image, ib_image)
+
+        keys = []
+        if use_stress_relief and stage is AutoLamellaStage.MillRough:
+            if protocol.options.use_notch:
+                keys.append(NOTCH_KEY)
+            if protocol.options.use_microexpansion:
+                keys.append(MICROEXPANSION_KEY)
+        keys.append(milling_stage_name)
+
+        stages = {key: get_milling_stages(key=key, protocol=lamella.protocol) for key in keys}
+        for mstage in sum(stages.values(), []):
+            mstage.alignment.rect = lamella.alignment_area
+        lamella_stages.append(stages)
+
+    # mill: group the milling stages by current
+    sequences = [sum(stages.values(), []) for stages in lamella_stages]
+    batch = batch_by_key(sequences, key=milling_current_key)
+    logging.debug({"msg": "milling_batch", "stage": stage.name, 
+                   "order": [(lamellae[i].name, s.name) for i, s in batch]})
+    remaining = [len(sequence) for sequence in sequences]
+    current_idx = None
+    for idx, mstage in batch:
+        lamella = lamellae[idx]
+        if idx != current_idx:
+            _restore_lamella_alignment(microscope, lamella, parent_ui)
+            current_idx = idx
+        log_status_message(lamella, "MILL_LAMELLA")
+        update_status_ui(parent_ui, f"{lamella.info} Milling {mstage.name} ({mstage.milling.milling_current:.2e} A)...")
+        milling.mill_stages(microscope=microscope, stages=[mstage])
+
+        # finish the lamella once all its milling is done (the lamella is still aligned)
+        remaining[idx] -= 1
+        if remaining[idx] == 0:
+            experiment = _finish_milled_lamella(microscope, protocol, experiment, lamella, 
+                                                lamella_stages[idx], parent_ui)
+
+    # lamellae without any milling stages
+    for lamella, stages, sequence in zip(lamellae, lamella_stages, sequences):
+        if not sequence:
+            _restore_lamella_alignment(microscope, lamella, parent_ui)
+            experiment = _finish_milled_lamella(microscope, protocol, experiment, lamella, stages, parent_ui)
+
+    return experiment
+
+def _finish_milled_lamella(
+    microscope: FibsemMicroscope,
+    protocol: AutoLamellaProtocol,
+    experiment: Experiment,
+    lamella: Lamella,
+    stages: Dict[str, List[FibsemMillingStage]],
+    parent_ui: AutoLamellaUI = None,
+) -> Experiment:
+    """Save the milling protocol, reference images and state for the milled lamella, 
+    the same as the end of mill_lamella (see mill_lamellae_batched)."""
+    image_settings = protocol.configuration.image
+    take_reference_images = bool(
+        lamella.state.stage is AutoLamellaStage.MillRough 
+        or protocol.options.take_final_reference_images
+        )
+    acquire_high_quality_image =  bool(
+        lamella.state.stage is AutoLamellaStage.MillPolishing 
+        and protocol.tmp.get("high_quality_image", {}).get("enabled", False)
+        )
+
+    for key, kstages in stages.items():
+        lamella.protocol[key] = get_protocol_from_stages(kstages)
+    if take_reference_images:
+        log_status_message(lamella, "REFERENCE_IMAGES")
+        update_status_ui(parent_ui, f"{lamella.info} Acquiring Reference Images...")
+        image_settings.path = lamella.path
+        reference_images = acquire.take_set_of_reference_images(
+            microscope=microscope,
+            image_settings=image_settings,
+            hfws=[fcfg.REFERENCE_HFW_HIGH, fcfg.REFERENCE_HFW_SUPER],
+            filename=f"ref_{lamella.status}_final",
+        )
+        set_images_ui(parent_ui, reference_images.high_res_eb, reference_images.high_res_ib)
+    else:
+        microscope.set_microscope_state(lamella.state.microscope_state)
+    if acquire_high_quality_image:
+        image_settings.path = lamella.path
+        _acquire_high_quality_image(microscope, protocol, lamella, image_settings, parent_ui)
+    return end_of_stage_update(microscope, experiment, lamella, parent_ui)
+
 def setup_lamella(
     microscope: FibsemMicroscope,
     protocol: AutoLamellaProtocol,
@@ -723,12 +877,17 @@ def end_of_stage_update(
         lamella.state.microscope_state = microscope.get_microscope_state()
     lamella.state.end_timestamp = datetime.timestamp(datetime.now())
 
+    # write the images acquired during the stage (raises if they failed, the stage is not completed)
+    if not get_image_writer().flush(timeout=IMAGE_FLUSH_TIMEOUT):
+        raise RuntimeError(f"{lamella.name}: images are still being written after {IMAGE_FLUSH_TIMEOUT}s, "
+                           f"the {lamella.workflow.name} stage is not completed")
+
     # write history
     lamella.history.append(deepcopy(lamella.state))
-    lamella.states[lamella.workflow] = deepcopy(lamella.state)
+    lamella.states[lamella.workflow] = lamella.history[-1] # shared with history
 
-    # update and save experiment
-    experiment.save()
+    # update and save experiment (journaled, written in the background)
+    experiment.save_lamella(lamella, background=True)
 
     log_status_message(lamella, "FINISHED")
     if update_ui:
@@ -748,6 +907,9 @@ def start_of_stage_update(
     """Check the last completed stage and reload the microscope state if required. Log that the stage has started."""
     last_completed_stage = lamella.state.stage
 
+    # create the lamella directory (not created when the lamella is loaded)
+    os.makedirs(lamella.path, exist_ok=True)
+
     # restore to the last state
     if restore_state:
         logging.info(
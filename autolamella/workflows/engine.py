@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from fibsem.microscope import FibsemMicroscope
+
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella
+from autolamella.workflows.core import end_of_stage_update, start_of_stage_update
+from autolamella.workflows.scheduler import (
+    LamellaScheduler,
+    ReadyIndex,
+    WorkflowGraph,
+    schedule_lamellae,
+)
+
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
+
+LamellaTask = Callable[[Lamella], Lamella]
+BatchTask = Callable[[List[Lamella]], Experiment]
+
+
+class WorkflowEngine:
+    """Runs the workflow stages for an experiment. The lamellae ready for each stage are taken from
+    the ready index, ordered by the scheduler, and dispatched one at a time (or as one batch)."""
+
+    def __init__(
+        self,
+        microscope: FibsemMicroscope,
+        experiment: Experiment,
+        method: AutoLamellaMethod,
+        parent_ui: AutoLamellaUI = None,
+        scheduler: Optional[LamellaScheduler] = None,
+    ):
+        self.microscope = microscope
+        self.experiment = experiment
+        self.parent_ui = parent_ui
+        self.scheduler = scheduler
+        self.graph = WorkflowGraph(method)
+        self.index = ReadyIndex(experiment)
+
+    def ready(self, stage: AutoLamellaStage) -> List[Lamella]:
+        """Get the lamellae ready for the stage, in experiment order."""
+        return self.index.at_stage(self.graph.requires.get(stage, set()))
+
+    def run_stage(
+        self,
+        stage: AutoLamellaStage,
+        task: LamellaTask,
+        batch: Optional[BatchTask] = None,
+        restore_state: bool = True,
+        save_state: bool = True,
+    ) -> Experiment:
+        """Run the stage for all the lamellae that are ready for it.
+        Args:
+            stage: the workflow stage
+            task: run the stage for a lamella (between start_of_stage_update and end_of_stage_update)
+            batch: run the stage for all the (ordered) lamellae at once, instead of task
+            restore_state: restore the lamella microscope state before the task
+            save_state: save the microscope state after the task
+        Returns:
+            Experiment: the experiment
+        """
+        lamellae = schedule_lamellae(self.microscope, self.ready(stage), stage, self.scheduler)
+        logging.debug({"msg": "run_stage", "stage": stage.name, "lamellae": [l.name for l in lamellae]})
+
+        if batch is not None and lamellae:
+            self.experiment = batch(lamellae)
+            for lamella in lamellae:
+                self.index.update(lamella)
+            return self.experiment
+
+        for lamella in lamellae:
+            if lamella.is_failure: # marked as failed during the stage
+                self.index.update(lamella)
+                continue
+            lamella = start_of_stage_update(self.microscope, lamella, stage,
+                                            parent_ui=self.parent_ui, restore_state=restore_state)
+            lamella = task(lamella)
+            self.experiment = end_of_stage_update(self.microscope, self.experiment, lamella,
+                                                  self.parent_ui, save_state=save_state)
+            self.index.update(lamella)
+
+        return self.experiment
+
+    def run(
+        self,
+        tasks: Dict[AutoLamellaStage, LamellaTask],
+        stages_to_complete: Optional[List[AutoLamellaStage]] = None,
+        batches: Optional[Dict[AutoLamellaStage, BatchTask]] = None,
+    ) -> Experiment:
+        """Run the workflow stages in order (each stage for all ready lamellae).
+        Args:
+            tasks: the task for each stage
+            stages_to_complete: the stages to run (default: all stages with a task)
+            batches: the batch task for each stage (optional, see run_stage)
+        Returns:
+            Experiment: the experiment
+        """
+        batches = batches or {}
+        for stage in self.graph.stages:
+            if stage not in tasks:
+                continue
+            if stages_to_complete is not None and stage not in stages_to_complete:
+                logging.info(f"Skipping stage {stage} as it is not in stages_to_complete {stages_to_complete}")
+                continue
+            self.run_stage(stage, tasks[stage], batch=batches.get(stage))
+        return self.experiment
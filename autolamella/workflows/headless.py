@@ -0,0 +1,137 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, Optional, TextIO
+
+from autolamella import config as cfg
+from autolamella.structures import (
+    AutoLamellaMethod,
+    AutoLamellaProtocol,
+    AutoLamellaStage,
+    Experiment,
+    get_autolamella_method,
+)
+from autolamella.telemetry import TelemetryHandler
+
+# run the autolamella workflows without the ui (napari / qt are not imported)
+
+
+def emit_event(stream: TextIO, msg: dict) -> None:
+    """Write a progress event to the stream, as a json line (the same format as the telemetry)."""
+    event = {"timestamp": time.time(), "func": "autolamella_run", "msg": msg}
+    stream.write(json.dumps(event, default=str) + "\n")
+    stream.flush()
+
+
+def load_experiment_and_protocol(experiment_path: str, protocol_path: Optional[str] = None):
+    """Load the experiment, and the protocol (default: the protocol saved with the experiment).
+    Logging is redirected to stderr once the experiment logging is configured.
+    Args:
+        experiment_path: the experiment file (experiment.yaml) or directory
+        protocol_path: the protocol file
+    Returns:
+        Tuple[Experiment, AutoLamellaProtocol]: the experiment and protocol
+    """
+    if os.path.isdir(experiment_path):
+        experiment_path = os.path.join(experiment_path, cfg.EXPERIMENT_FILENAME)
+    experiment = Experiment.load(experiment_path)
+    _log_to_stderr()
+
+    if protocol_path is None:
+        protocol_path = os.path.join(experiment.path, "protocol.yaml")
+    protocol = AutoLamellaProtocol.load(protocol_path)
+    return experiment, protocol
+
+
+def run_headless(
+    microscope,
+    protocol: AutoLamellaProtocol,
+    experiment: Experiment,
+    method: AutoLamellaMethod,
+    stages_to_complete: List[AutoLamellaStage],
+) -> Experiment:
+    """Run the workflow for the method (see METHOD_WORKFLOWS_FN), without the ui."""
+    from autolamella.workflows.runners import METHOD_WORKFLOWS_FN, run_autolamella
+
+    # as the ui: serial liftout mills the landed lamellae with the autolamella workflow
+    if method is AutoLamellaMethod.SERIAL_LIFTOUT:
+        run_fn = run_autolamella
+    elif method in METHOD_WORKFLOWS_FN:
+        run_fn = METHOD_WORKFLOWS_FN[method]
+    else:
+        raise ValueError(f"The {method.name} method can't be run headless, expected one of "
+                         f"{[m.name for m in METHOD_WORKFLOWS_FN] + [AutoLamellaMethod.SERIAL_LIFTOUT.name]}")
+
+    return run_fn(microscope=microscope,
+                  protocol=protocol,
+                  experiment=experiment,
+                  parent_ui=None,
+                  stages_to_complete=stages_to_complete)
+
+
+def _log_to_stderr() -> None:
+    # experiment logging writes to stdout, which is used for the progress events
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an AutoLamella workflow without the user interface. "
+                                     "Progress is written to stdout as json lines.")
+    parser.add_argument("--experiment", type=str, required=True,
+                        help="Path to the experiment (experiment.yaml, or the experiment directory)")
+    parser.add_argument("--protocol", type=str, default=None,
+                        help="Path to the protocol (default: the protocol.yaml saved with the experiment)")
+    parser.add_argument("--method", type=str, default=None,
+                        help="The method to run, e.g. on-grid, waffle, trench (default: the protocol method)")
+    parser.add_argument("--stages", type=str, nargs="+", default=None,
+                        help="The workflow stages to run, e.g. MillRough MillPolishing (default: all method stages)")
+    parser.add_argument("--manufacturer", type=str, default=None,
+                        help="The microscope manufacturer, use Demo for the simulated microscope "
+                        "(default: the microscope configuration)")
+    parser.add_argument("--ip_address", type=str, default=None, help="The microscope ip address")
+    parser.add_argument("--config", type=str, default=None, dest="config_path",
+                        help="Path to the microscope configuration")
+    args = parser.parse_args()
+
+    stream = sys.stdout
+    try:
+        experiment, protocol = load_experiment_and_protocol(args.experiment, args.protocol)
+        logging.getLogger().addHandler(TelemetryHandler(stream=stream))
+
+        method = get_autolamella_method(args.method) if args.method else protocol.method
+        stages = [AutoLamellaStage[s] for s in args.stages] if args.stages else method.workflow
+
+        # no user to supervise the workflow
+        protocol.supervision = {stage: False for stage in protocol.supervision}
+
+        from fibsem import utils
+        with contextlib.redirect_stdout(sys.stderr): # setup_session prints the configuration
+            microscope, settings = utils.setup_session(manufacturer=args.manufacturer,
+                                                       ip_address=args.ip_address,
+                                                       config_path=args.config_path,
+                                                       setup_logging=False)
+        settings.image.path = experiment.path
+        protocol.configuration = settings
+        emit_event(stream, {"msg": "started", "experiment": experiment.path, "method": method.name,
+                            "stages": [s.name for s in stages], "lamellae": len(experiment.positions)})
+
+        experiment = run_headless(microscope, protocol, experiment, method, stages)
+        experiment.flush()
+    except Exception as e:
+        logging.exception(f"Headless workflow failed: {e}")
+        emit_event(stream, {"msg": "error", "error": str(e)})
+        sys.exit(1)
+
+    emit_event(stream, {"msg": "finished", "lamellae": [
+        {"petname": lamella.name, "stage": lamella.workflow.name, "is_failure": lamella.is_failure}
+        for lamella in experiment.positions]})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,36 @@
+from __future__ import annotations
+
 import logging
-from typing import List
+from functools import partial
+from typing import TYPE_CHECKING, List
 
 from fibsem.microscope import FibsemMicroscope
 from fibsem.structures import MicroscopeSettings
 
+from autolamella import config as cfg
+
 from autolamella.structures import (
     AutoLamellaMethod,
     AutoLamellaStage,
     Experiment,
     AutoLamellaProtocol,
-    is_ready_for,
 )
-from autolamella.ui import AutoLamellaUI
 from autolamella.workflows.core import (
-    end_of_stage_update,
     log_status_message,
     mill_lamella,
+    mill_lamellae_batched,
     mill_trench,
     mill_undercut,
     setup_lamella,
-    start_of_stage_update,
     pass_through_stage,
     setup_polishing,
 )
+from autolamella.workflows.engine import LamellaTask, WorkflowEngine
 from autolamella.workflows.ui import ask_user, ask_user_continue_workflow
 
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
+
 WORKFLOW_STAGES = {
     AutoLamellaStage.MillTrench: mill_trench,
     AutoLamellaStage.MillUndercut: mill_undercut,
@@ -36,6 +42,11 @@ WORKFLOW_STAGES = {
 LAMELLA_MILLING_WORKFLOW = [AutoLamellaStage.MillRough,
                             AutoLamellaStage.SetupPolishing,
                             AutoLamellaStage.MillPolishing]
+MILLING_BATCH_STAGES = [AutoLamellaStage.MillRough, AutoLamellaStage.MillPolishing]
+
+def _stage_task(fn, microscope: FibsemMicroscope, protocol: AutoLamellaProtocol, 
+                parent_ui: AutoLamellaUI = None) -> LamellaTask:
+    return lambda lamella: fn(microscope, protocol, lamella, parent_ui)
 
 def run_trench_milling(
     microscope: FibsemMicroscope,
@@ -44,24 +55,13 @@ def run_trench_milling(
     parent_ui: AutoLamellaUI=None,
     stages_to_complete: List[AutoLamellaStage] = AutoLamellaMethod.TRENCH.workflow
 ) -> Experiment:
-    for lamella in experiment.positions:
+    # TODO: if we integrate this, we need to be more careful about which state we restore from,
+    # e.g. if we are in mill undercut, we need to go back to the PositionReady state.. not just current, needs more work
+    engine = WorkflowEngine(microscope, experiment, protocol.method, parent_ui)
+    experiment = engine.run_stage(AutoLamellaStage.MillTrench, 
+                                  _stage_task(mill_trench, microscope, protocol, parent_ui))
 
-        if lamella.workflow is AutoLamellaStage.PositionReady and not lamella.is_failure:
-        # if is_ready_for(lamella, protocol.method, AutoLamellaStage.MillTrench):
-        # TODO: if we integrate this, we need to be more careful about which state we restore from,
-        # e.g. if we are in mill undercut, we need to go back to the PositionReady state.. not just current, needs more work
-                        
-            lamella = start_of_stage_update(
-                microscope,
-                lamella,
-                AutoLamellaStage.MillTrench, 
-                parent_ui=parent_ui
-            )
-
-            lamella = mill_trench(microscope, protocol, lamella, parent_ui)
-            experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui)
-
-    log_status_message(lamella, "NULL_END") # for logging purposes
+    _log_null_end(experiment) # for logging purposes
 
     return experiment
 
@@ -71,19 +71,11 @@ def run_undercut_milling(
     experiment: Experiment,
     parent_ui: AutoLamellaUI = None,
 ) -> Experiment:
-    for lamella in experiment.positions:
+    engine = WorkflowEngine(microscope, experiment, protocol.method, parent_ui)
+    experiment = engine.run_stage(AutoLamellaStage.MillUndercut, 
+                                  _stage_task(mill_undercut, microscope, protocol, parent_ui))
 
-        if lamella.workflow is AutoLamellaStage.MillTrench and not lamella.is_failure:
-            lamella = start_of_stage_update(
-                microscope,
-                lamella,
-                AutoLamellaStage.MillUndercut,
-                parent_ui=parent_ui
-            )
-            lamella = mill_undercut(microscope, protocol, lamella, parent_ui)
-            experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui)
-
-        log_status_message(lamella, "NULL_END") # for logging purposes
+    _log_null_end(experiment) # for logging purposes
 
     return experiment
 
@@ -93,25 +85,11 @@ def run_setup_lamella(
     experiment: Experiment,
     parent_ui: AutoLamellaUI = None,
 ) -> Experiment:
-    for lamella in experiment.positions:
-
-        # TODO: migrate to is_ready_for:
-        #  protocol.method.get_next(lamella.workflow) is AutoLamellaStage.SetupLamella
-        if lamella.workflow in [AutoLamellaStage.PositionReady, 
-                                AutoLamellaStage.MillUndercut, 
-                                AutoLamellaStage.LandLamella] and not lamella.is_failure:
-            lamella = start_of_stage_update(
-                microscope,
-                lamella,
-                AutoLamellaStage.SetupLamella,
-                parent_ui=parent_ui
-            )
-
-            lamella = setup_lamella(microscope, protocol, lamella, parent_ui)
-
-            experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui)
+    engine = WorkflowEngine(microscope, experiment, protocol.method, parent_ui)
+    experiment = engine.run_stage(AutoLamellaStage.SetupLamella, 
+                                  _stage_task(setup_lamella, microscope, protocol, parent_ui))
     
-    log_status_message(lamella, "NULL_END") # for logging purposes
+    _log_null_end(experiment) # for logging purposes
 
     return experiment
 
@@ -124,34 +102,32 @@ def run_lamella_milling(
     stages_to_complete: List[AutoLamellaStage] = LAMELLA_MILLING_WORKFLOW
 ) -> Experiment:
 
-    for stage in LAMELLA_MILLING_WORKFLOW:
-        if stage not in stages_to_complete:
-            logging.info(f"Skipping stage {stage} as it is not in stages_to_complete {stages_to_complete}")
-            continue
-        for lamella in experiment.positions:
+    engine = WorkflowEngine(microscope, experiment, protocol.method, parent_ui)
+    tasks = {stage: _stage_task(WORKFLOW_STAGES[stage], microscope, protocol, parent_ui) 
+             for stage in LAMELLA_MILLING_WORKFLOW}
 
-            # special case for handling setup polishing as optional
-            if stage in [AutoLamellaStage.MillRough, AutoLamellaStage.SetupPolishing]:
-                is_previous_completed = lamella.workflow is AutoLamellaStage(stage.value - 1)
-            if stage is AutoLamellaStage.MillPolishing:
-                is_previous_completed = lamella.workflow in [AutoLamellaStage.MillRough, AutoLamellaStage.SetupPolishing]
-            is_ready = is_previous_completed and not lamella.is_failure
+    # mill all lamellae grouped by milling current (unsupervised only)
+    batches = {}
+    if cfg.MILLING_BATCH_BY_CURRENT:
+        for stage in MILLING_BATCH_STAGES:
+            if not protocol.supervision[stage]:
+                batches[stage] = partial(mill_lamellae_batched, microscope, protocol, engine.experiment, 
+                                         stage=stage, parent_ui=parent_ui)
 
-            if is_ready:
-                lamella = start_of_stage_update(microscope, lamella, stage, parent_ui)
-                lamella = WORKFLOW_STAGES[lamella.workflow](microscope, protocol, lamella, parent_ui)
-                experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui)
+    experiment = engine.run(tasks, stages_to_complete=stages_to_complete, batches=batches)
 
-    # finish # TODO: separate this into a separate function
-    for lamella in experiment.positions:
-        if lamella.workflow is AutoLamellaStage.MillPolishing and not lamella.is_failure:
-            lamella = start_of_stage_update(microscope, lamella, AutoLamellaStage.Finished, parent_ui, restore_state=False)
-            experiment = end_of_stage_update(microscope, experiment, lamella, parent_ui, save_state=False)
+    # finish
+    experiment = engine.run_stage(AutoLamellaStage.Finished, task=lambda lamella: lamella,
+                                  restore_state=False, save_state=False)
 
-    log_status_message(lamella, "NULL_END") # for logging purposes
+    _log_null_end(experiment) # for logging purposes
 
     return experiment
 
+def _log_null_end(experiment: Experiment) -> None:
+    if experiment.positions:
+        log_status_message(experiment.positions[-1], "NULL_END")
+
 def run_autolamella(
     microscope: FibsemMicroscope,
     protocol: AutoLamellaProtocol,
@@ -0,0 +1,286 @@
+import logging
+import math
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple, Type, TypeVar
+
+import numpy as np
+from fibsem.microscope import FibsemMicroscope
+from fibsem.structures import FibsemStagePosition
+
+from autolamella import config as cfg
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella
+
+# stage travel cost, in metres of xy travel (rotation and tilt are slower, and need to settle)
+ROTATION_COST = 10e-3           # per radian of rotation
+TILT_COST = 10e-3               # per radian of tilt
+ORIENTATION_CHANGE_COST = 5e-3  # for any change in rotation or tilt
+ORIENTATION_TOLERANCE = np.deg2rad(0.5)
+
+TWO_OPT_MAX_ITERATIONS = 100
+
+T = TypeVar("T")
+
+
+def stage_travel_cost(p0: FibsemStagePosition, p1: FibsemStagePosition) -> float:
+    """Estimate the cost of moving the stage between two positions. Changes in rotation
+    and tilt are weighted as more expensive than xy(z) moves.
+    Args:
+        p0: the start position
+        p1: the end position
+    Returns:
+        float: the travel cost (metres of equivalent xy travel)
+    """
+    cost = math.hypot(p1.x - p0.x, p1.y - p0.y) + abs(p1.z - p0.z)
+
+    dr = abs(math.remainder((p1.r or 0) - (p0.r or 0), 2 * math.pi))
+    dt = abs((p1.t or 0) - (p0.t or 0))
+    cost += ROTATION_COST * dr + TILT_COST * dt
+    if dr > ORIENTATION_TOLERANCE or dt > ORIENTATION_TOLERANCE:
+        cost += ORIENTATION_CHANGE_COST
+    return cost
+
+
+def _path_cost(path: List[int], dist: np.ndarray) -> float:
+    return float(sum(dist[a, b] for a, b in zip(path[:-1], path[1:])))
+
+
+def solve_travel_order(dist: np.ndarray) -> List[int]:
+    """Find a short open path through all the nodes, starting at node 0, using
+    nearest neighbour followed by 2-opt improvement.
+    Args:
+        dist: the (symmetric) cost matrix between nodes
+    Returns:
+        List[int]: the visiting order of the nodes (excluding the start node 0)
+    """
+    n = len(dist)
+    if n <= 2:
+        return list(range(1, n))
+
+    # nearest neighbour
+    path, remaining = [0], set(range(1, n))
+    while remaining:
+        last = path[-1]
+        nxt = min(remaining, key=lambda j: (dist[last, j], j))
+        path.append(nxt)
+        remaining.remove(nxt)
+
+    # 2-opt (the start is fixed, the end is open)
+    for _ in range(TWO_OPT_MAX_ITERATIONS):
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                a, b = path[i - 1], path[i]
+                c = path[k]
+                d = path[k + 1] if k + 1 < n else None
+                delta = dist[a, c] - dist[a, b]
+                if d is not None:
+                    delta += dist[b, d] - dist[c, d]
+                if delta < -1e-12:
+                    path[i:k + 1] = reversed(path[i:k + 1])
+                    improved = True
+        if not improved:
+            break
+
+    return path[1:]
+
+
+class LamellaScheduler:
+    """Orders the lamellae that are ready for a workflow stage. The base scheduler keeps
+    the experiment (insertion) order."""
+    name = "insertion"
+
+    def order(self, lamellae: List[Lamella], stage: AutoLamellaStage,
+              start_position: Optional[FibsemStagePosition] = None) -> List[Lamella]:
+        """Get the order to run the stage for the lamellae.
+        Args:
+            lamellae: the lamellae ready for the stage (in experiment order)
+            stage: the workflow stage
+            start_position: the current stage position
+        Returns:
+            List[Lamella]: the lamellae, in the order to run
+        """
+        return list(lamellae)
+
+
+class StageTravelScheduler(LamellaScheduler):
+    """Orders the lamellae to minimise the total stage travel, from the current stage position."""
+    name = "stage_travel"
+
+    def __init__(self, cost_fn: Callable[[FibsemStagePosition, FibsemStagePosition], float] = stage_travel_cost):
+        self.cost_fn = cost_fn
+
+    def order(self, lamellae: List[Lamella], stage: AutoLamellaStage,
+              start_position: Optional[FibsemStagePosition] = None) -> List[Lamella]:
+        # lamellae without a position are run last, in experiment order
+        positioned = [l for l in lamellae if _get_position(l) is not None]
+        unpositioned = [l for l in lamellae if _get_position(l) is None]
+        if len(positioned) <= 1:
+            return positioned + unpositioned
+
+        positions = [_get_position(l) for l in positioned]
+        start = start_position if start_position is not None else positions[0]
+        nodes = [start] + positions
+        dist = np.zeros((len(nodes), len(nodes)))
+        for i in range(len(nodes)):
+            for j in range(i + 1, len(nodes)):
+                dist[i, j] = dist[j, i] = self.cost_fn(nodes[i], nodes[j])
+
+        order = solve_travel_order(dist)
+        ordered = [positioned[i - 1] for i in order]
+        logging.debug({"msg": "schedule", "stage": stage.name, "scheduler": self.name,
+                       "order": [l.name for l in ordered],
+                       "cost": _path_cost([0] + order, dist),
+                       "cost_insertion": _path_cost(list(range(len(nodes))), dist)})
+        return ordered + unpositioned
+
+
+def _get_position(lamella: Lamella) -> Optional[FibsemStagePosition]:
+    # positions without coordinates (e.g. the default position) are unpositioned
+    try:
+        position = lamella.state.microscope_state.stage_position
+    except AttributeError:
+        return None
+    if position is None or position.x is None or position.y is None or position.z is None:
+        return None
+    return position
+
+
+SCHEDULERS: Dict[str, Type[LamellaScheduler]] = {
+    LamellaScheduler.name: LamellaScheduler,
+    StageTravelScheduler.name: StageTravelScheduler,
+}
+
+
+def get_scheduler(name: Optional[str] = None) -> LamellaScheduler:
+    """Get the lamella scheduler (default: cfg.WORKFLOW_SCHEDULER)."""
+    name = name or cfg.WORKFLOW_SCHEDULER
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler: {name}, expected one of {list(SCHEDULERS)}")
+    return SCHEDULERS[name]()
+
+
+def schedule_lamellae(microscope: FibsemMicroscope, lamellae: List[Lamella],
+                      stage: AutoLamellaStage, scheduler: Optional[LamellaScheduler] = None) -> List[Lamella]:
+    """Order the lamellae ready for the stage with the scheduler, starting from the current stage position.
+    Args:
+        microscope: the microscope
+        lamellae: the lamellae ready for the stage
+        stage: the workflow stage
+        scheduler: the scheduler (default: get_scheduler())
+    Returns:
+        List[Lamella]: the lamellae, in the order to run
+    """
+    if scheduler is None:
+        scheduler = get_scheduler()
+
+    start_position = None
+    try:
+        start_position = microscope.get_stage_position()
+    except Exception as e:
+        logging.warning(f"Failed to get the stage position for scheduling: {e}")
+
+    return scheduler.order(lamellae, stage, start_position=start_position)
+
+
+def batch_by_key(sequences: List[List[T]], key: Callable[[T], Hashable]) -> List[Tuple[int, T]]:
+    """Interleave per-lamella sequences of tasks, grouping tasks with the same key (e.g. milling current),
+    so that the key changes as few times as possible. The order within each sequence is kept.
+    Greedy: continue with the current key while any sequence is waiting on it, otherwise switch
+    to the key that the most sequences are waiting on.
+    Args:
+        sequences: the tasks for each lamella, in the order they must run
+        key: the batching key of a task
+    Returns:
+        List[Tuple[int, T]]: the (sequence index, task) to run, in order
+    """
+    heads = [0] * len(sequences)
+    order: List[Tuple[int, T]] = []
+    current = None
+    while True:
+        waiting = [key(seq[heads[i]]) for i, seq in enumerate(sequences) if heads[i] < len(seq)]
+        if not waiting:
+            break
+        if current not in waiting:
+            counts = Counter(waiting)
+            current = max(counts, key=lambda k: (counts[k], -waiting.index(k)))
+        for i, seq in enumerate(sequences):
+            while heads[i] < len(seq) and key(seq[heads[i]]) == current:
+                order.append((i, seq[heads[i]]))
+                heads[i] += 1
+    return order
+
+
+# stages that can be skipped (the next stage is also ready after the previous stage)
+OPTIONAL_STAGES = [AutoLamellaStage.SetupPolishing]
+
+# the stage a lamella is at before the first stage of the workflow
+START_STAGE = AutoLamellaStage.PositionReady
+
+
+class WorkflowGraph:
+    """The workflow for a method, as a dependency graph of stages. A lamella is ready for a stage
+    when its last completed stage is one of the stage requirements (the previous stage, or the stage
+    before an optional stage)."""
+
+    def __init__(self, method: AutoLamellaMethod):
+        self.method = method
+        self.stages: List[AutoLamellaStage] = list(method.workflow)
+        self.requires: Dict[AutoLamellaStage, Set[AutoLamellaStage]] = {}
+
+        previous = {START_STAGE}
+        for stage in self.stages:
+            self.requires[stage] = set(previous)
+            if stage in OPTIONAL_STAGES:
+                previous = previous | {stage}
+            else:
+                previous = {stage}
+        # finished after the last stage (or the stage before it, if the last stage is optional)
+        self.requires[AutoLamellaStage.Finished] = set(previous)
+
+    def is_ready(self, lamella: Lamella, stage: AutoLamellaStage) -> bool:
+        """Is the lamella ready for the stage (last completed stage is a requirement, and not failed)."""
+        return not lamella.is_failure and lamella.workflow in self.requires.get(stage, ())
+
+    def next_stage(self, completed: AutoLamellaStage) -> Optional[AutoLamellaStage]:
+        """Get the next stage to run after the completed stage (optional stages are included), or None
+        if the completed stage is not part of the workflow."""
+        for stage in self.stages + [AutoLamellaStage.Finished]:
+            if completed in self.requires[stage]:
+                return stage
+        return None
+
+
+class ReadyIndex:
+    """An index from the last completed stage to the lamellae at that stage (excluding failures).
+    Built once from the experiment, then updated as each lamella completes a stage, so getting
+    the lamellae ready for a stage doesn't rescan all the positions."""
+
+    def __init__(self, experiment: Experiment):
+        self._order: Dict[int, int] = {}                   # id(lamella) -> position index
+        self._stage: Dict[int, AutoLamellaStage] = {}      # id(lamella) -> indexed stage
+        self._lamellae: Dict[AutoLamellaStage, Dict[int, Lamella]] = {}
+        for lamella in experiment.positions:
+            self.add(lamella)
+
+    def add(self, lamella: Lamella) -> None:
+        """Add a lamella to the index (after the existing lamellae)."""
+        key = id(lamella)
+        if key not in self._order:
+            self._order[key] = len(self._order)
+        self.update(lamella)
+
+    def update(self, lamella: Lamella) -> None:
+        """Re-index the lamella after its stage (or failure) has changed."""
+        key = id(lamella)
+        if key not in self._order:
+            return self.add(lamella)
+        if key in self._stage:
+            self._lamellae[self._stage.pop(key)].pop(key, None)
+        if not lamella.is_failure:
+            self._stage[key] = lamella.workflow
+            self._lamellae.setdefault(lamella.workflow, {})[key] = lamella
+
+    def at_stage(self, stages: Set[AutoLamellaStage]) -> List[Lamella]:
+        """Get the (not failed) lamellae whose last completed stage is one of stages, in experiment order."""
+        lamellae = [l for stage in stages for l in self._lamellae.get(stage, {}).values()]
+        return sorted(lamellae, key=lambda l: self._order[id(l)])
@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 import logging
 import time
 from collections import Counter
 from copy import deepcopy
 from pprint import pprint
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import numpy as np
-from fibsem import acquire, alignment, calibration
+from fibsem import alignment, calibration
 from fibsem import config as fcfg
 from fibsem import utils as fibsem_utils
 from fibsem.detection import detection
@@ -50,6 +52,7 @@ from fibsem.structures import (
 )
 
 from autolamella.structures import (
+    AutoLamellaMethod,
     AutoLamellaProtocol,
     AutoLamellaStage,
     Experiment,
@@ -58,8 +61,7 @@ from autolamella.structures import (
     create_new_lamella,
 )
 
-from autolamella.ui import AutoLamellaUI
-from autolamella.workflows import actions
+from autolamella.workflows import acquire, actions
 from autolamella.workflows.autoliftout import (
     end_of_stage_update,
     log_status_message,
@@ -73,6 +75,7 @@ from autolamella.workflows.core import (
     mill_trench,
     mill_undercut,
 )
+from autolamella.workflows.scheduler import WorkflowGraph
 from autolamella.workflows.ui import (
     ask_user,
     set_images_ui,
@@ -82,6 +85,9 @@ from autolamella.workflows.ui import (
     update_status_ui,
 )
 
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
+
 # serial workflow functions
 
 def liftout_lamella(
@@ -287,6 +293,7 @@ def liftout_lamella(
         set_images_ui(parent_ui, eb_image, ib_image)
 
         # TODO: implemented automated detection for separation of volume from trench
+        response = True
         if validate:
             response = ask_user(parent_ui, 
                                 msg=f"Press Continue to confirm to separation of volume for {lamella.petname}.", 
@@ -735,11 +742,11 @@ def sever_lamella_block(microscope: FibsemMicroscope,
                                 validate=validate, msg=lamella.info) 
         # if the distance is less than the threshold, then the lamella is not severed
         threshold = protocol.tmp.get("landing-sever-threshold", 0.5e-6)
-        if abs(det.distance.y) < threshold:
+        confirm_severed = bool(abs(det.distance.y) >= threshold)
+        if not confirm_severed:
             logging.info(f"Lamella Not Severed: {det.distance.y} < {threshold}")
-            logging.debug({"msg": "check_volume_sever",  "detected_features": det.to_dict(), "threshold": threshold})   
-            confirm_severed = False
-        
+            logging.debug({"msg": "check_volume_sever",  "detected_features": det.to_dict(), "threshold": threshold})
+
         # check with the user
         if validate:
             response = ask_user(parent_ui, 
@@ -784,14 +791,15 @@ def run_serial_liftout_workflow(
     image_settings.filename = f"{fibsem_utils.current_timestamp()}"
 
     # standard workflow
+    graph = WorkflowGraph(AutoLamellaMethod.SERIAL_LIFTOUT)
+    stages = graph.stages[:graph.stages.index(AutoLamellaStage.LiftoutLamella) + 1]
     lamella: Lamella
     for lamella in experiment.positions:
         if lamella.is_failure:
             logging.info(f"Skipping {lamella.petname} due to failure.")
             continue  # skip failures
 
-        while lamella.state.stage.value < AutoLamellaStage.LiftoutLamella.value:
-            next_stage = AutoLamellaStage(lamella.state.stage.value + 1)
+        while (next_stage := graph.next_stage(lamella.workflow)) in stages:
             if True:
                 msg = (
                     f"""Continue Lamella {(lamella.petname)} from {next_stage.name}?"""
@@ -898,6 +906,11 @@ def run_serial_liftout_landing(
 
     while response:
 
+        # headless, the user always continues: stop when the landing positions are used
+        if land_idx >= len(positions):
+            logging.info(f"All {len(positions)} landing positions have been used.")
+            break
+
         # TODO: this whole procedure needs to be rethought
         # create another lamella
         lamella = deepcopy(create_lamella_at_landing(microscope=microscope, 
@@ -905,7 +918,7 @@ def run_serial_liftout_landing(
                                                     protocol=protocol, 
                                                     positions=positions)) # TODO: FIX_IMMEDIATE
         experiment.positions.append(lamella)
-        experiment.save()
+        experiment.save(background=True)
 
         # advance workflow
         lamella = start_of_stage_update(microscope, lamella, 
@@ -959,7 +972,7 @@ def select_landing_positions(microscope: FibsemMicroscope,
 
         # add the position to the experiment
         experiment.landing_positions.append(deepcopy(stage_position))
-        experiment.save()
+        experiment.save(background=True)
 
         update_experiment_ui(parent_ui, experiment)
 
@@ -1,7 +1,9 @@
+from __future__ import annotations
+
 import logging
 import time
 from copy import deepcopy
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
 from fibsem import milling
 from fibsem.detection import detection
@@ -15,9 +17,13 @@ from fibsem.structures import (
     FibsemStagePosition,
     ImageSettings,
 )
-from autolamella.ui import AutoLamellaUI
 from autolamella.structures import Experiment
 
+if TYPE_CHECKING:
+    from autolamella.ui.AutoLamellaUI import AutoLamellaUI
+
+ACQUISITION_POLL_INTERVAL = 0.01 # seconds
+
 # CORE UI FUNCTIONS -> PROBS SEPARATE FILE
 def _check_for_abort(parent_ui: AutoLamellaUI, msg: str = "Workflow aborted by user.") -> bool:
     # headless mode
@@ -28,6 +34,20 @@ def _check_for_abort(parent_ui: AutoLamellaUI, msg: str = "Workflow aborted by u
         raise InterruptedError(msg)
     return False
 
+def _wait_for_ui_update(parent_ui: AutoLamellaUI, info: dict) -> None:
+    """Send the update to the ui, and wait for the ui to apply it (handle_workflow_update)."""
+    parent_ui.WAITING_FOR_UI_UPDATE = True # set before emitting, so the ui can't clear it first
+    parent_ui.workflow_update_signal.emit(info)
+    logging.info("WAITING FOR UI UPDATE... ")
+    parent_ui.WAITING_FOR_UI_UPDATE.wait()
+
+def _wait_for_user_interaction(parent_ui: AutoLamellaUI, info: dict) -> None:
+    """Send the request to the ui, and wait for the user to respond (push_interaction_button)."""
+    parent_ui.WAITING_FOR_USER_INTERACTION = True
+    parent_ui.workflow_update_signal.emit(info)
+    logging.info("WAITING_FOR_USER_INTERACTION...")
+    parent_ui.WAITING_FOR_USER_INTERACTION.wait()
+
 def update_milling_ui(microscope: FibsemMicroscope, 
                       stages: List[FibsemMillingStage], 
                       parent_ui: AutoLamellaUI, 
@@ -60,8 +80,9 @@ def update_milling_ui(microscope: FibsemMicroscope,
         parent_ui.run_milling_signal.emit() # TODO: have the signal change the state, rather than here
 
         logging.info("WAITING FOR MILLING TO FINISH... ")
-        while parent_ui.is_milling or parent_ui.image_widget.is_acquiring:
-            time.sleep(1)
+        parent_ui.is_milling.wait()
+        while parent_ui.image_widget.is_acquiring: # not signalled by the image widget
+            time.sleep(ACQUISITION_POLL_INTERVAL)
 
         update_status_ui(
            parent_ui, f"Milling Complete: {len(stages)} stages completed."
@@ -108,11 +129,7 @@ def update_milling_stages_ui(
         "stages": stages,
     }
 
-    parent_ui.WAITING_FOR_UI_UPDATE = True
-    parent_ui.workflow_update_signal.emit(INFO)
-    logging.info("WAITING FOR UI UPDATE... ")
-    while parent_ui.WAITING_FOR_UI_UPDATE:
-        time.sleep(0.5)
+    _wait_for_ui_update(parent_ui, INFO)
 
 def update_detection_ui(
     microscope: FibsemMicroscope, 
@@ -178,12 +195,7 @@ def set_images_ui(
         "fib_image": ib_image,
 
     }
-    parent_ui.WAITING_FOR_UI_UPDATE = True
-    parent_ui.workflow_update_signal.emit(INFO)
-
-    logging.info("WAITING FOR UI UPDATE... ")
-    while parent_ui.WAITING_FOR_UI_UPDATE:
-        time.sleep(0.5)
+    _wait_for_ui_update(parent_ui, INFO)
 
 def update_status_ui(parent_ui: AutoLamellaUI, msg: str, workflow_info: str = None) -> None:
 
@@ -222,12 +234,7 @@ def ask_user(
         "milling_enabled": mill,
         "spot_burn": spot_burn,
     }
-    parent_ui.workflow_update_signal.emit(INFO)
-
-    parent_ui.WAITING_FOR_USER_INTERACTION = True
-    logging.info("WAITING_FOR_USER_INTERACTION...")
-    while parent_ui.WAITING_FOR_USER_INTERACTION:
-        time.sleep(1)
+    _wait_for_user_interaction(parent_ui, INFO)
 
     INFO = {
         "msg": "",
@@ -258,12 +265,7 @@ def update_alignment_area_ui(alignment_area: FibsemRectangle, parent_ui: AutoLam
         "pos": "Continue",
         "alignment_area": alignment_area,
     }
-    parent_ui.workflow_update_signal.emit(INFO)
-
-    parent_ui.WAITING_FOR_USER_INTERACTION = True
-    logging.info("WAITING_FOR_USER_INTERACTION...")
-    while parent_ui.WAITING_FOR_USER_INTERACTION:
-        time.sleep(1)
+    _wait_for_user_interaction(parent_ui, INFO)
 
     _check_for_abort(parent_ui)
 
@@ -272,11 +274,7 @@ def update_alignment_area_ui(alignment_area: FibsemRectangle, parent_ui: AutoLam
         "alignment_area": "clear",
     }
 
-    parent_ui.WAITING_FOR_UI_UPDATE = True
-    parent_ui.workflow_update_signal.emit(INFO)
-    logging.info("WAITING FOR UI UPDATE... ")
-    while parent_ui.WAITING_FOR_UI_UPDATE:
-        time.sleep(0.5)
+    _wait_for_ui_update(parent_ui, INFO)
 
     # retrieve the updated alignment area
     alignment_area = deepcopy(parent_ui.image_widget.get_alignment_area())
@@ -0,0 +1,51 @@
+import pytest
+
+from simulation import SimulatedLatency, add_simulated_latency, simulated_detection
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("simulation", "simulated microscope for the workflow benchmarks")
+    group.addoption("--sim-lamellae", type=str, default="10,100,1000",
+                    help="The experiment sizes (number of lamellae), comma separated")
+    group.addoption("--sim-move-latency", type=float, default=0.0, help="Latency per stage move (s)")
+    group.addoption("--sim-imaging-latency", type=float, default=0.0, help="Latency per image acquisition (s)")
+    group.addoption("--sim-milling-latency", type=float, default=0.0, help="Latency per milling run (s)")
+    group.addoption("--sim-detection-latency", type=float, default=0.0, help="Latency per feature detection (s)")
+    group.addoption("--sim-rounds", type=int, default=1, help="The number of rounds for each benchmark")
+
+
+def pytest_generate_tests(metafunc):
+    if "n_lamellae" in metafunc.fixturenames:
+        sizes = [int(n) for n in metafunc.config.getoption("sim_lamellae").split(",")]
+        metafunc.parametrize("n_lamellae", sizes)
+
+
+@pytest.fixture
+def latency(request) -> SimulatedLatency:
+    return SimulatedLatency(
+        move=request.config.getoption("sim_move_latency"),
+        imaging=request.config.getoption("sim_imaging_latency"),
+        milling=request.config.getoption("sim_milling_latency"),
+        detection=request.config.getoption("sim_detection_latency"),
+    )
+
+
+@pytest.fixture
+def rounds(request) -> int:
+    return request.config.getoption("sim_rounds")
+
+
+@pytest.fixture
+def sim_session(monkeypatch, latency: SimulatedLatency):
+    """The demo microscope (and settings), with the simulated latencies and feature detection."""
+    from fibsem import utils
+    from fibsem.detection import detection
+
+    # only the simulated latencies, not the demo microscope delays
+    monkeypatch.setenv("FIBSEM_SIM_NO_DELAY", "1")
+    monkeypatch.setattr(detection, "take_image_and_detect_features", simulated_detection(latency.detection))
+
+    microscope, settings = utils.setup_session(manufacturer="Demo", setup_logging=False)
+    add_simulated_latency(microscope, latency)
+    yield microscope, settings
+    microscope.disconnect()
@@ -0,0 +1,244 @@
+import os
+import time
+from copy import deepcopy
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+from fibsem import acquire, conversions, utils
+from fibsem.detection.detection import DetectedFeatures, Feature
+from fibsem.microscope import FibsemMicroscope
+from fibsem.milling import get_protocol_from_stages
+from fibsem.structures import ImageSettings, MicroscopeSettings, Point
+
+import autolamella
+from autolamella.persistence.images import get_image_writer
+from autolamella.structures import (
+    AutoLamellaMethod,
+    AutoLamellaProtocol,
+    AutoLamellaStage,
+    Experiment,
+    LamellaState,
+    create_new_experiment,
+    create_new_lamella,
+)
+
+# simulated microscope, feature detection and experiments for the workflow benchmarks
+
+PROTOCOL_PATH = os.path.join(os.path.dirname(autolamella.__file__), "protocol")
+METHOD_PROTOCOLS = {
+    AutoLamellaMethod.ON_GRID: "protocol-on-grid.yaml",
+    AutoLamellaMethod.WAFFLE: "protocol-waffle.yaml",
+    AutoLamellaMethod.TRENCH: "protocol-trench.yaml",
+    AutoLamellaMethod.SERIAL_LIFTOUT: "protocol-serial-liftout.yaml",
+}
+
+# the microscope methods that take time on the hardware. compound moves (e.g. safe and
+# stable moves) are made of these, so each primitive move is delayed, as on the hardware
+LATENCY_METHODS = {
+    "move": ["move_stage_absolute", "move_stage_relative",
+             "move_manipulator_absolute", "move_manipulator_relative"],
+    "imaging": ["acquire_image"],
+    "milling": ["run_milling"],
+}
+
+POSITION_SPACING = 50e-6 # lamellae are placed on a grid, with this spacing (m)
+POSITION_COLUMNS = 32
+FEATURE_SPACING = 8 # simulated features are detected 1/8 of the image height apart
+
+
+@dataclass
+class SimulatedLatency:
+    move: float = 0.0       # per stage / manipulator move (s)
+    imaging: float = 0.0    # per image acquisition (s)
+    milling: float = 0.0    # per milling run (s)
+    detection: float = 0.0  # per feature detection (s)
+
+
+def _with_latency(fn: Callable, latency: float) -> Callable:
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        time.sleep(latency)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def add_simulated_latency(microscope: FibsemMicroscope, latency: SimulatedLatency) -> FibsemMicroscope:
+    """Delay the microscope moves, acquisitions and milling by the simulated latency.
+    The demo microscope delays should be disabled (FIBSEM_SIM_NO_DELAY=1)."""
+    for key, methods in LATENCY_METHODS.items():
+        value = getattr(latency, key)
+        if value <= 0:
+            continue
+        for name in methods:
+            setattr(microscope, name, _with_latency(getattr(microscope, name), value))
+    return microscope
+
+
+def simulated_detection(latency: float = 0.0) -> Callable:
+    """Get a replacement for detection.take_image_and_detect_features, which detects the features
+    near the image centre (without a segmentation model) after the simulated latency."""
+
+    def take_image_and_detect_features(
+        microscope: FibsemMicroscope,
+        image_settings: ImageSettings,
+        features: Sequence[Feature],
+        point: Optional[Point] = None,
+        checkpoint: Optional[str] = None,
+    ) -> DetectedFeatures:
+        image_settings.reduced_area = None
+        image_settings.filename = f"ml-{utils.current_timestamp_v2()}"
+        image_settings.save = True
+        image = acquire.new_image(microscope, image_settings)
+
+        if latency > 0:
+            time.sleep(latency)
+
+        # the features are detected one below the other, so they are distinct (e.g. severed)
+        shape = image.data.shape[:2]
+        for i, feature in enumerate(features):
+            feature.px = Point(x=shape[1] // 2, y=shape[0] // 2 + i * shape[0] // FEATURE_SPACING)
+        det = DetectedFeatures(
+            features=list(features),
+            image=image.data,
+            mask=np.zeros(shape, dtype=np.uint8),
+            rgb=np.zeros(shape + (3,), dtype=np.uint8),
+            pixelsize=image.metadata.pixel_size.x,
+            fibsem_image=image,
+            checkpoint="simulated",
+        )
+        for feature in det.features:
+            feature.feature_m = conversions.image_to_microscope_image_coordinates(
+                feature.px, image.data, det.pixelsize)
+        return det
+
+    return take_image_and_detect_features
+
+
+def load_simulated_protocol(method: AutoLamellaMethod, settings: MicroscopeSettings,
+                            experiment: Experiment) -> AutoLamellaProtocol:
+    """Load the default protocol for the method, unsupervised (as the headless runner)."""
+    protocol = AutoLamellaProtocol.load(os.path.join(PROTOCOL_PATH, METHOD_PROTOCOLS[method]))
+    settings = deepcopy(settings)
+    settings.image.path = experiment.path
+    protocol.configuration = settings
+    protocol.supervision = {stage: False for stage in protocol.supervision}
+    return protocol
+
+
+def create_simulated_experiment(path: Path, microscope: FibsemMicroscope, method: AutoLamellaMethod,
+                                n_lamellae: int, landing: bool = False) -> Experiment:
+    """Create an experiment with lamellae ready for the method workflow (PositionReady).
+    Args:
+        path: the directory to create the experiment in
+        microscope: the (simulated) microscope
+        method: the workflow method
+        n_lamellae: the number of lamellae
+        landing: add a landing position for each lamella (serial liftout)
+    Returns:
+        Experiment: the experiment
+    """
+    experiment = create_new_experiment(path=str(path), name=f"{method.name}-{n_lamellae}", method=method.name)
+    protocol = AutoLamellaProtocol.load(os.path.join(PROTOCOL_PATH, METHOD_PROTOCOLS[method]))
+    milling_protocol = {k: get_protocol_from_stages(v) for k, v in protocol.milling.items()}
+    microscope_state = microscope.get_microscope_state()
+
+    for i in range(n_lamellae):
+        state = LamellaState(stage=AutoLamellaStage.PositionReady,
+                             microscope_state=deepcopy(microscope_state),
+                             start_timestamp=time.time(),
+                             end_timestamp=time.time())
+        state.microscope_state.stage_position = _grid_position(microscope_state.stage_position, i)
+        lamella = create_new_lamella(experiment_path=experiment.path, number=i + 1,
+                                     state=state, protocol=deepcopy(milling_protocol))
+        lamella.states[AutoLamellaStage.PositionReady] = deepcopy(state)
+        experiment.positions.append(lamella)
+
+        if landing:
+            experiment.landing_positions.append(
+                _grid_position(microscope_state.stage_position, i, offset=POSITION_COLUMNS * POSITION_SPACING))
+
+    experiment.save()
+    return experiment
+
+
+def _grid_position(position, index: int, offset: float = 0.0):
+    position = deepcopy(position)
+    position.x += (index % POSITION_COLUMNS) * POSITION_SPACING + offset
+    position.y += (index // POSITION_COLUMNS) * POSITION_SPACING
+    return position
+
+
+@dataclass
+class WorkflowMetrics:
+    lamella_stages: int     # the number of lamella stages completed
+    wall_time: float        # s
+    cpu_time: float         # s, all threads (including the image writer)
+    bytes_written: Optional[int]  # written by the process (linux only)
+    experiment_bytes: int   # experiment directory growth
+
+    def to_dict(self) -> Dict[str, float]:
+        """The metrics, and the metrics per lamella stage."""
+        ddict = asdict(self)
+        n = max(self.lamella_stages, 1)
+        for key in ["wall_time", "cpu_time", "bytes_written", "experiment_bytes"]:
+            if ddict[key] is not None:
+                ddict[f"{key}_per_lamella_stage"] = ddict[key] / n
+        return ddict
+
+
+def measure_workflow(run: Callable[[], Experiment], experiment: Experiment) -> WorkflowMetrics:
+    """Run the workflow, and measure the wall-clock time, cpu time and bytes written.
+    Args:
+        run: run the workflow, returns the experiment
+        experiment: the experiment (before the workflow is run)
+    Returns:
+        WorkflowMetrics: the metrics
+    """
+    lamella_stages = _count_lamella_stages(experiment)
+    experiment_bytes = _directory_size(experiment.path)
+    bytes_written = _process_bytes_written()
+    t0, c0 = time.perf_counter(), time.process_time()
+
+    # include the background writes (images, then the experiment saves and thumbnails)
+    experiment = run()
+    get_image_writer().flush()
+    experiment.flush()
+
+    wall_time, cpu_time = time.perf_counter() - t0, time.process_time() - c0
+    if bytes_written is not None:
+        bytes_written = _process_bytes_written() - bytes_written
+    return WorkflowMetrics(
+        lamella_stages=_count_lamella_stages(experiment) - lamella_stages,
+        wall_time=wall_time,
+        cpu_time=cpu_time,
+        bytes_written=bytes_written,
+        experiment_bytes=_directory_size(experiment.path) - experiment_bytes,
+    )
+
+
+def _count_lamella_stages(experiment: Experiment) -> int:
+    return sum(len(lamella.states) for lamella in experiment.positions)
+
+
+def _directory_size(path: str) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for fname in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, fname))
+            except OSError: # removed while walking (e.g. temporary files)
+                pass
+    return size
+
+
+def _process_bytes_written() -> Optional[int]:
+    # bytes passed to write calls by the process (files, logs), from /proc/self/io
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
@@ -0,0 +1,65 @@
+"""End-to-end workflow throughput, run headless against the fibsem demo microscope.
+
+Requires pytest-benchmark. Run from the repository root, e.g.:
+    python -m pytest benchmarks --sim-lamellae 10,100 --sim-imaging-latency 0.5 --sim-milling-latency 5
+
+The wall-clock time, cpu time and bytes written (total, and per lamella stage) are reported
+in the benchmark extra_info (e.g. --benchmark-json). The images are written at the microscope
+configuration resolution, large experiments write a lot of data (see pytest --basetemp).
+"""
+import itertools
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+try:
+    from autolamella.workflows.serial import run_serial_liftout_landing, run_serial_liftout_workflow
+except ImportError as e:
+    pytest.skip(f"The workflows can't be imported: {e}", allow_module_level=True)
+
+from autolamella.structures import AutoLamellaMethod
+from autolamella.workflows.headless import run_headless
+from simulation import create_simulated_experiment, load_simulated_protocol, measure_workflow
+
+
+def _benchmark_workflow(benchmark, sim_session, tmp_path, rounds: int, method: AutoLamellaMethod,
+                        n_lamellae: int, workflow):
+    microscope, settings = sim_session
+    counter = itertools.count()
+
+    def setup():
+        path = tmp_path / f"round-{next(counter)}"
+        experiment = create_simulated_experiment(path, microscope, method, n_lamellae,
+                                                 landing=method is AutoLamellaMethod.SERIAL_LIFTOUT)
+        protocol = load_simulated_protocol(method, settings, experiment)
+        return (experiment, protocol), {}
+
+    def run(experiment, protocol):
+        return measure_workflow(lambda: workflow(microscope, protocol, experiment), experiment)
+
+    metrics = benchmark.pedantic(run, setup=setup, rounds=rounds, iterations=1)
+    benchmark.extra_info.update({"method": method.name, "lamellae": n_lamellae, **metrics.to_dict()})
+    assert metrics.lamella_stages > 0
+
+
+@pytest.mark.parametrize("method", [AutoLamellaMethod.ON_GRID, AutoLamellaMethod.WAFFLE, AutoLamellaMethod.TRENCH],
+                         ids=lambda method: method.name)
+def test_workflow(benchmark, sim_session, tmp_path, rounds, method, n_lamellae):
+    """run_autolamella, run_autolamella_waffle and run_trench_milling (via the headless runner)."""
+
+    def workflow(microscope, protocol, experiment):
+        return run_headless(microscope, protocol, experiment, method, method.workflow)
+
+    _benchmark_workflow(benchmark, sim_session, tmp_path, rounds, method, n_lamellae, workflow)
+
+
+def test_serial_liftout(benchmark, sim_session, tmp_path, rounds, n_lamellae):
+    """Serial liftout: trench, undercut and liftout, landing, then lamella milling."""
+    method = AutoLamellaMethod.SERIAL_LIFTOUT
+
+    def workflow(microscope, protocol, experiment):
+        experiment = run_serial_liftout_workflow(microscope, protocol, experiment, parent_ui=None)
+        experiment = run_serial_liftout_landing(microscope, protocol, experiment, parent_ui=None)
+        return run_headless(microscope, protocol, experiment, method, method.workflow)
+
+    _benchmark_workflow(benchmark, sim_session, tmp_path, rounds, method, n_lamellae, workflow)
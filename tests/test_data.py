@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+from copy import deepcopy
+
+import pandas as pd
+import pytest
+
+from autolamella.structures import Experiment, LamellaState, create_new_lamella
+from autolamella.telemetry import configure_telemetry
+from autolamella.tools.aggregate import (
+    AGGREGATE_CACHE_FILENAME,
+    AGGREGATE_CACHE_MANIFEST,
+    aggregate_experiments,
+    find_experiments,
+)
+from autolamella.tools.data import (
+    LOG_INDEX_FILENAME,
+    LogParser,
+    get_statistics_signature,
+    load_statistics_tables,
+    parse_log_incremental,
+)
+from autolamella.tools.tables import TABLE_SCHEMAS, apply_schema, read_tables, write_tables
+
+LOG_LINES = [
+    "2024-01-01 10:00:00,001 — root — DEBUG — log_status_message:89 — {'msg': 'status', 'petname': '01-lamella', 'stage': 'MillTrench', 'step': 'STARTED'}",
+    "2024-01-01 10:00:01,001 — root — INFO — move_stage_absolute:120 — moving stage (unrelated)",
+    "2024-01-01 10:00:02,001 — root — DEBUG — beam_shift:1200 — {'msg': 'beam_shift', 'dx': 1e-06, 'dy': 0.0, 'beam_type': 'ION'}",
+    "2024-01-01 10:00:03,001 — root — DEBUG — save_ml_feature_data:12 — {'msg': 'det', 'px': {'x': 1, 'y': 2}, 'dpx': {'x': 3, 'y': 4}, 'dm': {'x': 5, 'y': 6}, 'is_correct': False, 'feature': 'LamellaCentre', 'beam_type': 'ION'}",
+    "2024-01-01 10:00:04,001 — root — DEBUG — log_status_message:89 — {'msg': 'status', 'petname': '01-lamella', 'stage': 'MillTrench', 'step': 'FINISHED'}",
+    "a partial line without delimiters",
+]
+
+
+def test_log_parser():
+    """Log lines are dispatched by function name into column-wise tables."""
+    parser = LogParser()
+    parser.parse_lines(LOG_LINES)
+    dfs = parser.to_dataframes()
+
+    assert list(dfs["steps"]["step"]) == ["STARTED", "FINISHED"]
+    assert list(dfs["steps"]["step_n"]) == [0, 1]
+    assert parser.current_step == "FINISHED"
+
+    df_beam_shift = dfs["beam_shift"]
+    assert len(df_beam_shift) == 1
+    assert df_beam_shift["step"][0] == "STARTED"
+    assert df_beam_shift["lamella"][0] == "01-lamella"
+
+    df_det = dfs["det"]
+    assert df_det["dm_x"][0] == 5 and "dm" not in df_det.columns
+    assert list(dfs["click"]["type"]) == ["DET"]
+    assert dfs["milling"].empty
+
+
+def test_parse_log_incremental(tmp_path):
+    """Only the lines appended since the last call are parsed, partial lines are deferred."""
+    fname = os.path.join(tmp_path, "logfile.log")
+    with open(fname, "w", encoding="utf-8") as f:
+        f.write("\n".join(LOG_LINES[:3]) + "\n" + LOG_LINES[3][:40])
+
+    parser = parse_log_incremental(tmp_path, encoding="utf-8")
+    assert len(parser.tables["beam_shift"].columns["step"]) == 1
+    assert parser.tables["det"].n_rows == 0
+
+    # finish the partial line, and append
+    with open(fname, "a", encoding="utf-8") as f:
+        f.write(LOG_LINES[3][40:] + "\n" + LOG_LINES[4] + "\n")
+
+    parser = parse_log_incremental(tmp_path, encoding="utf-8")
+    dfs = parser.to_dataframes()
+    assert list(dfs["steps"]["step_n"]) == [0, 1]
+    assert len(dfs["det"]) == 1
+    assert len(dfs["beam_shift"]) == 1
+
+    # the index is json, and the resumed tables are the same as parsing the whole log
+    with open(os.path.join(tmp_path, LOG_INDEX_FILENAME), encoding="utf-8") as f:
+        assert json.load(f)["offset"] == os.path.getsize(fname)
+    full = LogParser()
+    full.parse_file(fname, encoding="utf-8")
+    for name, df in full.to_dataframes().items():
+        pd.testing.assert_frame_equal(dfs[name], df)
+
+    # a replaced log is re-parsed from the start
+    with open(fname, "w", encoding="utf-8") as f:
+        f.write(LOG_LINES[4] + "\n")
+    parser = parse_log_incremental(tmp_path, encoding="utf-8")
+    assert list(parser.to_dataframes()["steps"]["step_n"]) == [0]
+
+
+def test_telemetry(tmp_path):
+    """Logged events are written to telemetry.jsonl, and loaded without parsing the text log."""
+    handler = configure_telemetry(tmp_path, create=True)
+    logger = logging.getLogger("test_telemetry")
+    logger.setLevel(logging.DEBUG)
+    try:
+        def log_status_message(step: str):
+            logger.debug({"msg": "status", "petname": "01-lamella", "stage": "MillTrench", "step": step})
+
+        def save_ml_feature_data():
+            logger.debug({"msg": "det", "px": {"x": 1, "y": 2}, "dpx": {"x": 3, "y": 4}, "dm": {"x": 5, "y": 6}, 
+                          "is_correct": False, "feature": "LamellaCentre", "beam_type": "ION"})
+
+        log_status_message("STARTED")
+        save_ml_feature_data()
+        logger.debug("text messages are not telemetry")
+        log_status_message("FINISHED")
+    finally:
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+
+    parser = parse_log_incremental(tmp_path)
+    dfs = parser.to_dataframes()
+    assert list(dfs["steps"]["step"]) == ["STARTED", "FINISHED"]
+    assert dfs["det"]["dm_x"][0] == 5
+    assert dfs["det"]["lamella"][0] == "01-lamella"
+    assert list(dfs["click"]["type"]) == ["DET"]
+
+
+def test_apply_schema():
+    """Analytics tables are converted to a stable, typed schema."""
+    parser = LogParser()
+    parser.parse_lines(LOG_LINES)
+    df_det = apply_schema("det", parser.to_dataframes()["det"])
+
+    assert list(df_det.columns[:len(TABLE_SCHEMAS["det"])]) == list(TABLE_SCHEMAS["det"])
+    assert str(df_det["is_correct"].dtype) == "boolean" and not df_det["is_correct"][0]
+    assert df_det["dm_x"].dtype == "float64"
+    assert df_det["exp_id"].isna().all()
+
+    df_milling = apply_schema("milling", parser.to_dataframes()["milling"])
+    assert df_milling.empty and list(df_milling.columns) == list(TABLE_SCHEMAS["milling"])
+
+
+def test_write_tables_partitioned(tmp_path):
+    """Tables are written per experiment, and read back across experiments."""
+    pytest.importorskip("pyarrow")
+    parser = LogParser()
+    parser.parse_lines(LOG_LINES)
+    dfs = parser.to_dataframes()
+    dfs.pop("state")
+
+    write_tables(tmp_path, dfs, exp_id="exp-01")
+    write_tables(tmp_path, dfs, exp_id="exp-02")
+    write_tables(tmp_path, dfs, exp_id="exp-01") # rewriting only replaces its own partition
+
+    tables = read_tables(tmp_path, names=["steps", "det"])
+    assert len(tables["steps"]) == 4
+    assert sorted(tables["det"]["exp_id"].unique()) == ["exp-01", "exp-02"]
+    assert str(tables["det"]["is_correct"].dtype) == "boolean"
+    assert len(read_tables(tmp_path, names=["steps"], exp_ids=["exp-02"])["steps"]) == 2
+
+
+def _create_experiments(tmp_path):
+    for name, snapshot_format in [("exp-01", "yaml"), ("exp-02", "sqlite")]:
+        experiment = Experiment(path=tmp_path, name=name)
+        experiment.snapshot_format = snapshot_format
+        os.makedirs(experiment.path, exist_ok=True)
+        lamella = create_new_lamella(experiment.path, number=1, state=LamellaState(), protocol={})
+        lamella.history.append(deepcopy(lamella.state))
+        experiment.positions.append(lamella)
+        experiment.save()
+        with open(os.path.join(experiment.path, "logfile.log"), "w", encoding="utf-8") as f:
+            f.write("\n".join(LOG_LINES) + "\n")
+    return find_experiments(tmp_path)
+
+
+def test_aggregate_experiments(tmp_path):
+    """Experiments are loaded in parallel into one dataset."""
+    paths = _create_experiments(tmp_path)
+    assert [os.path.basename(p) for p in paths] == ["exp-01", "exp-02"]
+
+    dfs = aggregate_experiments(paths, encoding="utf-8", max_workers=2)
+    assert list(dfs["steps"]["exp_name"]) == ["exp-01", "exp-01", "exp-02", "exp-02"]
+    assert dfs["det"]["exp_id"].nunique() == 2
+    assert str(dfs["det"]["is_correct"].dtype) == "boolean"
+
+
+def test_aggregate_experiments_cache(tmp_path):
+    """The tables are cached as parquet, until the experiment files change."""
+    pytest.importorskip("pyarrow")
+    paths = _create_experiments(tmp_path)
+    dfs = aggregate_experiments(paths, encoding="utf-8", max_workers=1)
+    manifest_fname = os.path.join(paths[0], AGGREGATE_CACHE_FILENAME, AGGREGATE_CACHE_MANIFEST)
+    with open(manifest_fname, encoding="utf-8") as f:
+        assert json.load(f)["encoding"] == "utf-8"
+
+    # unchanged experiments are loaded from the cache
+    cache_mtime = os.path.getmtime(manifest_fname)
+    dfs_cached = aggregate_experiments(paths, encoding="utf-8", max_workers=1)
+    assert os.path.getmtime(manifest_fname) == cache_mtime
+    for name, df in dfs.items():
+        pd.testing.assert_frame_equal(dfs_cached[name], df)
+
+    # appended logs invalidate the cache
+    with open(os.path.join(paths[1], "logfile.log"), "a", encoding="utf-8") as f:
+        f.write(LOG_LINES[0] + "\n")
+    dfs = aggregate_experiments(paths, encoding="utf-8", max_workers=1)
+    assert list(dfs["steps"]["exp_name"]).count("exp-02") == 3
+
+
+def test_load_statistics_tables_signature(tmp_path):
+    """Loading the analytics tables doesn't modify the experiment files (the cache signature)."""
+    experiment = Experiment(path=tmp_path, name="exp-01")
+    os.makedirs(experiment.path, exist_ok=True)
+    lamella = create_new_lamella(experiment.path, number=1, state=LamellaState(), protocol={})
+    lamella.history.append(deepcopy(lamella.state))
+    experiment.positions.append(lamella)
+    experiment.save()
+    with open(os.path.join(experiment.path, "logfile.log"), "w", encoding="utf-8") as f:
+        f.write("\n".join(LOG_LINES) + "\n")
+
+    signature = get_statistics_signature(experiment.path)
+    load_statistics_tables(experiment.path, encoding="utf-8")
+    logging.info("logged after loading the experiment")
+    assert get_statistics_signature(experiment.path) == signature
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# import time budgets (seconds), measured in a fresh interpreter. the budgets are generous,
+# the heavy dependencies (pandas, the fibsem milling stack, plotting, qt) take seconds to load
+IMPORT_BUDGETS = {
+    "autolamella.structures": 1.0,
+    "autolamella.tools.thumbnails": 1.0,
+    "autolamella.tools.reporting": 1.5,
+    "autolamella.workflows.runners": 5.0, # the fibsem microscope stack is required to run workflows
+}
+
+# modules that must not be loaded by the import
+LAZY_MODULES = {
+    "autolamella.structures": ["pandas", "fibsem.milling"],
+    "autolamella.tools.thumbnails": ["pandas", "matplotlib.pyplot"],
+    "autolamella.tools.reporting": ["pandas", "matplotlib.pyplot", "plotly", "reportlab", "fibsem.milling"],
+    "autolamella.workflows.runners": ["napari", "qtpy", "PyQt5", "autolamella.ui"],
+}
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+except ImportError as e:
+    print(json.dumps({"error": str(e)}))
+    sys.exit(0)
+print(json.dumps({"duration": time.perf_counter() - t0, "modules": sorted(sys.modules)}))
+"""
+
+
+def _measure_import(module: str) -> dict:
+    ret = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module],
+                         capture_output=True, text=True, check=True, cwd=REPO_PATH)
+    return json.loads(ret.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_import_time(module: str):
+    """Importing the package modules doesn't load the heavy dependencies, and is within budget."""
+    result = _measure_import(module)
+    if "error" in result:
+        pytest.skip(f"{module} can't be imported: {result['error']}")
+
+    loaded = [name for name in LAZY_MODULES[module] if name in result["modules"]]
+    assert loaded == [], f"{module} imports {loaded}"
+    assert result["duration"] < IMPORT_BUDGETS[module], \
+        f"{module} import took {result['duration']:.2f}s, budget {IMPORT_BUDGETS[module]}s"
@@ -34,6 +34,30 @@ def test_lamella_init(lamella: Lamella):
         for stage in v:
             assert stage["imaging"]["path"] == lamella.path
 
+def test_lamella_milling_workflows(lamella: Lamella):
+    """Milling workflows are built on demand, and cached until the protocol is replaced."""
+    key = list(lamella.protocol.keys())[0]
+    assert lamella._milling_workflows_cache == {}
+
+    stages = lamella.milling_workflows[key]
+    assert lamella.milling_workflows[key] is stages
+    assert set(lamella.milling_workflows.keys()) == set(lamella.protocol.keys())
+
+    # copies don't include the cache
+    assert deepcopy(lamella)._milling_workflows_cache == {}
+
+    # replacing the protocol invalidates the cache
+    lamella.protocol[key] = get_protocol_from_stages(stages)
+    assert lamella.milling_workflows[key] is not stages
+
+
+def test_lamella_from_dict_no_dirs(tmp_path):
+    """Loading a lamella doesn't create the lamella directory."""
+    lamella = Lamella(path=os.path.join(tmp_path, "01-lamella"), state=LamellaState(),
+                      number=1, petname="01-lamella", protocol={})
+    Lamella.from_dict(lamella.to_dict())
+    assert not os.path.exists(lamella.path)
+
 # remove the tmp directory after the test
 @pytest.fixture(autouse=True)
 def cleanup():
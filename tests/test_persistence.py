@@ -0,0 +1,356 @@
+import os
+import threading
+import time
+from copy import deepcopy
+from functools import partial
+
+import pytest
+import yaml
+from fibsem.milling import FibsemMillingStage, get_protocol_from_stages
+from fibsem.structures import FibsemImage, MicroscopeState
+
+from autolamella import config as cfg
+from autolamella import structures
+from autolamella.persistence import images
+from autolamella.persistence.images import ImageWriter
+from autolamella.persistence.journal import ExperimentJournal
+from autolamella.persistence.saver import SAVE_LAMELLA, SAVE_SNAPSHOT, ExperimentSaver
+from autolamella.structures import (
+    AutoLamellaStage,
+    Experiment,
+    Lamella,
+    LamellaState,
+    LazyLamella,
+    create_new_lamella,
+)
+from autolamella.tools.thumbnails import get_thumbnail_path
+
+
+@pytest.fixture
+def experiment(tmp_path) -> Experiment:
+    """Create an experiment with a few lamella for testing."""
+    experiment = Experiment(path=tmp_path, name="test-experiment")
+    os.makedirs(experiment.path, exist_ok=True)
+    for i in range(3):
+        state = LamellaState(stage=AutoLamellaStage.Created, microscope_state=MicroscopeState())
+        lamella = create_new_lamella(experiment.path, number=i + 1, state=state, protocol={})
+        experiment.positions.append(lamella)
+    experiment.save()
+    return experiment
+
+
+def _complete_stage(experiment: Experiment, idx: int, stage: AutoLamellaStage) -> None:
+    lamella = experiment.positions[idx]
+    lamella.state.stage = stage
+    lamella.state.end_timestamp = lamella.state.start_timestamp + 10
+    lamella.history.append(LamellaState.from_dict(lamella.state.to_dict()))
+    lamella.states[lamella.workflow] = LamellaState.from_dict(lamella.state.to_dict())
+    experiment.save_lamella(lamella)
+
+
+def test_journal_replay(experiment: Experiment):
+    """Lamella updates are journaled, and replayed when the experiment is loaded."""
+    _complete_stage(experiment, 0, AutoLamellaStage.PositionReady)
+    _complete_stage(experiment, 0, AutoLamellaStage.SetupLamella)
+    _complete_stage(experiment, 2, AutoLamellaStage.PositionReady)
+
+    assert len(experiment.journal) == 3
+
+    loaded = Experiment.load(os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME))
+    assert len(loaded.positions) == 3
+    assert loaded.positions[0].workflow is AutoLamellaStage.SetupLamella
+    assert [s.stage for s in loaded.positions[0].history] == [AutoLamellaStage.PositionReady,
+                                                             AutoLamellaStage.SetupLamella]
+    assert loaded.positions[1].workflow is AutoLamellaStage.Created
+    assert loaded.positions[2].workflow is AutoLamellaStage.PositionReady
+
+
+def test_journal_compaction(experiment: Experiment):
+    """Saving a snapshot truncates the journal."""
+    _complete_stage(experiment, 1, AutoLamellaStage.PositionReady)
+    assert os.path.exists(experiment.journal.path)
+
+    experiment.save()
+    assert len(experiment.journal) == 0
+    assert not os.path.exists(experiment.journal.path)
+
+    loaded = Experiment.load(os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME))
+    assert loaded.positions[1].workflow is AutoLamellaStage.PositionReady
+    assert len(loaded.positions[1].history) == 1
+
+
+def test_journal_truncate_keeps_new_records(tmp_path):
+    """Records appended after the snapshot offset survive compaction."""
+    journal = ExperimentJournal(tmp_path)
+    journal.append({"type": "lamella", "n": 0})
+    offset = journal.tell()
+    journal.append({"type": "lamella", "n": 1})
+
+    journal.truncate(offset)
+    assert journal.read() == [{"type": "lamella", "n": 1}]
+
+
+def test_store_lazy_loading(experiment: Experiment):
+    """The sqlite snapshot loads the lamella summaries, and the rest on first access."""
+    _complete_stage(experiment, 0, AutoLamellaStage.PositionReady)
+    experiment.snapshot_format = "sqlite"
+    experiment.save()
+
+    # journaled updates are replayed on top of the sqlite snapshot
+    experiment.snapshot_format = "yaml"
+    _complete_stage(experiment, 1, AutoLamellaStage.PositionReady)
+
+    loaded = Experiment.load(os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME))
+    assert loaded.snapshot_format == "sqlite"
+    assert [p.petname for p in loaded.positions] == [p.petname for p in experiment.positions]
+
+    # journaled lamella are loaded in full, the others lazily
+    lamella = loaded.positions[0]
+    assert isinstance(lamella, LazyLamella) and not lamella.is_loaded
+    assert not isinstance(loaded.positions[1], LazyLamella)
+    assert lamella.workflow is AutoLamellaStage.PositionReady
+
+    assert [s.stage for s in lamella.history] == [AutoLamellaStage.PositionReady]
+    assert lamella.is_loaded
+    assert loaded.positions[1].workflow is AutoLamellaStage.PositionReady
+    assert len(loaded.positions[1].history) == 1
+
+
+def test_store_round_trip(experiment: Experiment):
+    """Unloaded lazy lamella are saved without being loaded."""
+    _complete_stage(experiment, 2, AutoLamellaStage.PositionReady)
+    experiment.snapshot_format = "sqlite"
+    experiment.save()
+
+    filename = os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME)
+    loaded = Experiment.load(filename)
+    ddict = loaded.to_dict()
+    assert not any(p.is_loaded for p in loaded.positions)
+
+    # saving a lamella doesn't load the lamellae before it
+    loaded.save_lamella(loaded.positions[-1])
+    assert not any(p.is_loaded for p in loaded.positions[:-1])
+
+    materialised = Experiment.load(filename)
+    for p in materialised.positions:
+        p._load()
+    assert ddict == materialised.to_dict()
+
+
+def test_store_transactional_updates(experiment: Experiment):
+    """With the sqlite snapshot, lamella updates and removals are written to the store."""
+    experiment.snapshot_format = "sqlite"
+    experiment.save()
+
+    _complete_stage(experiment, 0, AutoLamellaStage.PositionReady)
+    removed = experiment.remove_lamella(1)
+    assert len(experiment.journal) == 0
+
+    filename = os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME)
+    loaded = Experiment.load(filename)
+    assert [p.petname for p in loaded.positions] == [p.petname for p in experiment.positions]
+    assert removed.petname not in [p.petname for p in loaded.positions]
+    assert loaded.positions[0].workflow is AutoLamellaStage.PositionReady
+    assert len(loaded.positions[0].history) == 1
+
+    # export to the legacy yaml format
+    experiment.export_yaml()
+    with open(filename) as f:
+        ddict = yaml.safe_load(f)
+    assert [p["petname"] for p in ddict["positions"]] == [p.petname for p in experiment.positions]
+    assert len(ddict["positions"][0]["history"]) == 1
+
+
+def test_store_export_yaml(experiment: Experiment):
+    """The yaml export writes the full history and states (no deltas or history references)."""
+    experiment.snapshot_format = "sqlite"
+    experiment.save()
+    _complete_stage(experiment, 0, AutoLamellaStage.PositionReady)
+    _complete_stage(experiment, 0, AutoLamellaStage.SetupLamella)
+    lamella = experiment.positions[0]
+    lamella.states[lamella.workflow] = lamella.history[-1] # stored as a history reference
+    experiment.save()
+
+    filename = os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME)
+    experiment.store.export_yaml(filename)
+    with open(filename) as f:
+        text = f.read()
+    assert "&id" not in text # no yaml aliases
+    ddict = yaml.safe_load(text)
+
+    ldict = ddict["positions"][0]
+    entries = ldict["history"] + list(ldict["states"].values())
+    assert len(ldict["history"]) == 2
+    for entry in entries:
+        assert set(entry) == set(LamellaState().to_dict())
+        LamellaState.from_dict(entry)
+    assert [h["stage"] for h in ldict["history"]] == ["PositionReady", "SetupLamella"]
+    assert ldict["states"]["SetupLamella"] == ldict["history"][1]
+
+
+def test_saver_coalesces_snapshots(tmp_path):
+    """Queued snapshots replace the pending writes for the same experiment."""
+    saver = ExperimentSaver()
+    written = []
+    release = threading.Event()
+
+    saver.submit("a", SAVE_SNAPSHOT, release.wait)  # block the saver thread
+    for i in range(5):
+        saver.submit("a", SAVE_SNAPSHOT, partial(written.append, i))
+    saver.submit("b", SAVE_LAMELLA, partial(written.append, "b"))
+    release.set()
+
+    assert saver.flush(timeout=5)
+    assert written == [4, "b"]
+
+
+def test_saver_errors():
+    """Failed writes are raised by the next flush (once)."""
+    saver = ExperimentSaver()
+
+    def write():
+        raise OSError("disk full")
+    saver.submit("a", SAVE_SNAPSHOT, write)
+    with pytest.raises(RuntimeError, match="Failed to save 1 experiment writes"):
+        saver.flush(timeout=5)
+    assert saver.flush(timeout=5)
+
+
+def test_image_writer(tmp_path, monkeypatch):
+    """Images are written in the background, with the queued image data limited to max_bytes."""
+    monkeypatch.setattr(cfg, "EXPERIMENT_CREATE_THUMBNAILS", True)
+    image = FibsemImage.generate_blank_image(resolution=[256, 128])
+    writer = ImageWriter(max_bytes=image.data.nbytes)
+
+    # block the writer thread, so the next image waits for space in the queue
+    release = threading.Event()
+    write_image = images._write_image
+    monkeypatch.setattr(images, "_write_image", lambda image, path: (release.wait(), write_image(image, path)))
+    writer.submit(image, os.path.join(tmp_path, "first"))
+    queued = threading.Thread(target=writer.submit, args=(image, os.path.join(tmp_path, "second")))
+    queued.start()
+    queued.join(timeout=0.2)
+    assert queued.is_alive()
+    release.set()
+    queued.join(timeout=5)
+    assert not queued.is_alive()
+
+    fname = writer.submit(image, os.path.join(tmp_path, "ref_MillRough_final_high_res_ib"))
+    assert writer.flush(timeout=5)
+    for name in ["first.tif", "second.tif"]:
+        assert os.path.exists(os.path.join(tmp_path, name))
+    assert FibsemImage.load(fname).data.shape == (128, 256)
+    assert os.path.exists(get_thumbnail_path(fname))
+
+
+def test_image_writer_errors(tmp_path, monkeypatch):
+    """Failed writes are raised by the next flush (once)."""
+    image = FibsemImage.generate_blank_image(resolution=[256, 128])
+    writer = ImageWriter()
+
+    def write_image(image, path):
+        raise OSError("disk full")
+    monkeypatch.setattr(images, "_write_image", write_image)
+    writer.submit(image, os.path.join(tmp_path, "image"))
+    with pytest.raises(RuntimeError, match="Failed to write 1 images"):
+        writer.flush(timeout=5)
+    assert writer.flush(timeout=5)
+
+
+def test_background_save(experiment: Experiment):
+    """Background saves are written before the experiment is loaded."""
+    _complete_stage(experiment, 1, AutoLamellaStage.PositionReady)
+    experiment.save(background=True)
+    assert experiment.flush(timeout=5)
+    assert len(experiment.journal) == 0
+
+    loaded = Experiment.load(os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME))
+    assert loaded.positions[1].workflow is AutoLamellaStage.PositionReady
+
+
+@pytest.mark.parametrize("snapshot_format", ["yaml", "sqlite"])
+def test_shared_protocol(tmp_path, snapshot_format: str):
+    """Lamella protocols are saved as a shared base protocol and per-lamella overrides."""
+    experiment = Experiment(path=tmp_path, name="test-experiment")
+    experiment.snapshot_format = snapshot_format
+    os.makedirs(experiment.path, exist_ok=True)
+    protocol = {"trench": get_protocol_from_stages([FibsemMillingStage(name="trench")]),
+                "mill_rough": get_protocol_from_stages([FibsemMillingStage(name="rough")])}
+    for i in range(3):
+        state = LamellaState(stage=AutoLamellaStage.Created, microscope_state=MicroscopeState())
+        lamella = create_new_lamella(experiment.path, number=i + 1, state=state, protocol=deepcopy(protocol))
+        experiment.positions.append(lamella)
+    experiment.positions[1].protocol["trench"][0]["milling"]["milling_current"] = 1e-9
+
+    ddict = experiment.to_dict()
+    overrides = [p["protocol_overrides"] for p in ddict["positions"]]
+    assert overrides[0] == overrides[2] == {}
+    assert overrides[1] != {}
+
+    # the saved dict doesn't share the (mutable) protocol with the lamellae
+    milling_current = ddict["protocol_base"]["trench"][0]["milling"]["milling_current"]
+    experiment.positions[0].protocol["trench"][0]["milling"]["milling_current"] = 2e-9
+    assert ddict["protocol_base"]["trench"][0]["milling"]["milling_current"] == milling_current
+    experiment.positions[0].protocol["trench"][0]["milling"]["milling_current"] = milling_current
+
+    experiment.save()
+    loaded = Experiment.load(os.path.join(experiment.path, cfg.EXPERIMENT_FILENAME))
+    for lamella, expected in zip(loaded.positions, experiment.positions):
+        assert lamella.protocol == expected.protocol
+        assert lamella.protocol["trench"][0]["imaging"]["path"] == lamella.path
+
+    # unchanged values are shared between lamellae
+    if snapshot_format == "yaml":
+        p0, p2 = loaded.positions[0].protocol, loaded.positions[2].protocol
+        assert p0["trench"][0]["milling"] is p2["trench"][0]["milling"]
+
+
+# snapshot (Experiment.to_dict) time budget for 500 lamellae (seconds), the budget is generous
+SNAPSHOT_BUDGET = 1.0
+
+
+def test_snapshot_time(tmp_path, monkeypatch):
+    """Snapshotting an experiment doesn't copy or serialise each lamella protocol."""
+    experiment = Experiment(path=tmp_path, name="test-experiment")
+    protocol = {"trench": get_protocol_from_stages([FibsemMillingStage(name="trench")]),
+                "mill_rough": get_protocol_from_stages([FibsemMillingStage(name=f"rough-{i}") for i in range(3)])}
+    for i in range(500):
+        state = LamellaState(stage=AutoLamellaStage.PositionReady, microscope_state=MicroscopeState())
+        lamella = create_new_lamella(experiment.path, number=i + 1, state=state, protocol=deepcopy(protocol))
+        lamella.history = [deepcopy(state) for _ in range(5)]
+        experiment.positions.append(lamella)
+
+    # the shared protocol is copied once per snapshot, not per lamella
+    copies = []
+    monkeypatch.setattr(structures, "deepcopy", lambda value: copies.append(value) or deepcopy(value))
+
+    t0 = time.perf_counter()
+    ddict = experiment.to_dict()
+    duration = time.perf_counter() - t0
+    assert len(copies) == 1
+    assert all(p["protocol_overrides"] == {} for p in ddict["positions"])
+    assert duration < SNAPSHOT_BUDGET, f"snapshot took {duration:.2f}s, budget {SNAPSHOT_BUDGET}s"
+
+
+def test_history_deltas(experiment: Experiment):
+    """History is saved as deltas of the previous entry, and states reference the history."""
+    _complete_stage(experiment, 0, AutoLamellaStage.PositionReady)
+    _complete_stage(experiment, 0, AutoLamellaStage.SetupLamella)
+    lamella = experiment.positions[0]
+    lamella.states[lamella.workflow] = lamella.history[-1]
+
+    ldict = lamella.to_dict()
+    assert "__delta__" not in ldict["history"][0]
+    assert "__delta__" in ldict["history"][1]
+    assert ldict["states"][AutoLamellaStage.SetupLamella.name] == {"__history__": 1}
+
+    loaded = Lamella.from_dict(ldict)
+    assert [s.to_dict() for s in loaded.history] == [s.to_dict() for s in lamella.history]
+    assert loaded.states[AutoLamellaStage.SetupLamella] is loaded.history[1]
+
+    # legacy format: full history entries and states
+    legacy = {**ldict, "history": [s.to_dict() for s in lamella.history],
+              "states": {k.name: v.to_dict() for k, v in lamella.states.items()}}
+    loaded = Lamella.from_dict(legacy)
+    assert [s.to_dict() for s in loaded.history] == [s.to_dict() for s in lamella.history]
+    assert loaded.states[AutoLamellaStage.SetupLamella].to_dict() == lamella.history[1].to_dict()
@@ -0,0 +1,125 @@
+import json
+import glob
+import os
+from copy import deepcopy
+
+import pytest
+
+from fibsem.structures import FibsemImage
+
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella, LamellaState
+from autolamella.tools import reporting
+from autolamella.tools.reporting import (
+    REPORT_CACHE_FILENAME,
+    REPORT_CACHE_MANIFEST,
+    HTMLReportGenerator,
+    generate_html_report,
+    get_lamella_report_key,
+    render_report_figures,
+)
+
+METHOD = AutoLamellaMethod.ON_GRID
+
+
+def _create_lamella(path: str, name: str) -> Lamella:
+    lamella = Lamella(path=os.path.join(path, name), state=LamellaState(stage=AutoLamellaStage.MillRough),
+                      number=1, petname=name, protocol={})
+    os.makedirs(lamella.path, exist_ok=True)
+    lamella.history.append(deepcopy(lamella.state))
+    lamella.history[-1].end_timestamp = lamella.history[-1].start_timestamp + 60
+    lamella.states[AutoLamellaStage.MillRough] = lamella.history[-1]
+    image = FibsemImage.generate_blank_image(resolution=[64, 48])
+    for res in ["high", "low"]:
+        for beam in ["eb", "ib"]:
+            image.save(os.path.join(lamella.path, f"ref_MillRough_final_{res}_res_{beam}.tif"))
+    return lamella
+
+
+def test_report_cache(monkeypatch, tmp_path):
+    """Unchanged lamellae reuse the cached figures (png files and a json manifest),
+    changes to the history or the images re-render the figures."""
+    lamella = _create_lamella(tmp_path, "01-lamella")
+    figures = render_report_figures([lamella], METHOD, max_workers=1)
+    assert figures[lamella.name]["summary"].startswith(b"\x89PNG")
+
+    cache_path = os.path.join(lamella.path, REPORT_CACHE_FILENAME)
+    with open(os.path.join(cache_path, REPORT_CACHE_MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["key"] == get_lamella_report_key(lamella, METHOD)
+    assert manifest["figures"] == {"summary": True, "milling": False}
+
+    rendered = []
+    render_lamella_figures = reporting.render_lamella_figures
+    def render(p, method):
+        rendered.append(p.name)
+        return render_lamella_figures(p, method)
+    monkeypatch.setattr(reporting, "render_lamella_figures", render)
+
+    # unchanged
+    assert render_report_figures([lamella], METHOD, max_workers=1) == figures
+    assert rendered == []
+
+    # history changed
+    lamella.history.append(LamellaState(stage=AutoLamellaStage.MillPolishing))
+    render_report_figures([lamella], METHOD, max_workers=1)
+    assert rendered == [lamella.name]
+
+    # image changed
+    fname = os.path.join(lamella.path, "ref_MillRough_final_high_res_ib.tif")
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    render_report_figures([lamella], METHOD, max_workers=1)
+    assert rendered == [lamella.name, lamella.name]
+    assert render_report_figures([lamella], METHOD, max_workers=1)[lamella.name]["summary"] is not None
+    assert len(rendered) == 2
+
+
+def test_render_report_figures_pool(tmp_path):
+    """Rendering in a process pool returns the same figures as rendering serially."""
+    lamellae = [_create_lamella(tmp_path, name) for name in ["01-lamella", "02-lamella", "03-lamella"]]
+    lamellae.append(Lamella(path=os.path.join(tmp_path, "04-lamella"), state=LamellaState(),
+                            number=4, petname="04-lamella", protocol={})) # nothing to render
+
+    serial = render_report_figures(lamellae, METHOD, max_workers=1, use_cache=False)
+    pooled = render_report_figures(lamellae, METHOD, max_workers=2, use_cache=False)
+    assert sorted(pooled) == sorted(serial) == [p.name for p in lamellae]
+    for name, figures in serial.items():
+        assert sorted(pooled[name]) == sorted(figures)
+        assert [png is None for png in pooled[name].values()] == [png is None for png in figures.values()]
+    assert serial["04-lamella"] == {"summary": None, "milling": None}
+    assert not os.path.exists(os.path.join(lamellae[0].path, REPORT_CACHE_FILENAME))
+
+
+def test_html_report(tmp_path):
+    """plotly.js is embedded once, and the lamella images are written as thumbnail assets."""
+    pytest.importorskip("plotly")
+    import plotly.graph_objects as go
+    from plotly.offline import get_plotlyjs
+
+    experiment = Experiment(path=tmp_path, name="exp-01")
+    os.makedirs(experiment.path, exist_ok=True)
+    experiment.positions.append(_create_lamella(experiment.path, "01-lamella"))
+    experiment.save()
+    with open(os.path.join(experiment.path, "logfile.log"), "w", encoding="utf-8") as f:
+        f.write("2024-01-01 10:00:00,001 — root — DEBUG — log_status_message:89 — {'msg': 'status', "
+                "'petname': '01-lamella', 'stage': 'MillRough', 'step': 'STARTED'}\n")
+
+    fname = os.path.join(tmp_path, "report.html")
+    generate_html_report(experiment, output_filename=fname, encoding="utf-8")
+    with open(fname, encoding="utf-8") as f:
+        document = f.read()
+    assets = sorted(glob.glob(os.path.join(tmp_path, "report_files", "*.png")))
+    assert len(assets) == 4
+    assert document.count('src="report_files/') == 4
+    assert document.count(get_plotlyjs()[:256]) == 1
+
+    # plotly.js is included once, for any number of figures
+    report = HTMLReportGenerator(os.path.join(tmp_path, "figures.html"))
+    for _ in range(3):
+        report.add_plotly_figure(go.Figure(go.Scatter(x=[0, 1], y=[0, 1])), title="figure")
+    report.generate()
+    with open(os.path.join(tmp_path, "figures.html"), encoding="utf-8") as f:
+        document = f.read()
+    assert document.count(get_plotlyjs()[:256]) == 1
+    assert document.count("Plotly.newPlot(") == 3
+    assert not os.path.exists(os.path.join(tmp_path, "figures_files"))
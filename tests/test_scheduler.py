@@ -0,0 +1,105 @@
+import numpy as np
+from fibsem.structures import FibsemStagePosition, MicroscopeState
+
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella, LamellaState
+from autolamella.workflows.scheduler import (
+    LamellaScheduler,
+    ReadyIndex,
+    StageTravelScheduler,
+    batch_by_key,
+    solve_travel_order,
+    stage_travel_cost,
+    WorkflowGraph,
+)
+
+
+def _lamella(number: int, position: FibsemStagePosition) -> Lamella:
+    state = LamellaState(microscope_state=MicroscopeState(stage_position=position))
+    return Lamella(path=f"/tmp/{number:02d}-lamella", state=state, number=number,
+                   petname=f"{number:02d}-lamella", protocol={})
+
+
+def test_solve_travel_order():
+    """The order visits points along a line, regardless of the input order."""
+    xs = np.array([0, 5, 1, 4, 2, 3], dtype=float)
+    dist = np.abs(xs[:, None] - xs[None, :])
+    order = solve_travel_order(dist)
+    assert list(xs[order]) == [1, 2, 3, 4, 5]
+
+
+def test_stage_travel_scheduler():
+    """Lamellae are ordered to minimise travel, and rotation changes are more expensive than xy moves."""
+    positions = [
+        FibsemStagePosition(x=0, y=0, z=0, r=0, t=0),
+        FibsemStagePosition(x=1e-3, y=0, z=0, r=np.pi, t=0),
+        FibsemStagePosition(x=2e-3, y=0, z=0, r=0, t=0),
+        FibsemStagePosition(x=3e-3, y=0, z=0, r=np.pi, t=0),
+    ]
+    assert stage_travel_cost(positions[0], positions[1]) > stage_travel_cost(positions[0], positions[2])
+
+    lamellae = [_lamella(i + 1, p) for i, p in enumerate(positions)]
+    start = FibsemStagePosition(x=0, y=0, z=0, r=0, t=0)
+
+    assert LamellaScheduler().order(lamellae, AutoLamellaStage.MillRough, start) == lamellae
+    ordered = StageTravelScheduler().order(lamellae, AutoLamellaStage.MillRough, start)
+    assert [l.number for l in ordered[:2]] == [1, 3] # group the rotations
+
+
+def test_stage_travel_scheduler_unpositioned():
+    """Lamellae without stage coordinates (e.g. the default position) are run last, in experiment order."""
+    lamellae = [
+        Lamella(path="/tmp/01-lamella", state=LamellaState(), number=1, petname="01-lamella", protocol={}),
+        _lamella(2, FibsemStagePosition(x=2e-3, y=0, z=0, r=0, t=0)),
+        _lamella(3, FibsemStagePosition(x=None, y=None, z=None)),
+        _lamella(4, FibsemStagePosition(x=1e-3, y=0, z=0, r=0, t=0)),
+    ]
+    start = FibsemStagePosition(x=0, y=0, z=0, r=0, t=0)
+    ordered = StageTravelScheduler().order(lamellae, AutoLamellaStage.MillRough, start)
+    assert [l.number for l in ordered] == [4, 2, 1, 3]
+
+
+def test_batch_by_key():
+    """Tasks are grouped by key across sequences, keeping the order within each sequence."""
+    sequences = [["a1", "b1", "a2"], ["b2", "a3"], ["a4", "b3"]]
+    order = batch_by_key(sequences, key=lambda task: task[0])
+    keys = [task[0] for _, task in order]
+    assert sum(k0 != k1 for k0, k1 in zip(keys[:-1], keys[1:])) == 2 # a, b, a
+    for i, seq in enumerate(sequences):
+        assert [task for j, task in order if j == i] == seq
+
+
+def test_workflow_graph():
+    """Stages require the previous stage, and optional stages (SetupPolishing) can be skipped."""
+    graph = WorkflowGraph(AutoLamellaMethod.WAFFLE)
+    assert graph.requires[AutoLamellaStage.MillTrench] == {AutoLamellaStage.PositionReady}
+    assert graph.requires[AutoLamellaStage.SetupLamella] == {AutoLamellaStage.MillUndercut}
+    assert graph.requires[AutoLamellaStage.MillPolishing] == {AutoLamellaStage.MillRough, 
+                                                               AutoLamellaStage.SetupPolishing}
+    assert graph.requires[AutoLamellaStage.Finished] == {AutoLamellaStage.MillPolishing}
+    assert graph.next_stage(AutoLamellaStage.PositionReady) is AutoLamellaStage.MillTrench
+    assert graph.next_stage(AutoLamellaStage.MillRough) is AutoLamellaStage.SetupPolishing
+    assert graph.next_stage(AutoLamellaStage.Created) is None
+
+    graph = WorkflowGraph(AutoLamellaMethod.ON_GRID)
+    assert graph.requires[AutoLamellaStage.SetupLamella] == {AutoLamellaStage.PositionReady}
+
+
+def test_ready_index():
+    """The index tracks the lamellae at each stage as they are updated, in experiment order."""
+    experiment = Experiment(path="/tmp", name="test")
+    for i in range(4):
+        lamella = _lamella(i, FibsemStagePosition(x=0, y=0, z=0, r=0, t=0))
+        lamella.state.stage = AutoLamellaStage.PositionReady
+        experiment.positions.append(lamella)
+    index = ReadyIndex(experiment)
+    assert index.at_stage({AutoLamellaStage.PositionReady}) == experiment.positions
+
+    l0, l1, l2, l3 = experiment.positions
+    l0.state.stage = AutoLamellaStage.MillRough
+    l2.state.stage = AutoLamellaStage.SetupPolishing
+    l3.state.stage = AutoLamellaStage.MillRough
+    l3.is_failure = True
+    for lamella in [l2, l3, l0]:
+        index.update(lamella)
+    assert index.at_stage({AutoLamellaStage.MillRough, AutoLamellaStage.SetupPolishing}) == [l0, l2]
+    assert index.at_stage({AutoLamellaStage.PositionReady}) == [l1]
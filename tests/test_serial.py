@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from fibsem.structures import ImageSettings, Point
+
+from autolamella.structures import AutoLamellaStage, Experiment, Lamella, LamellaState
+
+try:
+    from autolamella.workflows import serial
+except ImportError as e:
+    pytest.skip(f"The workflows can't be imported: {e}", allow_module_level=True)
+
+
+def _detection(distance_y: float = 0.0):
+    return SimpleNamespace(features=[SimpleNamespace(feature_m=Point())], fibsem_image=None,
+                           distance=Point(0, distance_y), to_dict=lambda: {})
+
+
+def _milling_stage():
+    stage = MagicMock()
+    stage.pattern.height = 1e-6
+    return stage
+
+
+def _lamella(tmp_path, stage: AutoLamellaStage, number: int = 1) -> Lamella:
+    name = f"{number:02d}-lamella"
+    return Lamella(path=str(tmp_path / name), state=LamellaState(stage=stage),
+                   number=number, petname=name, protocol={})
+
+
+@pytest.fixture
+def headless(monkeypatch):
+    """Replace the hardware and ui calls, the user is never asked."""
+    def ask_user(*args, **kwargs):
+        raise AssertionError("the user was asked while unsupervised")
+
+    monkeypatch.setattr(serial, "log_status_message", lambda *args, **kwargs: None)
+    monkeypatch.setattr(serial, "update_status_ui", lambda *args, **kwargs: None)
+    monkeypatch.setattr(serial, "set_images_ui", lambda *args, **kwargs: None)
+    monkeypatch.setattr(serial, "update_milling_ui", lambda microscope, stages, *args, **kwargs: stages)
+    monkeypatch.setattr(serial, "get_protocol_from_stages", lambda stages: {})
+    monkeypatch.setattr(serial, "ask_user", ask_user)
+    monkeypatch.setattr(serial.acquire, "take_reference_images", lambda *args, **kwargs: (None, None))
+    monkeypatch.setattr(serial.acquire, "take_set_of_reference_images",
+                        lambda *args, **kwargs: SimpleNamespace(high_res_eb=None, high_res_ib=None))
+    monkeypatch.setattr(serial.detection, "move_based_on_detection", lambda *args, **kwargs: None)
+    monkeypatch.setattr(serial.time, "sleep", lambda seconds: None)
+
+    microscope = MagicMock()
+    microscope.get.return_value = 0.0 # scan rotation
+    return microscope
+
+
+def test_liftout_lamella_unsupervised(headless, monkeypatch, tmp_path):
+    """Unsupervised, the volume is assumed severed (there is no automated check)."""
+    monkeypatch.setattr(serial, "align_feature_coincident", lambda *args, lamella, **kwargs: lamella)
+    monkeypatch.setattr(serial, "update_detection_ui", lambda *args, **kwargs: _detection())
+
+    lamella = _lamella(tmp_path, AutoLamellaStage.LiftoutLamella)
+    protocol = SimpleNamespace(
+        supervision={AutoLamellaStage.LiftoutLamella: False},
+        configuration=SimpleNamespace(image=ImageSettings()),
+        options=SimpleNamespace(checkpoint=None),
+        milling={"liftout-weld": [_milling_stage()], "liftout-sever": [_milling_stage()]},
+    )
+    assert serial.liftout_lamella(headless, protocol, lamella, parent_ui=None) is lamella
+    headless.retract_manipulator.assert_called_once()
+
+
+@pytest.mark.parametrize("validate", [False, True])
+def test_sever_lamella_block(headless, monkeypatch, tmp_path, validate):
+    """The sever is repeated until the measured distance reaches the threshold,
+    the user answer overrides the measurement when supervised."""
+    threshold = 0.5e-6
+    # (sever, confirm) detections for each attempt
+    detections = iter([_detection(), _detection(0.1e-6), _detection(), _detection(1e-6)])
+    monkeypatch.setattr(serial, "update_detection_ui", lambda *args, **kwargs: next(detections))
+    responses = [False, True]
+    if validate:
+        monkeypatch.setattr(serial, "ask_user", lambda *args, **kwargs: responses.pop(0))
+
+    protocol = SimpleNamespace(options=SimpleNamespace(checkpoint=None), tmp={"landing-sever-threshold": threshold},
+                               milling={"landing-sever": [_milling_stage()]})
+    lamella = _lamella(tmp_path, AutoLamellaStage.LandLamella)
+    serial.sever_lamella_block(headless, protocol, ImageSettings(), lamella, parent_ui=None, validate=validate)
+
+    assert next(detections, None) is None # severed on the second attempt
+    assert responses == ([] if validate else [False, True])
+
+
+def test_run_serial_liftout_landing(headless, monkeypatch, tmp_path):
+    """The landing loop stops when all the landing positions are used (headless, the user always continues)."""
+    experiment = Experiment(path=tmp_path, name="test")
+    experiment.positions.append(_lamella(tmp_path, AutoLamellaStage.LiftoutLamella))
+    experiment.landing_positions = [MagicMock(), MagicMock()]
+    monkeypatch.setattr(experiment, "save", lambda *args, **kwargs: None)
+
+    def create_lamella_at_landing(microscope, experiment, protocol, positions):
+        n_landed = len(experiment.at_stage(AutoLamellaStage.LandLamella))
+        positions[n_landed] # no more landing positions
+        return _lamella(tmp_path, AutoLamellaStage.LiftoutLamella, number=len(experiment.positions) + 1)
+
+    def start_of_stage_update(microscope, lamella, next_stage, parent_ui):
+        lamella.state.stage = next_stage
+        return lamella
+
+    landed = []
+    monkeypatch.setattr(serial, "ask_user", lambda *args, **kwargs: True)
+    monkeypatch.setattr(serial, "create_lamella_at_landing", create_lamella_at_landing)
+    monkeypatch.setattr(serial, "start_of_stage_update", start_of_stage_update)
+    monkeypatch.setitem(serial.SERIAL_WORKFLOW_STAGES, AutoLamellaStage.LandLamella,
+                        lambda microscope, protocol, lamella, parent_ui: landed.append(lamella.name) or lamella)
+    monkeypatch.setattr(serial, "end_of_stage_update", lambda microscope, experiment, lamella, parent_ui: experiment)
+    monkeypatch.setattr(serial, "update_experiment_ui", lambda *args, **kwargs: None)
+
+    protocol = SimpleNamespace(configuration=SimpleNamespace(image=ImageSettings()))
+    serial.run_serial_liftout_landing(headless, protocol, experiment, parent_ui=None)
+    assert landed == ["02-lamella", "03-lamella"]
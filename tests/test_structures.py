@@ -145,24 +145,22 @@ def test_is_ready_for():
                       number=1, 
                       protocol={},  
                       state=LamellaState(stage=AutoLamellaStage.Created))
-    lamella.states[AutoLamellaStage.Created] = LamellaState(stage=AutoLamellaStage.Created)
 
     method = AutoLamellaMethod.ON_GRID
 
     # not ready
-    for workflow in [AutoLamellaStage.MillRough, AutoLamellaStage.MillPolishing]:
+    for workflow in [AutoLamellaStage.SetupLamella, AutoLamellaStage.MillRough, AutoLamellaStage.MillPolishing]:
         is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
         assert is_ready is False, f"Workflow: {workflow}: is_ready: {is_ready}"
 
-    lamella.states[AutoLamellaStage.PositionReady] = LamellaState(stage=AutoLamellaStage.PositionReady)
-
     # ready for setupLamella
+    lamella.state.stage = AutoLamellaStage.PositionReady
     workflow: AutoLamellaStage = AutoLamellaStage.SetupLamella
     is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
     assert is_ready is True, f"Workflow: {workflow}: is_ready: {is_ready}"
 
     # after completing setup, ready for Rough Milling
-    lamella.states[AutoLamellaStage.SetupLamella] = LamellaState(stage=AutoLamellaStage.SetupLamella)
+    lamella.state.stage = AutoLamellaStage.SetupLamella
 
     workflow = AutoLamellaStage.MillRough
     is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
@@ -172,22 +170,29 @@ def test_is_ready_for():
     is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
     assert is_ready is False, f"Workflow: {workflow}: is_ready: {is_ready}"
 
-    # after completing Rough Milling, ready for Polishing
-    lamella.states[AutoLamellaStage.MillRough] = LamellaState(stage=AutoLamellaStage.MillRough)
+    # after completing Rough Milling, ready for Polishing (SetupPolishing is optional), but not Rough Milling again
+    lamella.state.stage = AutoLamellaStage.MillRough
 
-    workflow = AutoLamellaStage.MillPolishing
+    for workflow in [AutoLamellaStage.SetupPolishing, AutoLamellaStage.MillPolishing]:
+        is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
+        assert is_ready is True, f"Workflow: {workflow}: is_ready: {is_ready}"
+
+    workflow = AutoLamellaStage.MillRough
     is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
-    assert is_ready is True, f"Workflow: {workflow}: is_ready: {is_ready}"
-    
+    assert is_ready is False, f"Workflow: {workflow}: is_ready: {is_ready}"
+
+    # stages that are not part of the method are never ready
+    workflow = AutoLamellaStage.MillTrench
+    is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
+    assert is_ready is False, f"Workflow: {workflow}: is_ready: {is_ready}"
+
     # if lamella is a failure, not ready for any workflow
     lamella.is_failure = True
-    workflow: AutoLamellaStage = AutoLamellaStage.SetupLamella
+    workflow: AutoLamellaStage = AutoLamellaStage.MillPolishing
     is_ready = is_ready_for(lamella=lamella, method=method, workflow=workflow)
     assert is_ready is False, f"Workflow: {workflow}: is_ready: {is_ready}"
 
 
-
-
 def test_valid_method_names():
     """Test all official method names resolve correctly"""
     test_cases = [
@@ -0,0 +1,32 @@
+import os
+
+from fibsem.structures import FibsemImage
+
+from autolamella.tools.thumbnails import (
+    THUMBNAIL_LEVELS,
+    create_lamella_thumbnails,
+    get_thumbnail_path,
+    load_thumbnail,
+)
+
+
+def test_thumbnails(tmp_path):
+    """Thumbnails are created lazily, scaled for scalebars, and recreated when the image changes."""
+    fname = os.path.join(tmp_path, "ref_MillRough_final_high_res_ib.tif")
+    image = FibsemImage.generate_blank_image(resolution=[1536, 1024])
+    image.save(fname)
+
+    thumbnail = load_thumbnail(fname, width=256)
+    assert os.path.exists(get_thumbnail_path(fname))
+    assert thumbnail.data.shape == (171, 256)
+    assert thumbnail.source_shape == (1024, 1536)
+    assert thumbnail.scale == 6
+
+    # the largest level is returned for larger widths
+    assert load_thumbnail(fname, width=2048).data.shape == (683, THUMBNAIL_LEVELS[0])
+
+    # modified images are re-created, levels larger than the image are not upsampled
+    FibsemImage.generate_blank_image(resolution=[512, 256]).save(fname)
+    assert load_thumbnail(fname, width=1024).data.shape == (256, 512)
+    assert load_thumbnail(fname, width=256).source_shape == (256, 512)
+    assert create_lamella_thumbnails(tmp_path) == [get_thumbnail_path(fname)]
@@ -0,0 +1,45 @@
+import statistics
+import threading
+import time
+
+from autolamella.ui.sync import SharedFlag, WorkflowFlag
+
+
+class _UI:
+    WAITING_FOR_UI_UPDATE = SharedFlag()
+
+    def __init__(self):
+        self.WAITING_FOR_UI_UPDATE = False
+
+
+def test_shared_flag():
+    """The flag is assigned as a bool, and read as a WorkflowFlag (per instance)."""
+    ui, other = _UI(), _UI()
+    assert not ui.WAITING_FOR_UI_UPDATE
+    ui.WAITING_FOR_UI_UPDATE = True
+    assert ui.WAITING_FOR_UI_UPDATE and not other.WAITING_FOR_UI_UPDATE
+    assert isinstance(ui.WAITING_FOR_UI_UPDATE, WorkflowFlag)
+    assert ui.WAITING_FOR_UI_UPDATE.wait(timeout=0.01) is False
+    ui.WAITING_FOR_UI_UPDATE = False
+    assert ui.WAITING_FOR_UI_UPDATE.wait(timeout=0) is True
+
+
+def test_workflow_flag_latency():
+    """The waiting thread wakes as soon as the flag is cleared by the other thread."""
+    latencies = []
+    for _ in range(20):
+        flag = WorkflowFlag(True)
+        cleared = {}
+
+        def clear():
+            time.sleep(0.005)
+            cleared["t"] = time.perf_counter()
+            flag.set(False)
+
+        thread = threading.Thread(target=clear)
+        thread.start()
+        assert flag.wait(timeout=5)
+        latencies.append(time.perf_counter() - cleared["t"])
+        thread.join()
+
+    assert statistics.median(latencies) < 10e-3
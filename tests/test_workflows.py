@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from fibsem.milling import FibsemMillingStage
+from fibsem.structures import ImageSettings
+
+from autolamella.structures import AutoLamellaMethod, AutoLamellaStage, Experiment, Lamella, LamellaState
+
+try:
+    from autolamella.workflows import core
+except ImportError as e:
+    pytest.skip(f"The workflows can't be imported: {e}", allow_module_level=True)
+
+
+def test_mill_lamellae_batched(monkeypatch, tmp_path):
+    """Milling is grouped by current, and each lamella is finished as soon as its milling is done."""
+    currents = {"01-lamella": [1e-9, 2e-9], "02-lamella": [2e-9], "03-lamella": [1e-9, 2e-9]}
+    lamellae = [Lamella(path=str(tmp_path / name), state=LamellaState(stage=AutoLamellaStage.SetupLamella),
+                        number=i + 1, petname=name, protocol={})
+                for i, name in enumerate(currents)]
+    names = {id(lamella.protocol): lamella.name for lamella in lamellae}
+    events = []
+
+    def get_milling_stages(key, protocol):
+        name = names[id(protocol)]
+        stages = [FibsemMillingStage(name=f"{name}-{i}") for i in range(len(currents[name]))]
+        for mstage, current in zip(stages, currents[name]):
+            mstage.milling.milling_current = current
+        return stages
+
+    def mill_stages(microscope, stages):
+        events.append(("mill", stages[0].name))
+
+    def end_of_stage_update(microscope, experiment, lamella, parent_ui):
+        events.append(("finish", lamella.name))
+        return experiment
+
+    def start_of_stage_update(microscope, lamella, next_stage, *args, **kwargs):
+        lamella.state.stage = next_stage
+        return lamella
+
+    def new_image(microscope, image_settings):
+        events.append(("high_quality_image", image_settings.filename))
+
+    monkeypatch.setattr(core, "start_of_stage_update", start_of_stage_update)
+    monkeypatch.setattr(core, "_restore_lamella_alignment", lambda *args, **kwargs: None)
+    monkeypatch.setattr(core, "get_milling_stages", get_milling_stages)
+    monkeypatch.setattr(core, "get_protocol_from_stages", lambda stages: [])
+    monkeypatch.setattr(core.milling, "mill_stages", mill_stages, raising=False)
+    monkeypatch.setattr(core, "end_of_stage_update", end_of_stage_update)
+    monkeypatch.setattr(core.acquire, "take_reference_images", lambda *args, **kwargs: (None, None))
+    monkeypatch.setattr(core.acquire, "new_image", new_image)
+    monkeypatch.setattr(core, "set_images_ui", lambda *args, **kwargs: None)
+    monkeypatch.setattr(core, "update_status_ui", lambda *args, **kwargs: None)
+
+    protocol = SimpleNamespace(
+        configuration=SimpleNamespace(image=ImageSettings()),
+        method=AutoLamellaMethod.ON_GRID,
+        options=SimpleNamespace(take_final_reference_images=False, use_notch=False, use_microexpansion=False),
+        tmp={"high_quality_image": {"enabled": True, "dwell_time": 2e-6, "resolution": [3072, 2048],
+                                    "hfw": 50e-6, "frame_integration": 2}},
+    )
+    core.mill_lamellae_batched(MagicMock(), protocol, Experiment(path=tmp_path, name="test"),
+                               lamellae, AutoLamellaStage.MillPolishing)
+
+    # one current change, lamella 02 is finished after its only milling stage,
+    # the high quality image is acquired before each lamella is finished (as mill_lamella)
+    assert events == [
+        ("mill", "01-lamella-0"), ("mill", "03-lamella-0"),
+        ("mill", "01-lamella-1"), 
+        ("high_quality_image", "ref_MillPolishing_final_ultra"), ("finish", "01-lamella"),
+        ("mill", "02-lamella-0"), 
+        ("high_quality_image", "ref_MillPolishing_final_ultra"), ("finish", "02-lamella"),
+        ("mill", "03-lamella-1"), 
+        ("high_quality_image", "ref_MillPolishing_final_ultra"), ("finish", "03-lamella"),
+    ]